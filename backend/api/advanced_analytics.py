@@ -4,19 +4,28 @@ Real-time metrics, KPI dashboard, and performance analytics endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
+import os
 
 from ..database import get_db
 from ..models.enhanced_schema import User
 from ..services.auth import require_analyst, get_current_user
 from ..services.analytics_engine import AnalyticsEngine
 from ..services.audit_log import get_audit_logger, AuditLogger
+from ..services.analytics_export import (
+    EXPORT_ENCODERS, EXPORT_MEDIA_TYPES, PARQUET_AVAILABLE, iter_export_chunks
+)
 
 router = APIRouter(prefix="/analytics", tags=["advanced-analytics"])
 
+# Upper bound on properties per comparison (the comparison is batched, so
+# this can be portfolio-sized)
+MAX_COMPARISON_PROPERTIES = int(os.getenv("MAX_COMPARISON_PROPERTIES", "500"))
+
 # Pydantic models
 class DashboardMetricsResponse(BaseModel):
     property_metrics: Dict[str, Any]
@@ -224,58 +233,24 @@ async def get_trend_analysis(
     metric_type: str = Query("all", description="Type of metric to analyze"),
     days_back: int = Query(30, ge=7, le=365),
     current_user: User = Depends(require_analyst),
-    db: Session = Depends(get_db)
+    analytics_engine: AnalyticsEngine = Depends(get_analytics_engine)
 ):
-    """Get trend analysis for specific metrics"""
+    """
+    Get trend analysis for specific metrics.
+    
+    Grouping, first/last values and slopes are computed in SQL; each metric's
+    series is returned as daily columns (dates/values/confidence/counts).
+    """
     
     try:
-        from ..models.enhanced_schema import ExtractedMetric, FinancialDocument
-        
-        # Get metrics data
         start_date = datetime.utcnow() - timedelta(days=days_back)
+        metric_names = analytics_engine.match_metric_names(metric_type)
         
-        query = db.query(ExtractedMetric).join(
-            FinancialDocument, ExtractedMetric.document_id == FinancialDocument.id
-        ).filter(
-            ExtractedMetric.created_at >= start_date
-        )
-        
-        if metric_type != "all":
-            query = query.filter(ExtractedMetric.metric_name.ilike(f"%{metric_type}%"))
-        
-        metrics = query.order_by(ExtractedMetric.created_at.asc()).all()
-        
-        # Organize by metric type
-        trends_by_metric = {}
-        for metric in metrics:
-            metric_name = metric.metric_name
-            if metric_name not in trends_by_metric:
-                trends_by_metric[metric_name] = []
-            
-            trends_by_metric[metric_name].append({
-                'date': metric.created_at,
-                'value': float(metric.metric_value),
-                'confidence': float(metric.confidence_score)
-            })
-        
-        # Calculate trend analysis
-        trend_analysis = {}
-        for metric_name, data_points in trends_by_metric.items():
-            if len(data_points) >= 2:
-                values = [dp['value'] for dp in data_points]
-                
-                # Calculate trend
-                import numpy as np
-                trend_slope = np.polyfit(range(len(values)), values, 1)[0]
-                trend_direction = 'increasing' if trend_slope > 0 else 'decreasing' if trend_slope < 0 else 'stable'
-                
-                trend_analysis[metric_name] = {
-                    'trend_direction': trend_direction,
-                    'trend_slope': float(trend_slope),
-                    'current_value': values[-1],
-                    'change_pct': ((values[-1] - values[0]) / values[0] * 100) if values[0] != 0 else 0,
-                    'data_points': len(data_points)
-                }
+        if metric_names == []:
+            trends_by_metric, trend_analysis = {}, {}
+        else:
+            trend_analysis = analytics_engine.metric_trend_statistics(start_date, metric_names)
+            trends_by_metric = analytics_engine.metric_daily_series(start_date, metric_names)
         
         return {
             'trends_by_metric': trends_by_metric,
@@ -300,15 +275,14 @@ async def get_comparative_analysis(
     """Get comparative analysis between properties"""
     
     try:
-        if len(property_ids) > 10:
-            raise HTTPException(status_code=400, detail="Maximum 10 properties allowed for comparison")
+        if len(property_ids) > MAX_COMPARISON_PROPERTIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {MAX_COMPARISON_PROPERTIES} properties allowed for comparison"
+            )
         
-        # Get trends for each property
-        property_analyses = {}
-        for property_id in property_ids:
-            trends = await analytics_engine.get_property_performance_trends(property_id, 30)
-            if "error" not in trends:
-                property_analyses[property_id] = trends
+        # One query and one vectorized fit for all properties
+        property_analyses = await analytics_engine.compare_property_trends(property_ids, 30)
         
         # Calculate comparative metrics
         comparative_metrics = {}
@@ -343,12 +317,34 @@ async def get_comparative_analysis(
 
 @router.get("/export-analytics")
 async def export_analytics_data(
-    format: str = Query("json", description="Export format: json, csv"),
+    format: str = Query("json", description="Export format: json, csv, ndjson, parquet"),
     date_range: int = Query(30, ge=1, le=365, description="Days back to include"),
     current_user: User = Depends(require_analyst),
     analytics_engine: AnalyticsEngine = Depends(get_analytics_engine)
 ):
-    """Export analytics data in specified format"""
+    """
+    Export analytics data in specified format.
+    
+    csv, ndjson and parquet stream one row per value: the flattened dashboard,
+    portfolio and KPI sections followed by the extracted metric history for
+    date_range. json returns the summary sections in a single envelope.
+    """
+    
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    
+    if format in EXPORT_ENCODERS:
+        if format == "parquet" and not PARQUET_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server")
+        
+        filename = f"reims_analytics_{timestamp}.{format}"
+        return StreamingResponse(
+            EXPORT_ENCODERS[format](iter_export_chunks(date_range)),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    
+    if format != "json":
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
     
     try:
         # Get comprehensive analytics data
@@ -365,22 +361,11 @@ async def export_analytics_data(
             'date_range_days': date_range
         }
         
-        if format == "csv":
-            # Convert to CSV format (simplified)
-            import json
-            csv_data = json.dumps(export_data, indent=2, default=str)
-            return {
-                'format': 'csv',
-                'data': csv_data,
-                'filename': f'reims_analytics_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json'
-            }
-        else:
-            return {
-                'format': 'json',
-                'data': export_data,
-                'filename': f'reims_analytics_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.json'
-            }
+        return {
+            'format': 'json',
+            'data': export_data,
+            'filename': f'reims_analytics_{timestamp}.json'
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exporting analytics data: {str(e)}")
-
@@ -4,16 +4,18 @@ Document summarization, AI chat, and market intelligence endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
+from pathlib import Path
 import logging
 
 from ..database import get_db
 from ..models.enhanced_schema import User, FinancialDocument, MarketAnalysis
 from ..services.auth import require_analyst, get_current_user
-from ..services.llm_service import llm_service
-from ..services.audit_log import get_audit_logger, AuditLogger
+from ..services.llm_service import llm_service, model_names
+from ..services.audit_log import get_audit_logger, AuditLogger, AuditEventType
 from ..services.alert_system import AlertEngine
 
 logger = logging.getLogger(__name__)
@@ -139,6 +141,53 @@ async def summarize_document(
         logger.error(f"Error in document summarization: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
+@router.post("/summarize/{document_id}/stream")
+async def stream_document_summary(
+    document_id: str,
+    document_type: str = Form(...),
+    current_user: User = Depends(require_analyst),
+    db: Session = Depends(get_db),
+    llm_service = Depends(get_llm_service),
+    audit_logger: AuditLogger = Depends(get_audit_logger)
+):
+    """Stream an AI summary of a document as plain text (not stored)"""
+    
+    document = db.query(FinancialDocument).filter(
+        FinancialDocument.id == document_id
+    ).first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    document_path = Path(document.file_path)
+    if not document_path.exists():
+        raise HTTPException(status_code=404, detail="Document file not found")
+    
+    document_text = await _extract_document_text(document_path)
+    
+    if not document_text:
+        raise HTTPException(status_code=400, detail="Could not extract text from document")
+    
+    if not llm_service.is_available:
+        raise HTTPException(status_code=503, detail="LLM service not available")
+    
+    await audit_logger.log_event(
+        action=AuditEventType.AI_SUMMARIZATION.value,
+        user_id=str(current_user.id),
+        property_id=str(document.property_id),
+        document_id=document_id,
+        details={
+            "document_type": document_type,
+            "model": llm_service.model_name,
+            "streamed": True
+        }
+    )
+    
+    return StreamingResponse(
+        llm_service.stream_document_summary(document_text, document_type),
+        media_type="text/plain; charset=utf-8"
+    )
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
     chat_request: ChatRequest,
@@ -265,7 +314,8 @@ async def get_ai_status(
             "financial_statement",
             "property_report"
         ],
-        "status": "operational" if llm_service.is_available else "unavailable"
+        "status": "operational" if llm_service.is_available else "unavailable",
+        "summary_cache": llm_service.get_cache_stats()
     }
 
 @router.get("/models")
@@ -279,7 +329,7 @@ async def get_available_models(
         if llm_service.is_available:
             models = llm_service.ollama_client.list()
             return {
-                "available_models": [model['name'] for model in models['models']],
+                "available_models": model_names(models),
                 "current_model": llm_service.model_name,
                 "status": "connected"
             }
@@ -10,10 +10,12 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 
 from ..database import get_db
+from ..dependencies import get_redis_client
 from ..models.enhanced_schema import User, UserRole
 from ..services.auth import require_supervisor, require_analyst, get_current_user
 from ..services.alert_system import AlertEngine, CommitteeApprovalService
 from ..services.audit_log import get_audit_logger, AuditLogger
+from ..utils.tagged_cache import tagged_cache
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
@@ -89,7 +91,8 @@ async def approve_alert(
     alert_id: str,
     decision_request: AlertDecisionRequest,
     current_user: User = Depends(require_supervisor),
-    alert_engine: AlertEngine = Depends(get_alert_engine)
+    alert_engine: AlertEngine = Depends(get_alert_engine),
+    redis_client=Depends(get_redis_client)
 ):
     """Committee member approves/rejects alert"""
     try:
@@ -102,6 +105,7 @@ async def approve_alert(
             decision=decision_request.decision,
             notes=decision_request.notes
         )
+        tagged_cache.invalidate(redis_client, ["alerts", "properties"])
         
         return AlertDecisionResponse(
             alert_id=result['alert_id'],
@@ -153,11 +157,14 @@ async def get_committee_dashboard(
 async def check_property_metrics(
     property_id: str,
     current_user: User = Depends(require_analyst),
-    alert_engine: AlertEngine = Depends(get_alert_engine)
+    alert_engine: AlertEngine = Depends(get_alert_engine),
+    redis_client=Depends(get_redis_client)
 ):
     """Manually trigger metric check for a property"""
     try:
         alerts = await alert_engine.check_property_metrics(property_id)
+        if alerts:
+            tagged_cache.invalidate(redis_client, ["alerts", "properties"])
         
         return {
             "property_id": property_id,
@@ -5,7 +5,7 @@ Comprehensive KPI endpoints for professional dashboard
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, distinct
+from sqlalchemy import func, and_, case, select
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta, date
 import sys
@@ -17,97 +17,170 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from database import get_db, Document, ProcessingJob, ExtractedData, Analytics, Property
+    from database import get_db, engine, SessionLocal, Document, ProcessingJob, ExtractedData, Analytics, Property
 except ImportError:
-    from backend.database import get_db, Document, ProcessingJob, ExtractedData, Analytics, Property
+    from backend.database import get_db, engine, SessionLocal, Document, ProcessingJob, ExtractedData, Analytics, Property
+
+from .dependencies import get_redis_client
+from ..utils.tagged_cache import tagged_cache
+from ..utils.kpi_snapshot import KpiSnapshotStore, sparkline
 
 router = APIRouter()
 
+# Dashboard aggregates (except the overview, materialized in kpi_snapshot)
+# are served from the tagged cache: recomputed when an
+# upload, job or property write invalidates their tags, and at least this
+# often (time-window figures like "uploads today" drift without writes)
+DASHBOARD_FRESH_SECONDS = int(os.getenv("DASHBOARD_FRESH_SECONDS", "60"))
+
+
+def _cached(redis_client, key: str, tags: List[str], compute, *args):
+    """Serve compute(db, *args) from the tagged cache (compute gets its own session)"""
+    def run():
+        db = SessionLocal()
+        try:
+            return compute(db, *args)
+        finally:
+            db.close()
+
+    value, _ = tagged_cache.get_or_compute(
+        redis_client, key, tags, run, fresh_ttl=DASHBOARD_FRESH_SECONDS
+    )
+    return value
+
+
 @router.get("/api/dashboard/overview")
-async def get_dashboard_overview(db: Session = Depends(get_db)):
+def get_dashboard_overview():
     """Get comprehensive dashboard overview with all key metrics"""
     try:
-        # Document metrics
-        total_documents = db.query(Document).count()
-        minio_stored = db.query(Document).filter(Document.minio_bucket.isnot(None)).count()
-        recent_uploads = db.query(Document).filter(
-            Document.upload_timestamp >= datetime.utcnow() - timedelta(days=7)
-        ).count()
-        
-        # Processing metrics
-        total_jobs = db.query(ProcessingJob).count()
-        completed_jobs = db.query(ProcessingJob).filter(ProcessingJob.status == "completed").count()
-        failed_jobs = db.query(ProcessingJob).filter(ProcessingJob.status == "failed").count()
-        success_rate = (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
-        
-        # Storage metrics
-        total_storage = db.query(func.sum(Document.file_size)).scalar() or 0
-        avg_file_size = total_storage / total_documents if total_documents > 0 else 0
-        
-        # Property metrics
-        try:
-            total_properties = db.query(Property).count()
-        except Exception:
-            # Fallback if Property model doesn't match schema
-            total_properties = 0
-        
-        try:
-            unique_property_ids = db.query(distinct(Document.property_id)).count()
-        except Exception:
-            unique_property_ids = 0
-        
-        # File type distribution
-        file_types = db.query(
-            Document.content_type,
-            func.count(Document.id).label('count')
-        ).group_by(Document.content_type).all()
-        
-        # Recent activity (last 24 hours)
-        today_uploads = db.query(Document).filter(
-            Document.upload_timestamp >= datetime.utcnow() - timedelta(hours=24)
-        ).count()
-        
-        # Processing queue status
-        queued_jobs = db.query(ProcessingJob).filter(ProcessingJob.status == "queued").count()
-        processing_jobs = db.query(ProcessingJob).filter(ProcessingJob.status == "processing").count()
-        
-        return {
-            "overview": {
-                "total_documents": total_documents,
-                "minio_stored_documents": minio_stored,
-                "total_storage_bytes": int(total_storage),
-                "average_file_size_bytes": int(avg_file_size),
-                "unique_properties": unique_property_ids,
-                "success_rate_percent": round(success_rate, 2)
-            },
-            "processing": {
-                "total_jobs": total_jobs,
-                "completed": completed_jobs,
-                "failed": failed_jobs,
-                "queued": queued_jobs,
-                "processing": processing_jobs,
-                "success_rate": round(success_rate, 2)
-            },
-            "activity": {
-                "uploads_today": today_uploads,
-                "uploads_this_week": recent_uploads
-            },
-            "file_types": [
-                {"type": ft[0], "count": ft[1], "percentage": round(ft[1]/total_documents*100, 1)}
-                for ft in file_types
-            ],
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
+        snapshots = kpi_store.get("dashboard_overview")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dashboard overview failed: {str(e)}")
+    
+    return {
+        **snapshots[0]["metrics"],
+        "sparklines": {
+            "total_documents": sparkline(snapshots, "overview", "total_documents"),
+            "total_storage_bytes": sparkline(snapshots, "overview", "total_storage_bytes"),
+            "success_rate": sparkline(snapshots, "processing", "success_rate")
+        }
+    }
+
 
 @router.get("/api/dashboard/financial")
-async def get_financial_metrics(
+def get_financial_metrics(
     days: int = Query(30, description="Number of days for analysis"),
-    db: Session = Depends(get_db)
+    redis_client=Depends(get_redis_client)
 ):
     """Get financial performance metrics"""
+    return _cached(redis_client, f"dashboard:financial:{days}",
+                   ["documents", "processing"], _financial_metrics, days)
+
+
+@router.get("/api/dashboard/performance")
+def get_performance_metrics(
+    hours: int = Query(24, description="Number of hours for analysis"),
+    redis_client=Depends(get_redis_client)
+):
+    """Get system performance metrics"""
+    return _cached(redis_client, f"dashboard:performance:{hours}",
+                   ["documents", "processing"], _performance_metrics, hours)
+
+
+@router.get("/api/dashboard/properties")
+def get_property_analytics(redis_client=Depends(get_redis_client)):
+    """Get property-specific analytics"""
+    return _cached(redis_client, "dashboard:properties",
+                   ["documents", "properties"], _property_analytics)
+
+
+@router.get("/api/dashboard/alerts")
+def get_system_alerts(redis_client=Depends(get_redis_client)):
+    """Get system alerts and warnings"""
+    return _cached(redis_client, "dashboard:alerts",
+                   ["documents", "processing"], _system_alerts)
+
+
+@router.get("/api/dashboard/trends")
+def get_trend_analysis(
+    days: int = Query(30, description="Number of days for trend analysis"),
+    redis_client=Depends(get_redis_client)
+):
+    """Get trend analysis for key metrics"""
+    return _cached(redis_client, f"dashboard:trends:{days}",
+                   ["documents", "processing"], _trend_analysis, days)
+
+
+def _compute_overview(conn) -> Dict[str, Any]:
+    """
+    Overview metrics in one grouped pass per table (documents by content
+    type, jobs by status) instead of a count query per metric
+    """
+    now = datetime.utcnow()
+    documents = conn.execute(
+        select(
+            Document.content_type,
+            func.count(Document.id),
+            func.count(Document.minio_bucket),
+            func.sum(case((Document.upload_timestamp >= now - timedelta(days=7), 1), else_=0)),
+            func.sum(case((Document.upload_timestamp >= now - timedelta(hours=24), 1), else_=0)),
+            func.sum(Document.file_size)
+        ).group_by(Document.content_type)
+    ).fetchall()
+    jobs = dict(conn.execute(
+        select(ProcessingJob.status, func.count(ProcessingJob.id)).group_by(ProcessingJob.status)
+    ).fetchall())
+    unique_property_ids = conn.execute(
+        select(func.count()).select_from(select(Document.property_id).distinct().subquery())
+    ).scalar() or 0
+    
+    total_documents = sum(row[1] for row in documents)
+    minio_stored = sum(row[2] for row in documents)
+    recent_uploads = sum(row[3] or 0 for row in documents)
+    today_uploads = sum(row[4] or 0 for row in documents)
+    total_storage = sum(row[5] or 0 for row in documents)
+    avg_file_size = total_storage / total_documents if total_documents > 0 else 0
+    
+    total_jobs = sum(jobs.values())
+    completed_jobs = jobs.get("completed", 0)
+    failed_jobs = jobs.get("failed", 0)
+    success_rate = (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
+    
+    return {
+        "overview": {
+            "total_documents": total_documents,
+            "minio_stored_documents": minio_stored,
+            "total_storage_bytes": int(total_storage),
+            "average_file_size_bytes": int(avg_file_size),
+            "unique_properties": unique_property_ids,
+            "success_rate_percent": round(success_rate, 2)
+        },
+        "processing": {
+            "total_jobs": total_jobs,
+            "completed": completed_jobs,
+            "failed": failed_jobs,
+            "queued": jobs.get("queued", 0),
+            "processing": jobs.get("processing", 0),
+            "success_rate": round(success_rate, 2)
+        },
+        "activity": {
+            "uploads_today": today_uploads,
+            "uploads_this_week": recent_uploads
+        },
+        "file_types": [
+            {"type": row[0], "count": row[1], "percentage": round(row[1]/total_documents*100, 1)}
+            for row in documents
+        ],
+        "timestamp": now.isoformat()
+    }
+
+
+# Materialized overview, refreshed when documents, jobs or properties change
+# (the refresher is started by main.py via install_kpi_snapshots)
+kpi_store = KpiSnapshotStore(engine)
+kpi_store.register("dashboard_overview", _compute_overview, ["documents", "processing", "properties"])
+
+def _financial_metrics(db: Session, days: int):
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
@@ -164,12 +237,7 @@ async def get_financial_metrics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Financial metrics failed: {str(e)}")
 
-@router.get("/api/dashboard/performance")
-async def get_performance_metrics(
-    hours: int = Query(24, description="Number of hours for analysis"),
-    db: Session = Depends(get_db)
-):
-    """Get system performance metrics"""
+def _performance_metrics(db: Session, hours: int):
     try:
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         
@@ -231,9 +299,7 @@ async def get_performance_metrics(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Performance metrics failed: {str(e)}")
 
-@router.get("/api/dashboard/properties")
-async def get_property_analytics(db: Session = Depends(get_db)):
-    """Get property-specific analytics"""
+def _property_analytics(db: Session):
     try:
         # Property distribution
         property_stats = db.query(
@@ -292,9 +358,7 @@ async def get_property_analytics(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Property analytics failed: {str(e)}")
 
-@router.get("/api/dashboard/alerts")
-async def get_system_alerts(db: Session = Depends(get_db)):
-    """Get system alerts and warnings"""
+def _system_alerts(db: Session):
     try:
         alerts = []
         
@@ -370,12 +434,7 @@ async def get_system_alerts(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"System alerts failed: {str(e)}")
 
-@router.get("/api/dashboard/trends")
-async def get_trend_analysis(
-    days: int = Query(30, description="Number of days for trend analysis"),
-    db: Session = Depends(get_db)
-):
-    """Get trend analysis for key metrics"""
+def _trend_analysis(db: Session, days: int):
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
@@ -445,7 +504,7 @@ async def get_trend_analysis(
         raise HTTPException(status_code=500, detail=f"Trend analysis failed: {str(e)}")
 
 @router.get("/api/dashboard/real-time")
-async def get_real_time_metrics(db: Session = Depends(get_db)):
+def get_real_time_metrics(db: Session = Depends(get_db)):
     """Get real-time system metrics"""
     try:
         now = datetime.utcnow()
@@ -11,6 +11,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 
+from ..utils.schema_registry import SchemaRegistry
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -58,6 +60,9 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for ORM models
 Base = declarative_base()
 
+# Table/column capabilities, loaded once instead of introspected per request
+schema_registry = SchemaRegistry(engine)
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -84,6 +89,7 @@ def init_db():
     Creates all tables defined by SQLAlchemy models.
     """
     Base.metadata.create_all(bind=engine)
+    schema_registry.refresh()
     print("SUCCESS: Database tables initialized")
 
 
@@ -1,23 +1,300 @@
 """
 REIMS FastAPI Dependencies
 Provides dependency injection for Redis, MinIO, and other services
+
+Both clients are application-scoped: one bounded connection pool per
+process, created at startup (init_client_pools) and closed at shutdown
+(close_connections). Requests borrow connections from the pools instead of
+building a client each time.
 """
 
 import redis
+import certifi
+import threading
+import time
+import urllib3
 from minio import Minio
 import os
-from typing import Optional
+from typing import Optional, Dict, Any
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
 
 # --- Redis Configuration ---
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# Seconds a request waits for a free pooled connection before giving up
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 2))
+# After a connection failure, Redis is skipped (dependency yields None) and
+# re-checked with a single PING at most this often
+REDIS_HEALTH_RETRY_SECONDS = float(os.getenv("REDIS_HEALTH_RETRY_SECONDS", 10))
 
 # --- MinIO Configuration ---
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "False").lower() == "true"
+MINIO_MAX_CONNECTIONS = int(os.getenv("MINIO_MAX_CONNECTIONS", 20))
+MINIO_TIMEOUT = float(os.getenv("MINIO_TIMEOUT", 300))
+# Seconds a request waits for a free pooled connection before giving up
+MINIO_POOL_TIMEOUT = float(os.getenv("MINIO_POOL_TIMEOUT", 5))
+
+if PROMETHEUS_AVAILABLE:
+    pool_in_use = Gauge('reims_connection_pool_in_use', 'Pooled connections checked out', ['pool'])
+    pool_max_connections = Gauge('reims_connection_pool_max', 'Pool size limit', ['pool'])
+    pool_wait_time = Histogram(
+        'reims_connection_pool_wait_seconds', 'Time spent waiting for a pooled connection', ['pool'],
+        buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0)
+    )
+    pool_exhausted = Counter(
+        'reims_connection_pool_exhausted_total', 'Checkouts that timed out on a full pool', ['pool']
+    )
+
+
+class PoolStats:
+    """Checkout counters for one connection pool (also exported to Prometheus)"""
+    
+    def __init__(self, name: str, max_connections: int):
+        self.name = name
+        self.max_connections = max_connections
+        self.in_use = 0
+        self.checkouts = 0
+        self.exhausted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        if PROMETHEUS_AVAILABLE:
+            pool_max_connections.labels(pool=name).set(max_connections)
+    
+    def checked_out(self, wait_seconds: float):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.total_wait += wait_seconds
+            self.max_wait = max(self.max_wait, wait_seconds)
+            in_use = self.in_use
+        if PROMETHEUS_AVAILABLE:
+            pool_in_use.labels(pool=self.name).set(in_use)
+            pool_wait_time.labels(pool=self.name).observe(wait_seconds)
+    
+    def checked_in(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+            in_use = self.in_use
+        if PROMETHEUS_AVAILABLE:
+            pool_in_use.labels(pool=self.name).set(in_use)
+    
+    def timed_out(self, wait_seconds: float):
+        with self._lock:
+            self.exhausted += 1
+            self.total_wait += wait_seconds
+            self.max_wait = max(self.max_wait, wait_seconds)
+        if PROMETHEUS_AVAILABLE:
+            pool_exhausted.labels(pool=self.name).inc()
+            pool_wait_time.labels(pool=self.name).observe(wait_seconds)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_connections': self.max_connections,
+                'in_use': self.in_use,
+                'utilization': round(self.in_use / self.max_connections, 3) if self.max_connections else 0,
+                'checkouts': self.checkouts,
+                'exhausted': self.exhausted,
+                'avg_wait_ms': round(self.total_wait / max(self.checkouts + self.exhausted, 1) * 1000, 3),
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+
+class _InstrumentedRedisPool(redis.BlockingConnectionPool):
+    """
+    Bounded Redis pool that records checkout wait time and connections in
+    use, and marks Redis unhealthy when a connection cannot be established
+    """
+    
+    def __init__(self, stats: PoolStats, **kwargs):
+        self.stats = stats
+        self._checked_out = set()
+        super().__init__(**kwargs)
+    
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.exceptions.ConnectionError:
+            waited = time.perf_counter() - started
+            if self.stats.in_use >= self.max_connections:
+                # Every connection is busy: the pool is exhausted, Redis is fine
+                self.stats.timed_out(waited)
+            else:
+                _mark_redis_down()
+            raise
+        self._checked_out.add(id(connection))
+        self.stats.checked_out(time.perf_counter() - started)
+        return connection
+    
+    def release(self, connection):
+        # The base pool also releases connections that failed to connect
+        # inside get_connection; those were never counted as checked out
+        if id(connection) in self._checked_out:
+            self._checked_out.discard(id(connection))
+            self.stats.checked_in()
+        super().release(connection)
+
+
+class _InstrumentedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    """
+    urllib3 pool that records checkout wait time and connections in use.
+    MinIO never passes pool_timeout, so checkouts on a full pool default to
+    waiting pool_timeout seconds (then EmptyPoolError) instead of forever.
+    """
+    
+    pool_stats: Optional[PoolStats] = None
+    pool_timeout: Optional[float] = None
+    
+    def urlopen(self, method, url, **kwargs):
+        if kwargs.get("pool_timeout") is None:
+            kwargs["pool_timeout"] = self.pool_timeout
+        return super().urlopen(method, url, **kwargs)
+    
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            conn = super()._get_conn(timeout)
+        except urllib3.exceptions.EmptyPoolError:
+            self.pool_stats.timed_out(time.perf_counter() - started)
+            raise
+        self.pool_stats.checked_out(time.perf_counter() - started)
+        return conn
+    
+    def _put_conn(self, conn):
+        self.pool_stats.checked_in()
+        super()._put_conn(conn)
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedHTTPConnectionPool, urllib3.HTTPSConnectionPool):
+    pass
+
+
+# Application-scoped clients (created by init_client_pools)
+_redis_pool: Optional[_InstrumentedRedisPool] = None
+_redis_client: Optional[redis.Redis] = None
+_redis_retry_at = 0.0
+_minio_http: Optional[urllib3.PoolManager] = None
+_minio_client: Optional[Minio] = None
+redis_pool_stats = PoolStats("redis", REDIS_MAX_CONNECTIONS)
+minio_pool_stats = PoolStats("minio", MINIO_MAX_CONNECTIONS)
+_init_lock = threading.Lock()
+
+
+def _mark_redis_down():
+    global _redis_retry_at
+    if _redis_retry_at == 0.0:
+        print("WARNING: Redis connection failed; skipping Redis until it answers a PING")
+    _redis_retry_at = time.monotonic() + REDIS_HEALTH_RETRY_SECONDS
+
+
+def _redis_available() -> bool:
+    """
+    True unless a recent connection failure marked Redis down. Once the
+    retry interval has passed, one caller re-checks with a PING.
+    """
+    global _redis_retry_at
+    if _redis_retry_at == 0.0:
+        return True
+    if time.monotonic() < _redis_retry_at:
+        return False
+    
+    # Hold off other callers while this one checks
+    _redis_retry_at = time.monotonic() + REDIS_HEALTH_RETRY_SECONDS
+    try:
+        _redis_client.ping()
+    except Exception:
+        return False
+    _redis_retry_at = 0.0
+    print("SUCCESS: Redis reachable again")
+    return True
+
+
+def _init_redis_pool():
+    global _redis_pool, _redis_client
+    _redis_pool = _InstrumentedRedisPool(
+        redis_pool_stats,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        decode_responses=True,
+        socket_connect_timeout=2,
+        socket_timeout=2
+    )
+    _redis_client = redis.Redis(connection_pool=_redis_pool)
+
+
+def _init_minio_client():
+    global _minio_http, _minio_client
+    _minio_http = urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=MINIO_TIMEOUT, read=MINIO_TIMEOUT),
+        maxsize=MINIO_MAX_CONNECTIONS,
+        block=True,
+        cert_reqs='CERT_REQUIRED' if MINIO_SECURE else 'CERT_NONE',
+        ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+        retries=urllib3.Retry(
+            total=5,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
+    _minio_http.pool_classes_by_scheme = {
+        "http": type("MinioHTTPConnectionPool", (_InstrumentedHTTPConnectionPool,),
+                     {"pool_stats": minio_pool_stats, "pool_timeout": MINIO_POOL_TIMEOUT}),
+        "https": type("MinioHTTPSConnectionPool", (_InstrumentedHTTPSConnectionPool,),
+                      {"pool_stats": minio_pool_stats, "pool_timeout": MINIO_POOL_TIMEOUT})
+    }
+    _minio_client = Minio(
+        endpoint=MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=MINIO_SECURE,
+        http_client=_minio_http
+    )
+
+
+def init_client_pools():
+    """
+    Create the shared Redis and MinIO clients.
+    Call this during application startup (also done lazily on first use).
+    """
+    with _init_lock:
+        if _redis_pool is None:
+            try:
+                _init_redis_pool()
+                _redis_client.ping()
+                print(f"SUCCESS: Redis pool ready (max {REDIS_MAX_CONNECTIONS} connections)")
+            except Exception as e:
+                print(f"WARNING: Redis not available: {e}")
+                _mark_redis_down()
+        
+        if _minio_client is None:
+            try:
+                _init_minio_client()
+                print(f"SUCCESS: MinIO pool ready (max {MINIO_MAX_CONNECTIONS} connections)")
+            except Exception as e:
+                print(f"WARNING: MinIO client error: {e}")
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Utilization and wait-time counters for the shared pools"""
+    return {
+        'redis': {**redis_pool_stats.get_stats(), 'healthy': _redis_retry_at == 0.0},
+        'minio': minio_pool_stats.get_stats()
+    }
 
 
 def get_redis_client() -> Optional[redis.Redis]:
@@ -32,28 +309,11 @@ def get_redis_client() -> Optional[redis.Redis]:
         def get_items(redis_client: redis.Redis = Depends(get_redis_client)):
             cached = redis_client.get("items")
     """
-    client = None
-    try:
-        client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            decode_responses=True,
-            socket_connect_timeout=2,
-            socket_timeout=2
-        )
-        # Test connection
-        client.ping()
-    except redis.exceptions.ConnectionError as e:
-        print(f"WARNING: Redis connection error: {e}")
-        client = None
-    except Exception as e:
-        print(f"WARNING: Unexpected Redis error: {e}")
-        client = None
-    
-    yield client
+    if _redis_pool is None:
+        init_client_pools()
     
-    # Cleanup (no-op, connection pool handles this)
+    # No per-request PING: failures mark Redis down (see _redis_available)
+    yield _redis_client if _redis_client is not None and _redis_available() else None
 
 
 def get_minio_client() -> Optional[Minio]:
@@ -68,85 +328,51 @@ def get_minio_client() -> Optional[Minio]:
         def upload(minio_client: Minio = Depends(get_minio_client)):
             minio_client.put_object(...)
     """
-    client = None
-    try:
-        client = Minio(
-            endpoint=MINIO_ENDPOINT,
-            access_key=MINIO_ACCESS_KEY,
-            secret_key=MINIO_SECRET_KEY,
-            secure=MINIO_SECURE
-        )
-    except Exception as e:
-        print(f"WARNING: MinIO connection error: {e}")
-        client = None
-    
-    yield client
+    if _minio_client is None:
+        init_client_pools()
     
-    # Cleanup (no-op, client is stateless)
-
-
-# Singleton instances (optional, for non-request-scoped usage)
-_redis_client: Optional[redis.Redis] = None
-_minio_client: Optional[Minio] = None
+    yield _minio_client
 
 
 def get_redis_singleton() -> Optional[redis.Redis]:
     """
-    Get a singleton Redis client (not request-scoped).
+    Get the shared Redis client (not request-scoped).
     Use this for background tasks or startup events.
     """
-    global _redis_client
-    if _redis_client is None:
-        try:
-            _redis_client = redis.Redis(
-                host=REDIS_HOST,
-                port=REDIS_PORT,
-                db=REDIS_DB,
-                decode_responses=True
-            )
-            _redis_client.ping()
-            print("SUCCESS: Redis connected")
-        except Exception as e:
-            print(f"WARNING: Redis not available: {e}")
-            _redis_client = None
-    return _redis_client
+    if _redis_pool is None:
+        init_client_pools()
+    return _redis_client if _redis_client is not None and _redis_available() else None
 
 
 def get_minio_singleton() -> Optional[Minio]:
     """
-    Get a singleton MinIO client (not request-scoped).
+    Get the shared MinIO client (not request-scoped).
     Use this for background tasks or startup events.
     """
-    global _minio_client
     if _minio_client is None:
-        try:
-            _minio_client = Minio(
-                endpoint=MINIO_ENDPOINT,
-                access_key=MINIO_ACCESS_KEY,
-                secret_key=MINIO_SECRET_KEY,
-                secure=MINIO_SECURE
-            )
-            print("SUCCESS: MinIO connected")
-        except Exception as e:
-            print(f"WARNING: MinIO not available: {e}")
-            _minio_client = None
+        init_client_pools()
     return _minio_client
 
 
 def close_connections():
     """
-    Close all singleton connections.
+    Close the shared Redis and MinIO pools.
     Call this during application shutdown.
     """
-    global _redis_client, _minio_client
+    global _redis_pool, _redis_client, _minio_http, _minio_client
     
-    if _redis_client:
-        try:
-            _redis_client.close()
-            print("SUCCESS: Redis connection closed")
-        except:
-            pass
-        _redis_client = None
-    
-    _minio_client = None
+    with _init_lock:
+        if _redis_pool:
+            try:
+                _redis_pool.disconnect()
+                print("SUCCESS: Redis connection pool closed")
+            except Exception:
+                pass
+            _redis_pool = None
+            _redis_client = None
+        
+        if _minio_http:
+            _minio_http.clear()
+            _minio_http = None
+        _minio_client = None
     print("SUCCESS: All connections closed")
@@ -24,7 +24,7 @@ except ImportError:
     storage_router = None
 
 try:
-    from .dashboard_analytics import router as dashboard_router
+    from .dashboard_analytics import router as dashboard_router, kpi_store as dashboard_kpi_store
 except ImportError:
     dashboard_router = None
 
@@ -38,6 +38,18 @@ try:
 except ImportError:
     kpis_router = None
 
+try:
+    from ..services.audit_log import audit_sink
+except ImportError:
+    audit_sink = None
+
+from ..database import engine as service_engine
+from .database import engine as api_engine, schema_registry
+from ..utils.performance_recorder import install_performance_recorder
+from ..utils.loop_monitor import install_loop_monitor
+from ..utils.kpi_snapshot import install_kpi_snapshots
+from .dependencies import init_client_pools, close_connections, get_redis_singleton
+
 # Import new routers (matching frontend expectations)
 from .routes.analytics import router as new_analytics_router
 from .routes.properties import router as properties_router
@@ -47,6 +59,12 @@ from .routes.exit_strategy import router as exit_strategy_router
 
 app = FastAPI(title="REIMS API", description="Real Estate Information Management System API")
 
+# Sampled request performance recording (performance_logs)
+install_performance_recorder(app, service_engine, api_engine)
+
+# Sized threadpool for sync (blocking DB) handlers, and event loop lag reporting
+install_loop_monitor(app)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -83,11 +101,37 @@ if storage_router:
     app.include_router(storage_router)
 if dashboard_router:
     app.include_router(dashboard_router)
+    # Refresh the materialized dashboard overview on invalidation events
+    install_kpi_snapshots(app, dashboard_kpi_store, get_redis=get_redis_singleton)
 if monitoring_router:
     app.include_router(monitoring_router)
 if kpis_router:
     app.include_router(kpis_router)
 
+@app.on_event("startup")
+async def load_schema_registry():
+    """Introspect table/column capabilities once (reloaded after migrations)"""
+    try:
+        schema_registry.load()
+    except Exception as e:
+        print(f"WARNING: Schema registry not loaded at startup: {e}")
+
+@app.on_event("startup")
+async def open_client_pools():
+    """Create the shared Redis/MinIO connection pools"""
+    init_client_pools()
+
+@app.on_event("shutdown")
+async def close_client_pools():
+    """Close the shared Redis/MinIO connection pools"""
+    close_connections()
+
+@app.on_event("shutdown")
+async def flush_audit_log():
+    """Write out buffered audit events before the process exits"""
+    if audit_sink:
+        await audit_sink.stop()
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
@@ -3,15 +3,22 @@ REIMS Monitoring API
 Health checks, metrics, and system monitoring endpoints
 """
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Callable, Dict, Any
 from datetime import datetime
 
 from ..database import get_db
 from ..models.enhanced_schema import User
-from ..services.auth import require_analyst, get_current_user
+from ..services.auth import require_analyst, get_current_user, principal_cache
 from ..services.monitoring import MonitoringService, AlertingService
+from ..services.audit_log import audit_sink
+from ..utils.performance_recorder import performance_sink, PERF_SAMPLE_RATE
+from .dependencies import get_pool_stats
+from ..utils.loop_monitor import loop_monitor
+from .database import schema_registry
+from ..utils.tagged_cache import tagged_cache
+from .dashboard_analytics import kpi_store
 
 router = APIRouter(prefix="/monitoring", tags=["monitoring"])
 
@@ -109,6 +116,56 @@ async def get_system_alerts(
         'timestamp': datetime.utcnow()
     }
 
+# In-process components whose counters are served at /monitoring/stats
+STATS_SOURCES: Dict[str, Callable[[], Dict[str, Any]]] = {
+    # Buffered audit writer (written, dropped, failed, pending, max delay)
+    'audit-sink': audit_sink.get_stats,
+    # Request sampler (sample rate, written, dropped, pending)
+    'performance-recorder': lambda: {'sample_rate': PERF_SAMPLE_RATE, **performance_sink.get_stats()},
+    # Shared Redis/MinIO pools (utilization, checkout wait, exhaustion)
+    'connection-pools': get_pool_stats,
+    # Event loop lag, threadpool usage and call sites caught blocking the loop
+    'event-loop': loop_monitor.get_stats,
+    # Schema capability cache (version, loads, prepared queries)
+    'schema-registry': schema_registry.get_stats,
+    # Dashboard/analytics cache (hits, stale serves, refreshes, invalidations)
+    'tagged-cache': tagged_cache.get_stats,
+    # Materialized KPI scopes (refreshes, age, compute time, pending triggers)
+    'kpi-snapshots': kpi_store.get_stats,
+    # Principal cache (hits, misses, expirations, evictions, invalidations)
+    'auth-cache': principal_cache.get_stats,
+}
+
+@router.get("/stats")
+async def get_all_component_stats(
+    current_user: User = Depends(require_analyst)
+):
+    """Counters of every in-process component, keyed by component name"""
+    
+    return {
+        **{name: get_stats() for name, get_stats in STATS_SOURCES.items()},
+        'timestamp': datetime.utcnow()
+    }
+
+@router.get("/stats/{component}")
+async def get_component_stats(
+    component: str,
+    current_user: User = Depends(require_analyst)
+):
+    """Counters of one in-process component (see STATS_SOURCES)"""
+    
+    get_stats = STATS_SOURCES.get(component)
+    if get_stats is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown component '{component}'. Available: {', '.join(STATS_SOURCES)}"
+        )
+    
+    return {
+        **get_stats(),
+        'timestamp': datetime.utcnow()
+    }
+
 @router.get("/status")
 async def get_system_status(
     monitoring_service: MonitoringService = Depends(get_monitoring_service)
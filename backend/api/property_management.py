@@ -10,6 +10,8 @@ from datetime import datetime, date, timedelta
 import uuid
 
 from ..database import get_db
+from ..dependencies import get_redis_client
+from ..utils.tagged_cache import tagged_cache
 try:
     from ..models.property_models import (
         Property, Tenant, Lease, RentPayment, MaintenanceRequest, 
@@ -185,12 +187,17 @@ router = APIRouter(prefix="/property", tags=["Property Management"])
 
 # Property endpoints
 @router.post("/properties", response_model=PropertyResponse)
-async def create_property(property_data: PropertyCreate, db: Session = Depends(get_db)):
+async def create_property(
+    property_data: PropertyCreate,
+    db: Session = Depends(get_db),
+    redis_client=Depends(get_redis_client)
+):
     """Create a new property"""
     try:
         property_obj = Property(**property_data.dict())
         db.add(property_obj)
         db.commit()
+        tagged_cache.invalidate(redis_client, ["properties"])
         db.refresh(property_obj)
         return property_obj
     except Exception as e:
@@ -242,7 +249,8 @@ async def get_property(property_id: int = Path(..., gt=0), db: Session = Depends
 async def update_property(
     property_id: int,
     property_data: PropertyCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    redis_client=Depends(get_redis_client)
 ):
     """Update a property"""
     try:
@@ -255,6 +263,7 @@ async def update_property(
         
         property_obj.updated_at = datetime.utcnow()
         db.commit()
+        tagged_cache.invalidate(redis_client, ["properties"])
         db.refresh(property_obj)
         return property_obj
     except HTTPException:
@@ -80,7 +80,8 @@ async def create_job(job_request: JobRequest):
 @router.post("/jobs/batch/process-documents")
 async def create_batch_processing_job(batch_request: BatchJobRequest):
     """
-    Create a batch job to process multiple documents
+    Create a batch job to process multiple documents, fanned out as one
+    document_processing job per document
     """
     try:
         priority_map = {
@@ -92,20 +93,19 @@ async def create_batch_processing_job(batch_request: BatchJobRequest):
         
         priority = priority_map.get(batch_request.priority.lower(), JobPriority.NORMAL)
         
-        job_id = queue_manager.enqueue_job(
-            queue_name='document_processing',
-            job_type='batch_processing',
-            job_data={
-                'document_ids': batch_request.document_ids,
-                'options': batch_request.options
-            },
+        # One child job per document, tracked by a parent batch record;
+        # repeating the same batch returns the earlier one
+        batch_id, outcome = queue_manager.enqueue_batch(
+            document_ids=batch_request.document_ids,
+            options=batch_request.options,
             priority=priority
         )
         
         return {
-            "status": "created",
-            "job_id": job_id,
-            "document_count": len(batch_request.document_ids),
+            "status": "created" if outcome == "enqueued" else "duplicate",
+            "dedup_outcome": outcome,
+            "batch_id": batch_id,
+            "document_count": len(set(batch_request.document_ids)),
             "priority": batch_request.priority
         }
         
@@ -148,6 +148,26 @@ async def get_job_status(job_id: str):
         logger.error(f"Error getting job status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """
+    Get a batch's progress (completed/failed children) and the per-document
+    results recorded so far
+    """
+    try:
+        batch = queue_manager.get_batch_status(batch_id)
+        
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        
+        return batch
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting batch status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/queues/{queue_name}/stats")
 async def get_queue_stats(queue_name: str):
     """
@@ -196,6 +216,25 @@ async def get_all_queue_stats():
         logger.error(f"Error getting all queue stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/dedup/stats")
+async def get_dedup_stats():
+    """
+    Counters for processing job deduplication (jobs enqueued, and duplicate
+    submissions attached to in-flight jobs or served from completed ones)
+    """
+    try:
+        if not queue_manager.dedup:
+            return {"enabled": False}
+        
+        return {
+            "enabled": True,
+            "statistics": queue_manager.dedup.get_stats()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting dedup stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/queues/cleanup")
 async def cleanup_completed_jobs(older_than_hours: int = 24):
     """
@@ -214,6 +253,23 @@ async def cleanup_completed_jobs(older_than_hours: int = 24):
         logger.error(f"Error cleaning up jobs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/queues/reindex")
+async def rebuild_status_index():
+    """
+    Backfill the per-status job index for jobs created before it existed
+    """
+    try:
+        indexed = queue_manager.rebuild_status_index()
+        
+        return {
+            "status": "completed",
+            "indexed_jobs": indexed
+        }
+        
+    except Exception as e:
+        logger.error(f"Error rebuilding status index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/jobs/{job_id}/cancel")
 async def cancel_job(job_id: str):
     """
@@ -11,6 +11,8 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from backend.api.database import get_db
+from backend.api.dependencies import get_redis_client
+from backend.utils.tagged_cache import tagged_cache
 
 router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 
@@ -30,7 +32,7 @@ class RejectAlertRequest(BaseModel):
 
 
 @router.get("")
-async def get_alerts(
+def get_alerts(
     status: Optional[str] = "pending",
     level: Optional[str] = None,
     committee: Optional[str] = None,
@@ -147,7 +149,7 @@ async def get_alerts(
 
 
 @router.get("/stats")
-async def get_alert_stats(db: Session = Depends(get_db)):
+def get_alert_stats(db: Session = Depends(get_db)):
     """
     Get alert statistics
     
@@ -223,10 +225,11 @@ async def get_alert_stats(db: Session = Depends(get_db)):
 
 
 @router.post("/{alert_id}/approve")
-async def approve_alert(
+def approve_alert(
     alert_id: str,
     request: ApproveAlertRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    redis_client=Depends(get_redis_client)
 ):
     """
     Approve an alert
@@ -340,6 +343,7 @@ async def approve_alert(
         )
         
         db.commit()
+        tagged_cache.invalidate(redis_client, ["alerts", "properties"])
         
         return {
             "success": True,
@@ -362,10 +366,11 @@ async def approve_alert(
 
 
 @router.post("/{alert_id}/reject")
-async def reject_alert(
+def reject_alert(
     alert_id: str,
     request: RejectAlertRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    redis_client=Depends(get_redis_client)
 ):
     """
     Reject an alert
@@ -485,6 +490,7 @@ async def reject_alert(
         )
         
         db.commit()
+        tagged_cache.invalidate(redis_client, ["alerts", "properties"])
         
         return {
             "success": True,
@@ -507,7 +513,7 @@ async def reject_alert(
 
 
 @router.get("/property/{property_id}")
-async def get_property_alerts(
+def get_property_alerts(
     property_id: str,
     limit: int = 50,
     db: Session = Depends(get_db)
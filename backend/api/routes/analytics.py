@@ -6,20 +6,119 @@ Provides portfolio-wide analytics and KPI data
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
+from sqlalchemy.sql.elements import TextClause
 from typing import Dict, Any
 import redis
-import json
 from datetime import datetime, timedelta
 
-from ..database import get_db
+from ..database import get_db, SessionLocal, schema_registry
 from ..dependencies import get_redis_client
+from ...utils.performance_recorder import record_cache
+from ...utils.tagged_cache import tagged_cache
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 
+def _build_analytics_query(schema) -> TextClause:
+    """
+    Build the portfolio analytics query for the columns and tables that
+    exist in this schema generation. Built once per schema version.
+    """
+    properties = schema.columns("properties")
+    
+    # Portfolio Value (use whichever column exists)
+    if "current_value" in properties:
+        portfolio_value = "(SELECT COALESCE(SUM(current_value), 0) FROM properties)"
+    elif "current_market_value" in properties:
+        portfolio_value = "(SELECT COALESCE(SUM(current_market_value), 0) FROM properties)"
+    else:
+        portfolio_value = "0"
+    
+    # Monthly Income: stores table, else properties.monthly_rent, else NOI / 12
+    if schema.has_table("stores"):
+        monthly_income = "(SELECT COALESCE(SUM(monthly_rent), 0) FROM stores WHERE status = 'occupied')"
+    elif "monthly_rent" in properties:
+        monthly_income = """(SELECT COALESCE(SUM(monthly_rent), 0) FROM properties
+                WHERE status IN ('active', 'healthy'))"""
+    elif "annual_noi" in properties:
+        monthly_income = "(SELECT COALESCE(SUM(annual_noi), 0) / 12.0 FROM properties)"
+    else:
+        monthly_income = "0"
+    
+    # Occupancy Rate (0-1); NULL means no source, and the demo value is used
+    if schema.has_table("stores"):
+        # SQLite-compatible (no FILTER clause)
+        occupancy_rate = """(SELECT CASE WHEN COUNT(*) > 0
+                    THEN SUM(CASE WHEN status = 'occupied' THEN 1 ELSE 0 END) * 1.0 / COUNT(*)
+                    ELSE 0 END
+                FROM stores)"""
+    elif "latest_occupancy_rate" in properties:
+        occupancy_rate = "(SELECT COALESCE(AVG(latest_occupancy_rate), 0) FROM properties)"
+    elif "occupancy_rate" in properties:
+        # Old schema uses occupancy_rate as percentage (0-100)
+        occupancy_rate = "(SELECT COALESCE(AVG(occupancy_rate), 0) / 100.0 FROM properties)"
+    else:
+        occupancy_rate = "NULL"
+    
+    if "acquisition_cost" in properties:
+        acquisition_total = "(SELECT COALESCE(SUM(acquisition_cost), 0) FROM properties)"
+    elif "purchase_price" in properties:
+        acquisition_total = "(SELECT COALESCE(SUM(purchase_price), 0) FROM properties)"
+    else:
+        acquisition_total = "0"
+    
+    if "has_active_alerts" in properties:
+        risk_score = "(SELECT COUNT(*) FROM properties WHERE has_active_alerts = 1)"
+    else:
+        risk_score = "NULL"
+    
+    return text(f"""
+        SELECT
+            (SELECT COUNT(*) FROM properties WHERE status IN ('active', 'healthy')) AS total_properties,
+            {portfolio_value} AS portfolio_value,
+            {monthly_income} AS monthly_income,
+            {occupancy_rate} AS occupancy_rate,
+            {acquisition_total} AS acquisition_total,
+            {risk_score} AS risk_score
+    """)
+
+
+def _compute_analytics() -> Dict[str, Any]:
+    """Portfolio analytics from the database (own session: may run in a cache refresh thread)"""
+    db = SessionLocal()
+    try:
+        query = schema_registry.prepared("analytics.portfolio", _build_analytics_query)
+        row = db.execute(query).fetchone()
+    finally:
+        db.close()
+    
+    total_properties = row.total_properties or 0
+    portfolio_value = row.portfolio_value or 0
+    monthly_income = row.monthly_income or 0
+    occupancy_rate = row.occupancy_rate if row.occupancy_rate is not None else 0.85
+    
+    # YoY Growth (calculate from properties); default demo value
+    yoy_growth = 8.2
+    acquisition_total = row.acquisition_total or 0
+    if portfolio_value > 0 and acquisition_total > 0:
+        yoy_growth = ((portfolio_value - acquisition_total) / acquisition_total) * 100
+    
+    # Risk Score (simplified - just count of issues); default demo value
+    risk_score = row.risk_score if row.risk_score is not None else 23.5
+    
+    return {
+        "total_properties": int(total_properties),
+        "portfolio_value": float(portfolio_value),
+        "monthly_income": float(monthly_income),
+        "occupancy_rate": float(occupancy_rate),
+        "yoy_growth": round(float(yoy_growth), 2),
+        "risk_score": float(risk_score),
+        "last_updated": datetime.utcnow().isoformat()
+    }
+
+
 @router.get("")
-async def get_analytics(
-    db: Session = Depends(get_db),
+def get_analytics(
     redis_client: redis.Redis = Depends(get_redis_client)
 ):
     """
@@ -32,192 +131,25 @@ async def get_analytics(
     - occupancy_rate: Average occupancy rate
     - yoy_growth: Year-over-year growth percentage
     - risk_score: Calculated risk score
-    """
-    
-    # Check cache first
-    cache_key = "analytics_data"
-    try:
-        if redis_client:  # Check if redis_client is not None
-            cached = redis_client.get(cache_key)
-            if cached:
-                data = json.loads(cached)
-                data["cached"] = True
-                return {
-                    "success": True,
-                    "data": data
-                }
-    except Exception as e:
-        print(f"Redis error: {e}")
-        # Continue without cache
     
+    Cached until a property or store write invalidates it (or 5 minutes pass)
+    """
     try:
-        # Detect which schema we're using by checking column names
-        columns_result = db.execute(text("PRAGMA table_info(properties)")).fetchall()
-        column_names = [col[1] for col in columns_result]
-        
-        # Determine which columns exist
-        has_current_value = 'current_value' in column_names
-        has_current_market_value = 'current_market_value' in column_names
-        has_latest_occupancy_rate = 'latest_occupancy_rate' in column_names
-        has_occupancy_rate = 'occupancy_rate' in column_names
-        has_annual_noi = 'annual_noi' in column_names
-        has_monthly_rent = 'monthly_rent' in column_names
-        has_purchase_price = 'purchase_price' in column_names
-        has_acquisition_cost = 'acquisition_cost' in column_names
-        has_has_active_alerts = 'has_active_alerts' in column_names
-        
-        # Check if stores table exists
-        stores_exists = db.execute(
-            text("SELECT name FROM sqlite_master WHERE type='table' AND name='stores'")
-        ).fetchone() is not None
-        
-        # Query 1: Total Properties
-        total_properties = db.execute(
-            text("""
-                SELECT COUNT(*) 
-                FROM properties 
-                WHERE status IN ('active', 'healthy')
-            """)
-        ).scalar() or 0
-        
-        # Query 2: Portfolio Value (use whichever column exists)
-        portfolio_value = 0
-        if has_current_value:
-            portfolio_value = db.execute(
-                text("SELECT COALESCE(SUM(current_value), 0) FROM properties")
-            ).scalar() or 0
-        elif has_current_market_value:
-            portfolio_value = db.execute(
-                text("SELECT COALESCE(SUM(current_market_value), 0) FROM properties")
-            ).scalar() or 0
-        
-        # Query 3: Monthly Income
-        if stores_exists:
-            # Use stores table if it exists
-            monthly_income = db.execute(
-                text("""
-                    SELECT COALESCE(SUM(monthly_rent), 0) 
-                    FROM stores 
-                    WHERE status = 'occupied'
-                """)
-            ).scalar() or 0
-        elif 'monthly_rent' in column_names:
-            # Use properties table if it has monthly_rent column
-            monthly_income = db.execute(
-                text("""
-                    SELECT COALESCE(SUM(monthly_rent), 0) 
-                    FROM properties
-                    WHERE status IN ('active', 'healthy')
-                """)
-            ).scalar() or 0
-        else:
-            # Calculate from NOI if available
-            if has_annual_noi:
-                annual_income = db.execute(
-                    text("""
-                        SELECT COALESCE(SUM(annual_noi), 0) 
-                        FROM properties
-                    """)
-                ).scalar() or 0
-                monthly_income = annual_income / 12
-            else:
-                monthly_income = 0
-        
-        # Query 4: Occupancy Rate
-        if stores_exists:
-            # SQLite-compatible query (no FILTER clause)
-            occupancy_result = db.execute(
-                text("""
-                    SELECT 
-                        SUM(CASE WHEN status='occupied' THEN 1 ELSE 0 END) as occupied,
-                        COUNT(*) as total
-                    FROM stores
-                """)
-            ).fetchone()
-            
-            if occupancy_result and occupancy_result.total > 0:
-                occupancy_rate = occupancy_result.occupied / occupancy_result.total
-            else:
-                occupancy_rate = 0
-        elif has_latest_occupancy_rate:
-            occupancy_rate = db.execute(
-                text("""
-                    SELECT COALESCE(AVG(latest_occupancy_rate), 0)
-                    FROM properties
-                """)
-            ).scalar() or 0
-        elif has_occupancy_rate:
-            # Old schema uses occupancy_rate as percentage (0-100)
-            occupancy_rate_pct = db.execute(
-                text("""
-                    SELECT COALESCE(AVG(occupancy_rate), 0)
-                    FROM properties
-                """)
-            ).scalar() or 0
-            occupancy_rate = occupancy_rate_pct / 100.0  # Convert to 0-1 range
-        else:
-            # Fallback to demo value
-            occupancy_rate = 0.85
-        
-        # Query 5: YoY Growth (calculate from properties)
-        yoy_growth = 8.2  # Default demo value
-        
-        try:
-            current_total = portfolio_value
-            acquisition_total = 0
-            
-            if has_acquisition_cost:
-                acquisition_total = db.execute(
-                    text("SELECT COALESCE(SUM(acquisition_cost), 0) FROM properties")
-                ).scalar() or 0
-            elif has_purchase_price:
-                acquisition_total = db.execute(
-                    text("SELECT COALESCE(SUM(purchase_price), 0) FROM properties")
-                ).scalar() or 0
-            
-            if current_total > 0 and acquisition_total > 0:
-                yoy_growth = ((current_total - acquisition_total) / acquisition_total) * 100
-        except Exception as e:
-            print(f"YoY Growth calculation error: {e}")
-            yoy_growth = 8.2
-        
-        # Query 6: Risk Score (simplified - just count of issues)
-        risk_score = 23.5  # Default demo value
-        
-        try:
-            if has_has_active_alerts:
-                risk_score = db.execute(
-                    text("SELECT COUNT(*) FROM properties WHERE has_active_alerts = 1")
-                ).scalar() or 0
-        except Exception as e:
-            print(f"Risk score calculation error: {e}")
-            risk_score = 23.5
-        
-        # Build response
-        data = {
-            "total_properties": int(total_properties),
-            "portfolio_value": float(portfolio_value),
-            "monthly_income": float(monthly_income),
-            "occupancy_rate": float(occupancy_rate),
-            "yoy_growth": round(float(yoy_growth), 2),
-            "risk_score": float(risk_score),
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        # Cache for 5 minutes (300 seconds)
-        try:
-            redis_client.setex(
-                cache_key,
-                300,  # 5 minutes TTL
-                json.dumps(data)
-            )
-        except Exception as e:
-            print(f"Failed to cache analytics: {e}")
+        schema_registry.sync(redis_client)
+        data, status = tagged_cache.get_or_compute(
+            redis_client,
+            "analytics:portfolio",
+            ["properties", "stores", "alerts"],
+            _compute_analytics,
+            fresh_ttl=300
+        )
+        cached = status in ("hit", "stale", "coalesced")
+        record_cache(cached)
         
         return {
             "success": True,
-            "data": data,
-            "cached": False
+            "data": {**data, "cached": cached},
+            "cached": cached
         }
         
     except Exception as e:
@@ -229,7 +161,7 @@ async def get_analytics(
 
 
 @router.get("/overview")
-async def get_analytics_overview(db: Session = Depends(get_db)):
+def get_analytics_overview(db: Session = Depends(get_db)):
     """
     Get extended analytics overview
     Includes additional metrics beyond basic KPIs
@@ -3,31 +3,38 @@ Documents API Routes
 Handles document upload, storage, and processing status
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import Optional
+from typing import Optional, Tuple
 import uuid
 from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
 import redis
 import json
-import io
+from urllib3.exceptions import EmptyPoolError
 import sys
 import os
 
 # Add path for filename parser
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+# Add queue service path (processing job deduplication)
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "queue_service"))
 
 from backend.api.database import get_db
 from backend.api.dependencies import get_redis_client, get_minio_client
 from backend.utils.filename_parser import parse_filename
+from backend.utils.tagged_cache import tagged_cache
+from backend.utils.upload_stream import UploadTooLargeError, measure_upload, stream_to_minio
+from job_dedup import JobDeduplicator, content_key, IN_FLIGHT, COMPLETED, FAILED
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 
 @router.get("/test-dependencies")
-async def test_dependencies(
+def test_dependencies(
     db: Session = Depends(get_db),
     redis_client: redis.Redis = Depends(get_redis_client),
     minio_client = Depends(get_minio_client)
@@ -53,6 +60,17 @@ ALLOWED_EXTENSIONS = {
 
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# Content types served for stored documents, by file extension
+CONTENT_TYPE_MAP = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xls': 'application/vnd.ms-excel',
+    'csv': 'text/csv',
+}
+
+# Block size used when streaming objects out of MinIO
+DOWNLOAD_CHUNK_SIZE = 256 * 1024  # 256KB
+
 
 def find_or_create_property(db: Session, property_name: str) -> int:
     """
@@ -120,8 +138,25 @@ def find_or_create_property(db: Session, property_name: str) -> int:
     return new_id
 
 
+def _document_job_state(db: Session, document_id: str) -> Optional[str]:
+    """
+    Classify the processing of an earlier upload for deduplication (the queue
+    message is keyed by document_id and the worker records the outcome on the
+    financial_documents row)
+    """
+    status = db.execute(
+        text("SELECT status FROM financial_documents WHERE id = :document_id"),
+        {"document_id": document_id}
+    ).scalar()
+    if status in ("queued", "processing"):
+        return IN_FLIGHT
+    if status == "completed":
+        return COMPLETED
+    return FAILED if status else None
+
+
 @router.post("/upload")
-async def upload_document(
+def upload_document(
     file: UploadFile = File(...),
     property_id: Optional[str] = Form(None),  # Make optional for auto-creation
     document_type: str = Form(...),
@@ -191,13 +226,15 @@ async def upload_document(
                 detail=f"Invalid file type. Allowed: PDF, Excel, CSV"
             )
         
-        # Validate file size
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: 50MB"
-            )
+        # Validate file size: reject on the declared size when known, otherwise
+        # while hashing the spooled upload block by block
+        size_error = f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+        if (getattr(file, "size", None) or 0) > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail=size_error)
+        try:
+            file_size, file_hash = measure_upload(file.file, MAX_FILE_SIZE)
+        except UploadTooLargeError:
+            raise HTTPException(status_code=400, detail=size_error)
         
         # Generate document ID
         document_id = str(uuid.uuid4())
@@ -235,17 +272,23 @@ async def upload_document(
         # Build new document-type-first path: Financial Statements/{year}/{subtype}/{filename}
         file_path = f"Financial Statements/{year}/{doc_subtype}/{original_filename}"
         
-        # Upload to MinIO
+        # Stream to MinIO (multipart for large files)
         try:
-            from io import BytesIO
-            minio_client.put_object(
-                bucket_name="reims-files",
-                object_name=file_path,
-                data=BytesIO(file_content),
-                length=len(file_content),
-                content_type=file.content_type
+            stream_to_minio(
+                minio_client,
+                "reims-files",
+                file_path,
+                file.file,
+                file_size,
+                file.content_type,
+                {"file_hash": file_hash}
             )
             print(f"SUCCESS: File uploaded to MinIO: {file_path}")
+        except EmptyPoolError:
+            raise HTTPException(
+                status_code=503,
+                detail="File storage service (MinIO) is busy, please retry"
+            )
         except Exception as e:
             print(f"ERROR: MinIO upload error: {str(e)}")
             raise HTTPException(
@@ -316,7 +359,7 @@ async def upload_document(
                         "original_filename": file.filename,
                         "stored_filename": file.filename,  # Use original filename, no prefix
                         "property_id": str(property_id),
-                        "file_size": len(file_content),
+                        "file_size": file_size,
                         "content_type": file.content_type,
                         "file_path": file_path,
                         "minio_object_name": file_path,
@@ -333,6 +376,7 @@ async def upload_document(
                 print(f"WARNING: Failed to sync to documents table: {e}")
             
             db.commit()
+            tagged_cache.invalidate(redis_client, ["documents", "properties"])
             print(f"SUCCESS: Document metadata saved: {document_id}")
             print(f"         Property: {final_property_name}, Year: {final_document_year}, Period: {final_document_period}")
         except Exception as e:
@@ -349,7 +393,9 @@ async def upload_document(
                 detail=f"Failed to save document metadata: {str(e)}"
             )
         
-        # Add to processing queue
+        # Add to processing queue, once per file content (see job_dedup)
+        dedup_outcome = None
+        duplicate_of = None
         try:
             if redis_client:
                 queue_message = json.dumps({
@@ -359,8 +405,34 @@ async def upload_document(
                     "file_name": file.filename,
                     "document_type": document_type
                 })
-                redis_client.rpush("document_processing_queue", queue_message)
-                print(f"SUCCESS: Document queued for processing: {document_id}")
+                dedup = JobDeduplicator(redis_client)
+                job_id, dedup_outcome = dedup.submit(
+                    content_key(file_hash),
+                    lambda job_id: redis_client.rpush("document_processing_queue", queue_message),
+                    lambda job_id: _document_job_state(db, job_id),
+                    job_id=document_id,
+                    attach_id=document_id
+                )
+                
+                if dedup_outcome == IN_FLIGHT:
+                    # Attached: the worker marks this document when the job finishes
+                    duplicate_of = job_id
+                    print(f"SUCCESS: Document {document_id} attached to in-flight processing of {job_id}")
+                elif dedup_outcome == COMPLETED:
+                    db.execute(
+                        text("""
+                            UPDATE financial_documents
+                            SET status = 'completed', processing_status = 'completed'
+                            WHERE id = :document_id
+                        """),
+                        {"document_id": document_id}
+                    )
+                    db.commit()
+                    tagged_cache.invalidate(redis_client, ["processing"])
+                    duplicate_of = job_id
+                    print(f"SUCCESS: Document {document_id} reused the processing result of {job_id}")
+                else:
+                    print(f"SUCCESS: Document queued for processing: {document_id}")
             else:
                 print(f"WARNING: Redis not available, document not queued")
         except Exception as e:
@@ -371,9 +443,11 @@ async def upload_document(
             "success": True,
             "data": {
                 "document_id": document_id,
-                "status": "queued",
+                "status": "completed" if dedup_outcome == COMPLETED else "queued",
+                "dedup_outcome": dedup_outcome,
+                "duplicate_of": duplicate_of,
                 "file_name": file.filename,
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "upload_date": datetime.utcnow().isoformat(),
                 # NEW: Include extracted metadata in response
                 "property_name": final_property_name,
@@ -396,7 +470,7 @@ async def upload_document(
 
 
 @router.get("/{document_id}/status")
-async def get_document_status(
+def get_document_status(
     document_id: str,
     db: Session = Depends(get_db)
 ):
@@ -487,7 +561,7 @@ async def get_document_status(
 
 
 @router.get("")
-async def list_documents(
+def list_documents(
     property_id: Optional[str] = None,
     status: Optional[str] = None,
     limit: int = 50,
@@ -560,29 +634,162 @@ async def list_documents(
         )
 
 
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=start-end" header into an inclusive (start, end) pair.
+    
+    Returns None when the header should be ignored (malformed or multi-range) and
+    raises HTTPException(416) when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    
+    start_str, dash, end_str = range_header[len("bytes="):].strip().partition("-")
+    if not dash or not all(part.isascii() and part.isdigit() for part in (start_str, end_str) if part):
+        return None
+    
+    if start_str:
+        start = int(start_str)
+        end = int(end_str) if end_str else file_size - 1
+    elif end_str:
+        # Suffix range: the last N bytes
+        start = max(file_size - int(end_str), 0)
+        end = file_size - 1
+    else:
+        return None
+    
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    
+    return start, min(end, file_size - 1)
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the stored object"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    
+    return False
+
+
+def _range_applies(request: Request, etag: str, last_modified_header: str) -> bool:
+    """If-Range: only honor Range when the client's validator still matches"""
+    if_range = request.headers.get("if-range")
+    return not if_range or if_range in (etag, last_modified_header)
+
+
+def _iter_object(response, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Yield a MinIO object body in chunks, releasing the connection when done"""
+    try:
+        for chunk in response.stream(chunk_size):
+            yield chunk
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def stream_stored_document(
+    request: Request,
+    minio_client,
+    object_name: str,
+    file_name: str,
+    disposition: str
+):
+    """
+    Stream a stored document from MinIO without buffering it.
+    
+    Supports single byte-range requests (206 / 416), and answers conditional
+    requests with 304 based on the object's ETag and Last-Modified.
+    """
+    stat = await run_in_threadpool(minio_client.stat_object, "reims-files", object_name)
+    
+    file_size = stat.size
+    etag = f'"{stat.etag}"'
+    last_modified_header = format_datetime(stat.last_modified, usegmt=True) if stat.last_modified else None
+    
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"{disposition}; filename={file_name}"
+    }
+    if last_modified_header:
+        headers["Last-Modified"] = last_modified_header
+    
+    if _not_modified(request, etag, stat.last_modified):
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+    
+    byte_range = None
+    if _range_applies(request, etag, last_modified_header):
+        byte_range = parse_range_header(request.headers.get("range"), file_size)
+    
+    file_ext = file_name.split('.')[-1].lower()
+    content_type = CONTENT_TYPE_MAP.get(file_ext, 'application/octet-stream')
+    
+    if byte_range:
+        start, end = byte_range
+        response = await run_in_threadpool(
+            minio_client.get_object, "reims-files", object_name, start, end - start + 1
+        )
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        status_code = 206
+    else:
+        response = await run_in_threadpool(minio_client.get_object, "reims-files", object_name)
+        headers["Content-Length"] = str(file_size)
+        status_code = 200
+    
+    return StreamingResponse(
+        _iter_object(response),
+        status_code=status_code,
+        media_type=content_type,
+        headers=headers
+    )
+
+
+def _get_stored_document(db: Session, document_id: str):
+    """Storage location of a document (None if unknown)"""
+    return db.execute(
+        text("""
+            SELECT 
+                id,
+                file_path,
+                file_name,
+                document_type
+            FROM financial_documents
+            WHERE id = :document_id
+        """),
+        {"document_id": document_id}
+    ).fetchone()
+
+
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db),
     minio_client = Depends(get_minio_client)
 ):
     """
     Download a document file from MinIO storage
+    
+    Streams the object; supports Range requests and ETag/Last-Modified revalidation.
     """
     try:
-        # Get document metadata from database
-        doc_result = db.execute(
-            text("""
-                SELECT 
-                    id,
-                    file_path,
-                    file_name,
-                    document_type
-                FROM financial_documents
-                WHERE id = :document_id
-            """),
-            {"document_id": document_id}
-        ).fetchone()
+        # Get document metadata from database (off the event loop)
+        doc_result = await run_in_threadpool(_get_stored_document, db, document_id)
         
         if not doc_result:
             raise HTTPException(
@@ -596,32 +803,19 @@ async def download_document(
                 detail="File storage service (MinIO) is not available"
             )
         
-        # Get file from MinIO
+        # Stream file from MinIO
         try:
-            response = minio_client.get_object("reims-files", doc_result.file_path)
-            file_data = response.read()
-            response.close()
-            response.release_conn()
-            
-            # Determine content type based on file extension
-            file_ext = doc_result.file_name.split('.')[-1].lower()
-            content_type_map = {
-                'pdf': 'application/pdf',
-                'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'xls': 'application/vnd.ms-excel',
-                'csv': 'text/csv',
-            }
-            content_type = content_type_map.get(file_ext, 'application/octet-stream')
-            
-            # Return file as streaming response
-            return StreamingResponse(
-                io.BytesIO(file_data),
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f"attachment; filename={doc_result.file_name}"
-                }
+            return await stream_stored_document(
+                request, minio_client, doc_result.file_path, doc_result.file_name, "attachment"
             )
             
+        except HTTPException:
+            raise
+        except EmptyPoolError:
+            raise HTTPException(
+                status_code=503,
+                detail="File storage service (MinIO) is busy, please retry"
+            )
         except Exception as e:
             print(f"MinIO download error: {str(e)}")
             raise HTTPException(
@@ -641,26 +835,18 @@ async def download_document(
 @router.get("/{document_id}/view")
 async def view_document(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db),
     minio_client = Depends(get_minio_client)
 ):
     """
     View/preview a document file inline (opens in browser)
+    
+    Range support lets the PDF viewer seek without downloading the whole file.
     """
     try:
-        # Get document metadata from database
-        doc_result = db.execute(
-            text("""
-                SELECT 
-                    id,
-                    file_path,
-                    file_name,
-                    document_type
-                FROM financial_documents
-                WHERE id = :document_id
-            """),
-            {"document_id": document_id}
-        ).fetchone()
+        # Get document metadata from database (off the event loop)
+        doc_result = await run_in_threadpool(_get_stored_document, db, document_id)
         
         if not doc_result:
             raise HTTPException(
@@ -674,32 +860,19 @@ async def view_document(
                 detail="File storage service (MinIO) is not available"
             )
         
-        # Get file from MinIO
+        # Stream file from MinIO (inline, for viewing in browser)
         try:
-            response = minio_client.get_object("reims-files", doc_result.file_path)
-            file_data = response.read()
-            response.close()
-            response.release_conn()
-            
-            # Determine content type based on file extension
-            file_ext = doc_result.file_name.split('.')[-1].lower()
-            content_type_map = {
-                'pdf': 'application/pdf',
-                'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'xls': 'application/vnd.ms-excel',
-                'csv': 'text/csv',
-            }
-            content_type = content_type_map.get(file_ext, 'application/octet-stream')
-            
-            # Return file as inline response (for viewing in browser)
-            return StreamingResponse(
-                io.BytesIO(file_data),
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={doc_result.file_name}"
-                }
+            return await stream_stored_document(
+                request, minio_client, doc_result.file_path, doc_result.file_name, "inline"
             )
             
+        except HTTPException:
+            raise
+        except EmptyPoolError:
+            raise HTTPException(
+                status_code=503,
+                detail="File storage service (MinIO) is busy, please retry"
+            )
         except Exception as e:
             print(f"MinIO view error: {str(e)}")
             raise HTTPException(
@@ -714,4 +887,3 @@ async def view_document(
             status_code=500,
             detail=f"Failed to view document: {str(e)}"
         )
-
@@ -271,7 +271,7 @@ def determine_recommended_strategy(hold_metrics, refinance_metrics, sale_metrics
     return max(scores, key=scores.get)
 
 @router.get("/analyze/{property_id}")
-async def analyze_exit_strategy(property_id: int, db: Session = Depends(get_db)):
+def analyze_exit_strategy(property_id: int, db: Session = Depends(get_db)):
     """Analyze exit strategies for a specific property"""
     try:
         # Fetch property data using raw SQL
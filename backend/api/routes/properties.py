@@ -14,7 +14,7 @@ router = APIRouter(prefix="/api/properties", tags=["properties"])
 
 
 @router.get("")
-async def get_properties(
+def get_properties(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(20, ge=1, le=100, description="Number of records to return"),
     status: Optional[str] = Query(None, description="Filter by status: 'healthy' or 'alert'"),
@@ -179,7 +179,7 @@ async def get_properties(
 
 
 @router.get("/{property_id}")
-async def get_property(
+def get_property(
     property_id: str,
     db: Session = Depends(get_db)
 ):
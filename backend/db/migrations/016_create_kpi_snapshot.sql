@@ -0,0 +1,26 @@
+-- ============================================================================
+-- REIMS KPI Snapshot Table Migration
+-- Version: 016
+-- Description: Materialized KPI payloads (latest snapshot + short history)
+-- Author: REIMS Development Team
+-- ============================================================================
+
+-- Each row is one computation of a KPI scope ('financial', 'dashboard_overview').
+-- Rows are appended by backend/utils/kpi_snapshot.py when the data a scope is
+-- built from changes, and pruned to KPI_SNAPSHOT_HISTORY rows per scope.
+-- The application also creates this table on first use if it is missing.
+
+CREATE TABLE IF NOT EXISTS kpi_snapshot (
+  id SERIAL PRIMARY KEY,
+  
+  scope VARCHAR(50) NOT NULL,          -- KPI payload name
+  computed_at TIMESTAMP NOT NULL,      -- When the snapshot was computed (UTC)
+  reason VARCHAR(100),                 -- What triggered it: invalidated tags, 'max_age', 'initial'
+  compute_ms INTEGER,                  -- Time the single-pass computation took
+  metrics TEXT NOT NULL                -- KPI payload (JSON)
+);
+
+-- Serves "latest N snapshots of a scope" (the KPI endpoints' only read)
+CREATE INDEX IF NOT EXISTS idx_kpi_snapshot_scope_time ON kpi_snapshot(scope, computed_at);
+
+COMMENT ON TABLE kpi_snapshot IS 'Materialized KPI payloads with a short history for sparklines';
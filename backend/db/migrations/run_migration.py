@@ -19,6 +19,7 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 
 from backend.db import init_db, close_db, execute, fetch_all, fetch_val
+from backend.utils.schema_registry import publish_schema_change
 
 
 async def read_migration_file(filename: str) -> str:
@@ -113,6 +114,9 @@ async def run_migration(filename: str, force: bool = False):
         # Record success
         await record_migration(filename, success=True)
         
+        # Running APIs reload their schema capabilities
+        publish_schema_change()
+        
         print(f"\n✅ Migration completed successfully in {elapsed:.2f}s")
         print(f"📝 Recorded in schema_migrations table")
         return True
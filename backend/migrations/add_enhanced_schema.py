@@ -43,6 +43,12 @@ def create_enhanced_tables():
                 ON stores(property_id);
             """))
             
+            # Index for per-metric trend queries over a time window
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_extracted_metrics_name_created 
+                ON extracted_metrics(metric_name, created_at);
+            """))
+            
             # Indexes for audit log
             conn.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp 
@@ -131,6 +137,10 @@ def run_migration():
         print("\n👥 Step 2: Creating default users...")
         create_default_users()
         
+        # Running APIs reload their schema capabilities
+        from ..utils.schema_registry import publish_schema_change
+        publish_schema_change()
+        
         print("\n🎉 Migration completed successfully!")
         print("📊 Enhanced schema includes:")
         print("   • Enhanced Property Management")
@@ -5,10 +5,11 @@ Real-time metrics, KPI calculations, and performance analytics
 
 import asyncio
 import logging
+import uuid
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, case, cast, Float
 import numpy as np
 import pandas as pd
 
@@ -356,6 +357,221 @@ class AnalyticsEngine:
             logger.error(f"Error getting property performance trends: {e}")
             return {'error': str(e)}
     
+    async def compare_property_trends(
+        self,
+        property_ids: List[str],
+        days_back: int = 30
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Batched get_property_performance_trends for many properties.
+        
+        Fetches the metric history of all properties in one projected query
+        and fits every (property, metric) trend in a single vectorized pass.
+        Series are returned per metric as columns (dates/values/confidence).
+        Ids that are not valid UUIDs are skipped.
+        """
+        
+        start_date = datetime.utcnow() - timedelta(days=days_back)
+        analysis_period = {
+            'start_date': start_date,
+            'end_date': datetime.utcnow(),
+            'days_back': days_back
+        }
+        
+        requested = {}
+        for property_id in property_ids:
+            try:
+                requested[str(uuid.UUID(str(property_id)))] = property_id
+            except ValueError:
+                logger.warning(f"Skipping invalid property id in comparison: {property_id}")
+        
+        analyses = {
+            property_id: {
+                'property_id': property_id,
+                'trends_data': {},
+                'trend_analysis': {},
+                'analysis_period': analysis_period
+            }
+            for property_id in requested.values()
+        }
+        if not requested:
+            return analyses
+        
+        rows = self.db.query(
+            FinancialDocument.property_id,
+            ExtractedMetric.metric_name,
+            ExtractedMetric.created_at,
+            cast(ExtractedMetric.metric_value, Float),
+            cast(ExtractedMetric.confidence_score, Float)
+        ).join(
+            FinancialDocument, ExtractedMetric.document_id == FinancialDocument.id
+        ).filter(
+            FinancialDocument.property_id.in_([uuid.UUID(key) for key in requested]),
+            ExtractedMetric.created_at >= start_date
+        ).order_by(
+            FinancialDocument.property_id, ExtractedMetric.metric_name,
+            ExtractedMetric.created_at, ExtractedMetric.id
+        ).all()
+        
+        if not rows:
+            return analyses
+        
+        df = pd.DataFrame(rows, columns=['property_id', 'metric_name', 'date', 'value', 'confidence'])
+        df['property_id'] = df['property_id'].astype(str)
+        keys = ['property_id', 'metric_name']
+        
+        # Least-squares slope over the observation index, as
+        # np.polyfit(range(n), values, 1) per group, for all groups at once
+        groups = df.groupby(keys, sort=False)
+        df['x'] = groups.cumcount()
+        df['n'] = groups['value'].transform('size')
+        df['centered_xy'] = (df['x'] - (df['n'] - 1) / 2) * df['value']
+        
+        fits = df.groupby(keys, sort=False).agg(
+            n=('value', 'size'),
+            first_value=('value', 'first'),
+            last_value=('value', 'last'),
+            centered_xy=('centered_xy', 'sum')
+        )
+        fits = fits[fits['n'] >= 2]
+        n = fits['n'].astype(float)
+        fits['slope'] = fits['centered_xy'] * 12 / (n * (n * n - 1))
+        fits['direction'] = np.select(
+            [fits['slope'] > 0, fits['slope'] < 0], ['increasing', 'decreasing'], 'stable'
+        )
+        first_value = fits['first_value'].replace(0, np.nan)
+        fits['change_pct'] = ((fits['last_value'] - first_value) / first_value * 100).fillna(0.0)
+        
+        for (key, metric_name), fit in zip(fits.index, fits.itertuples(index=False)):
+            analyses[requested[key]]['trend_analysis'][metric_name] = {
+                'trend_direction': fit.direction,
+                'trend_slope': float(fit.slope),
+                'current_value': float(fit.last_value),
+                'previous_value': float(fit.first_value),
+                'change_pct': float(fit.change_pct),
+                'data_points': int(fit.n)
+            }
+        
+        for (key, metric_name), group in df.groupby(keys, sort=False):
+            analyses[requested[key]]['trends_data'][metric_name] = {
+                'dates': group['date'].tolist(),
+                'values': group['value'].tolist(),
+                'confidence': group['confidence'].tolist()
+            }
+        
+        return analyses
+    
+    def match_metric_names(self, metric_type: str) -> Optional[List[str]]:
+        """
+        Resolve a metric_type filter ("all" or a substring such as "noi") to
+        the concrete metric names it matches, so the data queries can use an
+        indexable IN list instead of ilike('%...%'). None means no filter.
+        """
+        if metric_type == "all":
+            return None
+        needle = metric_type.lower()
+        names = self.db.query(ExtractedMetric.metric_name).distinct().all()
+        return [name for (name,) in names if needle in name.lower()]
+    
+    def _metric_window_filters(self, start_date: datetime, metric_names: Optional[List[str]]):
+        filters = [ExtractedMetric.created_at >= start_date]
+        if metric_names is not None:
+            filters.append(ExtractedMetric.metric_name.in_(metric_names))
+        return filters
+    
+    def metric_trend_statistics(
+        self,
+        start_date: datetime,
+        metric_names: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-metric trend (first/last value and least-squares slope over the
+        observation index, as np.polyfit(range(n), values, 1) gave) computed
+        in one grouped query, so no rows are materialized in Python.
+        """
+        value = cast(ExtractedMetric.metric_value, Float)
+        ranked = self.db.query(
+            ExtractedMetric.metric_name.label('metric_name'),
+            value.label('value'),
+            (func.row_number().over(
+                partition_by=ExtractedMetric.metric_name,
+                order_by=(ExtractedMetric.created_at, ExtractedMetric.id)
+            ) - 1).label('x'),
+            func.count().over(partition_by=ExtractedMetric.metric_name).label('n')
+        ).join(
+            FinancialDocument, ExtractedMetric.document_id == FinancialDocument.id
+        ).filter(
+            *self._metric_window_filters(start_date, metric_names)
+        ).subquery()
+        
+        rows = self.db.query(
+            ranked.c.metric_name,
+            func.max(ranked.c.n),
+            # Centered x avoids cancellation in n*Sxy - Sx*Sy
+            func.sum((ranked.c.x - (ranked.c.n - 1) / 2.0) * ranked.c.value),
+            func.sum(case((ranked.c.x == 0, ranked.c.value), else_=0.0)),
+            func.sum(case((ranked.c.x == ranked.c.n - 1, ranked.c.value), else_=0.0))
+        ).group_by(ranked.c.metric_name).all()
+        
+        trend_analysis = {}
+        for metric_name, n, centered_xy, first_value, last_value in rows:
+            if n < 2:
+                continue
+            # Sum of squared centered indices 0..n-1 is n(n^2 - 1)/12
+            trend_slope = centered_xy * 12 / (n * (n * n - 1))
+            trend_direction = 'increasing' if trend_slope > 0 else 'decreasing' if trend_slope < 0 else 'stable'
+            
+            trend_analysis[metric_name] = {
+                'trend_direction': trend_direction,
+                'trend_slope': trend_slope,
+                'current_value': last_value,
+                'previous_value': first_value,
+                'change_pct': ((last_value - first_value) / first_value * 100) if first_value != 0 else 0,
+                'data_points': n
+            }
+        
+        return trend_analysis
+    
+    def metric_daily_series(
+        self,
+        start_date: datetime,
+        metric_names: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, list]]:
+        """
+        Daily series per metric in columnar form:
+        {'noi': {'dates': [...], 'values': [...], 'confidence': [...], 'counts': [...]}}.
+        Values are daily averages, so the size is bounded by the window in
+        days rather than by the number of extracted rows.
+        """
+        day = func.date(ExtractedMetric.created_at)
+        rows = self.db.query(
+            ExtractedMetric.metric_name,
+            day,
+            func.avg(cast(ExtractedMetric.metric_value, Float)),
+            func.avg(cast(ExtractedMetric.confidence_score, Float)),
+            func.count()
+        ).join(
+            FinancialDocument, ExtractedMetric.document_id == FinancialDocument.id
+        ).filter(
+            *self._metric_window_filters(start_date, metric_names)
+        ).group_by(
+            ExtractedMetric.metric_name, day
+        ).order_by(
+            ExtractedMetric.metric_name, day
+        ).yield_per(1000)
+        
+        series = {}
+        for metric_name, date, avg_value, avg_confidence, count in rows:
+            columns = series.get(metric_name)
+            if columns is None:
+                columns = series[metric_name] = {'dates': [], 'values': [], 'confidence': [], 'counts': []}
+            columns['dates'].append(str(date))
+            columns['values'].append(avg_value)
+            columns['confidence'].append(round(avg_confidence, 2))
+            columns['counts'].append(count)
+        
+        return series
+    
     async def get_portfolio_analytics(self) -> Dict[str, Any]:
         """Get comprehensive portfolio analytics"""
         
@@ -566,4 +782,3 @@ class AnalyticsEngine:
         except Exception as e:
             logger.error(f"Error calculating AI KPIs: {e}")
             return {}
-
@@ -0,0 +1,203 @@
+"""
+REIMS Analytics Export
+Streams analytics exports as CSV, NDJSON or Parquet without building the
+whole export in memory
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import numbers
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+from sqlalchemy import Float, cast, select
+
+from ..database import SessionLocal
+from ..models.enhanced_schema import ExtractedMetric, FinancialDocument
+from .analytics_engine import AnalyticsEngine
+from .audit_log import AuditLogger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# One row schema for every format and section. Summary sections put the
+# flattened key path (e.g. "financial_metrics.total_noi") in metric.
+EXPORT_COLUMNS = ['section', 'property_id', 'metric', 'value', 'text_value', 'confidence', 'recorded_at']
+
+# Rows per chunk written to the response (and per Parquet row group)
+EXPORT_CHUNK_ROWS = 1000
+
+# Bytes per read when streaming a finished Parquet file
+PARQUET_READ_SIZE = 1024 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def _export_row(section: str, metric: str, value: Any, recorded_at: datetime,
+                property_id: str = None, confidence: float = None) -> Dict[str, Any]:
+    numeric = isinstance(value, numbers.Number) and not isinstance(value, bool)
+    if numeric and not math.isfinite(value):
+        # NaN/inf are not valid JSON numbers
+        numeric = False
+        text_value = str(value)
+    elif numeric:
+        text_value = None
+    elif isinstance(value, (datetime, date)):
+        text_value = value.isoformat()
+    else:
+        text_value = None if value is None else str(value)
+
+    return {
+        'section': section,
+        'property_id': property_id,
+        'metric': metric,
+        'value': float(value) if numeric else None,
+        'text_value': text_value,
+        'confidence': confidence,
+        'recorded_at': recorded_at.isoformat()
+    }
+
+
+def _flatten_section(section: str, data: Any, recorded_at: datetime, prefix: str = "") -> Iterator[Dict[str, Any]]:
+    """Yield export rows for a nested analytics dict, joining keys with '.'"""
+    if isinstance(data, dict):
+        items = data.items()
+    else:
+        items = enumerate(data)
+
+    for key, value in items:
+        name = f"{prefix}{key}"
+        if isinstance(value, (dict, list, tuple)):
+            yield from _flatten_section(section, value, recorded_at, f"{name}.")
+        else:
+            yield _export_row(section, name, value, recorded_at)
+
+
+async def iter_export_chunks(date_range: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield export rows in chunks of at most EXPORT_CHUNK_ROWS.
+
+    Each summary section is computed only when the stream reaches it, and the
+    extracted metric history for the date range is read with a server-side
+    cursor in a worker thread. The export uses its own session because the
+    response outlives the request's dependencies.
+    """
+    db = SessionLocal()
+    try:
+        analytics_engine = AnalyticsEngine(db, AuditLogger(db))
+        exported_at = datetime.utcnow()
+
+        sections = (
+            ('dashboard_metrics', analytics_engine.get_dashboard_metrics),
+            ('portfolio_analytics', analytics_engine.get_portfolio_analytics),
+            ('kpi_data', analytics_engine.get_kpi_dashboard)
+        )
+        for section, compute in sections:
+            rows = list(_flatten_section(section, await compute(), exported_at))
+            for i in range(0, len(rows), EXPORT_CHUNK_ROWS):
+                yield rows[i:i + EXPORT_CHUNK_ROWS]
+
+        start_date = datetime.utcnow() - timedelta(days=date_range)
+        history = select(
+            FinancialDocument.property_id,
+            ExtractedMetric.metric_name,
+            cast(ExtractedMetric.metric_value, Float),
+            cast(ExtractedMetric.confidence_score, Float),
+            ExtractedMetric.created_at
+        ).join(
+            FinancialDocument, ExtractedMetric.document_id == FinancialDocument.id
+        ).where(
+            ExtractedMetric.created_at >= start_date
+        ).order_by(
+            ExtractedMetric.created_at
+        ).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+        partitions = (await asyncio.to_thread(db.execute, history)).partitions()
+        while True:
+            partition = await asyncio.to_thread(next, partitions, None)
+            if partition is None:
+                break
+            yield [
+                _export_row('extracted_metrics', metric_name, value, created_at,
+                            property_id=str(property_id), confidence=confidence)
+                for property_id, metric_name, value, confidence, created_at in partition
+            ]
+    finally:
+        db.close()
+
+
+async def stream_csv(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode row chunks as CSV, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+
+    async for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+async def stream_ndjson(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode row chunks as newline-delimited JSON"""
+    async for rows in chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+
+async def stream_parquet(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """
+    Write row chunks as Parquet row groups to a local temporary file, then
+    stream the file. Parquet needs its footer before it can be read, so the
+    first byte is sent only once all rows are written.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = pa.schema([
+        ('section', pa.string()),
+        ('property_id', pa.string()),
+        ('metric', pa.string()),
+        ('value', pa.float64()),
+        ('text_value', pa.string()),
+        ('confidence', pa.float64()),
+        ('recorded_at', pa.string())
+    ])
+
+    with tempfile.TemporaryFile() as spool:
+        writer = pq.ParquetWriter(spool, schema)
+        try:
+            async for rows in chunks:
+                await asyncio.to_thread(writer.write_table, pa.Table.from_pylist(rows, schema=schema))
+        finally:
+            writer.close()
+
+        spool.seek(0)
+        while True:
+            data = await asyncio.to_thread(spool.read, PARQUET_READ_SIZE)
+            if not data:
+                break
+            yield data
+
+
+EXPORT_ENCODERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'parquet': stream_parquet
+}
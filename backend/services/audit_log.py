@@ -7,11 +7,17 @@ from enum import Enum
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from sqlalchemy.orm import Session
+from fastapi import Depends
+import logging
 import json
+import time
 import uuid
 
 from ..models.enhanced_schema import AuditLog, User
-from ..database import get_db
+from ..database import get_db, SessionLocal
+from ..utils.buffered_sink import BufferedSink
+
+logger = logging.getLogger(__name__)
 
 class AuditEventType(Enum):
     """Audit event types for comprehensive tracking"""
@@ -334,9 +340,75 @@ def get_audit_logger(db: Session = Depends(get_db)) -> AuditLogger:
     """Get audit logger instance"""
     return AuditLogger(db)
 
+class BufferedAuditSink(BufferedSink):
+    """
+    In-process buffered audit writer.
+    
+    Audit rows are queued in a bounded in-memory queue and written by a
+    background task in multi-row transactions, flushed when a batch fills or
+    the flush interval elapses. When the queue is full new events are dropped
+    (and counted) rather than blocking the request path.
+    """
+    
+    row_label = "audit events"
+    
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        session_factory=SessionLocal
+    ):
+        super().__init__(max_queue_size, batch_size, flush_interval)
+        self.session_factory = session_factory
+    
+    def submit(
+        self,
+        action: str,
+        user_id: Optional[str] = None,
+        br_id: Optional[str] = None,
+        property_id: Optional[str] = None,
+        document_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Queue an audit event; returns its id, or None if it was dropped"""
+        event_id = uuid.uuid4()
+        row = {
+            "id": event_id,
+            "action": action,
+            "user_id": user_id,
+            "br_id": br_id,
+            "property_id": property_id,
+            "document_id": document_id,
+            "details": json.dumps(details) if details else None,
+            "ip_address": ip_address,
+            "timestamp": datetime.utcnow(),
+            "session_id": session_id
+        }
+        
+        if not self.enqueue(row):
+            return None
+        return str(event_id)
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        """Insert a batch of audit rows in a single transaction"""
+        db = self.session_factory()
+        try:
+            db.bulk_insert_mappings(AuditLog, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# Shared sink used by the request audit middleware
+audit_sink = BufferedAuditSink()
+
 # Middleware for automatic API request logging
 from fastapi import Request
-import time
 
 async def audit_middleware(request: Request, call_next):
     """Audit all API requests"""
@@ -356,14 +428,10 @@ async def audit_middleware(request: Request, call_next):
     # Process request
     response = await call_next(request)
     
-    # Log request
+    # Log request (buffered; written in batches by the audit sink)
     processing_time = time.time() - start_time
     
-    # Get audit logger
-    db = next(get_db())
-    audit_logger = AuditLogger(db)
-    
-    await audit_logger.log_event(
+    audit_sink.submit(
         action=f"API_{request.method}_{request.url.path}",
         user_id=user_id,
         details={
@@ -373,7 +441,7 @@ async def audit_middleware(request: Request, call_next):
             "status_code": response.status_code,
             "processing_time": processing_time
         },
-        ip_address=request.client.host
+        ip_address=request.client.host if request.client else None
     )
     
     return response
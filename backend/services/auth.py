@@ -10,23 +10,103 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from enum import Enum
+from collections import OrderedDict
 import os
+import threading
+import time
 from sqlalchemy.orm import Session
 
 from ..models.enhanced_schema import User, UserRole, AuditLog
 from ..database import get_db
+from ..utils.performance_recorder import set_request_user
 
 # Security configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 8
 
+# Authenticated principal cache (per process)
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "1024"))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # HTTP Bearer token
 security = HTTPBearer()
 
+class PrincipalCache:
+    """
+    Bounded, short-TTL cache of authenticated users keyed by user ID, so
+    get_current_user does not query the database on every request.
+    Entries are detached User instances. The cache is per process: role
+    changes and deactivations drop the entry in the process that made them,
+    but other API workers keep serving the cached user for up to ttl_seconds.
+    """
+    
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS,
+                 max_size: int = PRINCIPAL_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def get(self, user_id: str) -> Optional[User]:
+        """Cached user, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats['hits'] += 1
+            return user
+    
+    def put(self, user_id: str, user: User):
+        """Cache a user for ttl_seconds, evicting the least recently used"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def invalidate(self, user_id: str):
+        """Drop a user's cached principal"""
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self._stats['invalidations'] += 1
+    
+    def clear(self):
+        """Drop every cached principal"""
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate and current size"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+# Global principal cache instance
+principal_cache = PrincipalCache()
+
 class AuthService:
     """Authentication and authorization service"""
     
@@ -99,6 +179,27 @@ class AuthService:
         if user:
             user.last_login = datetime.utcnow()
             db.commit()
+            principal_cache.invalidate(user_id)
+    
+    def update_user_role(self, db: Session, user_id: str, role: UserRole) -> Optional[User]:
+        """Change a user's role; other workers see it within the principal cache TTL"""
+        user = self.get_user_by_id(db, user_id)
+        if user:
+            user.role = role
+            db.commit()
+            db.refresh(user)
+            principal_cache.invalidate(user_id)
+        return user
+    
+    def set_user_active(self, db: Session, user_id: str, is_active: bool) -> Optional[User]:
+        """Activate or deactivate a user; other workers see it within the principal cache TTL"""
+        user = self.get_user_by_id(db, user_id)
+        if user:
+            user.is_active = is_active
+            db.commit()
+            db.refresh(user)
+            principal_cache.invalidate(user_id)
+        return user
 
 # Global auth service instance
 auth_service = AuthService()
@@ -116,13 +217,26 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Invalid token"
         )
     
-    user = auth_service.get_user_by_id(db, user_id)
+    user_id = str(user_id)
+    user = principal_cache.get(user_id)
     if user is None:
+        user = auth_service.get_user_by_id(db, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        # Detach so the cached instance outlives this request's session
+        db.expunge(user)
+        principal_cache.put(user_id, user)
+    
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="Account is deactivated"
         )
     
+    set_request_user(user_id)
     return user
 
 def require_role(required_role: UserRole):
@@ -182,6 +296,12 @@ class UserCreate(BaseModel):
     password: str
     role: str
 
+class RoleUpdate(BaseModel):
+    role: str
+
+class StatusUpdate(BaseModel):
+    is_active: bool
+
 @router.post("/login", response_model=LoginResponse)
 async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     """Authenticate user and return JWT token"""
@@ -268,3 +388,39 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def logout(current_user: User = Depends(get_current_user)):
     """Logout user (client should discard token)"""
     return {"message": "Logged out successfully"}
+
+@router.put("/users/{user_id}/role")
+async def update_user_role(
+    user_id: str,
+    role_data: RoleUpdate,
+    current_user: User = Depends(require_supervisor),
+    db: Session = Depends(get_db)
+):
+    """Change a user's role (supervisor only)"""
+    try:
+        role = UserRole(role_data.role)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid role"
+        )
+    
+    user = auth_service.update_user_role(db, user_id, role)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    return {"user_id": str(user.id), "role": user.role.value}
+
+@router.put("/users/{user_id}/status")
+async def update_user_status(
+    user_id: str,
+    status_data: StatusUpdate,
+    current_user: User = Depends(require_supervisor),
+    db: Session = Depends(get_db)
+):
+    """Activate or deactivate a user (supervisor only)"""
+    user = auth_service.set_user_active(db, user_id, status_data.is_active)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    return {"user_id": str(user.id), "is_active": user.is_active}
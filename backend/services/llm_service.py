@@ -5,21 +5,41 @@ Local LLM service for document summarization and AI features
 
 import ollama
 import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional
+import os
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, List, Optional
 from datetime import datetime
 from pathlib import Path
 import json
 import re
 
+from ..utils.performance_recorder import record_cache
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of chunk requests in flight to Ollama at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Number of chunk/reduce summaries kept in the content-hash cache
+LLM_SUMMARY_CACHE_SIZE = int(os.getenv("LLM_SUMMARY_CACHE_SIZE", "2048"))
+
+CHUNK_SYSTEM_PROMPT = 'You are a commercial real estate analyst. Provide concise, accurate summaries with specific financial details.'
+COMBINE_SYSTEM_PROMPT = 'You are a real estate analyst creating comprehensive document summaries.'
+
 class LLMService:
     """Local LLM service using Ollama for document processing"""
     
-    def __init__(self, model_name: str = "phi3:mini"):
+    def __init__(self, model_name: str = "phi3:mini", host: Optional[str] = None):
         self.model_name = model_name
-        self.ollama_client = ollama
+        # Both clients honour OLLAMA_HOST unless host is given
+        self.ollama_client = ollama.Client(host=host) if host else ollama
+        # Non-blocking client for the summarization path
+        self.async_client = ollama.AsyncClient(host=host)
+        self._request_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._summary_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_stats = {'hits': 0, 'misses': 0}
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=4000,
             chunk_overlap=200
@@ -31,7 +51,7 @@ class LLMService:
         try:
             # Test connection
             models = self.ollama_client.list()
-            available_models = [model['name'] for model in models['models']]
+            available_models = model_names(models)
             
             if self.model_name in available_models:
                 logger.info(f"✅ Ollama model {self.model_name} is available")
@@ -66,47 +86,11 @@ class LLMService:
             }
         
         try:
-            # Split long documents
-            chunks = self.text_splitter.split_text(document_text)
-            
-            # Get appropriate prompt based on document type
-            if document_type == "lease":
-                prompt = self._get_lease_summary_prompt()
-            elif document_type == "offering_memorandum":
-                prompt = self._get_om_summary_prompt()
-            else:
-                prompt = self._get_general_summary_prompt()
-            
-            summaries = []
-            
-            # Process each chunk
-            for i, chunk in enumerate(chunks):
-                try:
-                    response = self.ollama_client.chat(
-                        model=self.model_name,
-                        messages=[
-                            {
-                                'role': 'system',
-                                'content': 'You are a commercial real estate analyst. Provide concise, accurate summaries with specific financial details.'
-                            },
-                            {
-                                'role': 'user',
-                                'content': f"{prompt}\n\n{chunk}"
-                            }
-                        ]
-                    )
-                    
-                    summary = response['message']['content']
-                    summaries.append(summary)
-                    
-                    logger.info(f"Processed chunk {i+1}/{len(chunks)} for {document_type}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing chunk {i+1}: {e}")
-                    summaries.append(f"Error processing chunk {i+1}: {str(e)}")
+            # Map: summarize chunks concurrently
+            summaries = await self._summarize_chunks(document_text, document_type)
             
-            # Combine chunk summaries
-            final_summary = self._combine_summaries(summaries, document_type)
+            # Reduce: combine chunk summaries
+            final_summary = await self._combine_summaries(summaries, document_type)
             
             # Calculate confidence based on consistency
             confidence = self._calculate_summary_confidence(summaries)
@@ -117,7 +101,7 @@ class LLMService:
                 'model': self.model_name,
                 'generated_at': datetime.utcnow(),
                 'machine_generated': True,
-                'chunks_processed': len(chunks),
+                'chunks_processed': len(summaries),
                 'property_id': property_id
             }
             
@@ -129,6 +113,112 @@ class LLMService:
                 "confidence": 0.0
             }
     
+    async def stream_document_summary(
+        self,
+        document_text: str,
+        document_type: str
+    ) -> AsyncIterator[str]:
+        """Summarize chunks concurrently, then stream the combined summary as it is generated"""
+        
+        if not self.is_available:
+            yield "LLM service is not available. Please check Ollama installation."
+            return
+        
+        summaries = await self._summarize_chunks(document_text, document_type)
+        async for content in self.stream_combined_summary(summaries, document_type):
+            yield content
+    
+    async def _summarize_chunks(self, document_text: str, document_type: str) -> List[str]:
+        """Split a document and summarize its chunks (bounded by LLM_MAX_CONCURRENCY)"""
+        
+        # Split long documents
+        chunks = self.text_splitter.split_text(document_text)
+        
+        # Get appropriate prompt based on document type
+        if document_type == "lease":
+            prompt = self._get_lease_summary_prompt()
+        elif document_type == "offering_memorandum":
+            prompt = self._get_om_summary_prompt()
+        else:
+            prompt = self._get_general_summary_prompt()
+        
+        summaries = await asyncio.gather(*[
+            self._summarize_chunk(prompt, chunk, i, len(chunks), document_type)
+            for i, chunk in enumerate(chunks)
+        ])
+        return list(summaries)
+    
+    async def _summarize_chunk(
+        self,
+        prompt: str,
+        chunk: str,
+        index: int,
+        total: int,
+        document_type: str
+    ) -> str:
+        """Summarize one chunk, reusing a cached result for unchanged content"""
+        cache_key = self._cache_key('chunk', prompt, chunk)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            logger.info(f"Chunk {index+1}/{total} for {document_type} served from cache")
+            return cached
+        
+        try:
+            async with self._request_slots:
+                response = await self.async_client.chat(
+                    model=self.model_name,
+                    messages=[
+                        {
+                            'role': 'system',
+                            'content': CHUNK_SYSTEM_PROMPT
+                        },
+                        {
+                            'role': 'user',
+                            'content': f"{prompt}\n\n{chunk}"
+                        }
+                    ]
+                )
+            
+            summary = response['message']['content']
+            self._cache_put(cache_key, summary)
+            
+            logger.info(f"Processed chunk {index+1}/{total} for {document_type}")
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Error processing chunk {index+1}: {e}")
+            return f"Error processing chunk {index+1}: {str(e)}"
+    
+    def _cache_key(self, kind: str, *parts: str) -> str:
+        """Content hash of the model, request kind and prompt text"""
+        digest = hashlib.sha256()
+        for part in (self.model_name, kind) + parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Look up a cached summary, refreshing its LRU position"""
+        summary = self._summary_cache.get(key)
+        record_cache(summary is not None)
+        if summary is None:
+            self.cache_stats['misses'] += 1
+            return None
+        self._summary_cache.move_to_end(key)
+        self.cache_stats['hits'] += 1
+        return summary
+    
+    def _cache_put(self, key: str, summary: str):
+        """Store a summary, evicting the least recently used entries"""
+        self._summary_cache[key] = summary
+        self._summary_cache.move_to_end(key)
+        while len(self._summary_cache) > LLM_SUMMARY_CACHE_SIZE:
+            self._summary_cache.popitem(last=False)
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Summary cache hit/miss counts and current size"""
+        return {**self.cache_stats, 'size': len(self._summary_cache)}
+    
     def _get_lease_summary_prompt(self) -> str:
         """Get prompt for lease document summarization"""
         return """Extract and summarize the following from this lease document:
@@ -215,17 +305,9 @@ Format as structured sections with specific financial metrics."""
 
 Provide specific financial figures and dates where available."""
     
-    def _combine_summaries(self, summaries: List[str], document_type: str) -> str:
-        """Combine multiple chunk summaries into final summary"""
-        
-        if not summaries:
-            return "No content to summarize."
-        
-        if len(summaries) == 1:
-            return summaries[0]
-        
-        # For multiple chunks, create a comprehensive summary
-        combined_prompt = f"""Combine the following summaries of a {document_type} document into a single, comprehensive summary:
+    def _build_combine_prompt(self, summaries: List[str], document_type: str) -> str:
+        """Prompt for the reduce step over chunk summaries"""
+        return f"""Combine the following summaries of a {document_type} document into a single, comprehensive summary:
 
 {chr(10).join([f"Summary {i+1}: {summary}" for i, summary in enumerate(summaries)])}
 
@@ -237,29 +319,72 @@ Provide a unified summary that:
 - Includes specific figures and dates
 
 Format as a structured document with clear sections."""
+    
+    async def stream_combined_summary(
+        self,
+        summaries: List[str],
+        document_type: str
+    ) -> AsyncIterator[str]:
+        """Stream the combined summary piece by piece as Ollama generates it"""
+        
+        if not summaries:
+            yield "No content to summarize."
+            return
+        
+        if len(summaries) == 1:
+            yield summaries[0]
+            return
+        
+        if not self.is_available:
+            # Fallback: simple concatenation
+            yield "\n\n".join(summaries)
+            return
         
+        combined_prompt = self._build_combine_prompt(summaries, document_type)
+        cache_key = self._cache_key('combine', combined_prompt)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
         try:
-            if self.is_available:
-                response = self.ollama_client.chat(
+            async with self._request_slots:
+                stream = await self.async_client.chat(
                     model=self.model_name,
                     messages=[
                         {
                             'role': 'system',
-                            'content': 'You are a real estate analyst creating comprehensive document summaries.'
+                            'content': COMBINE_SYSTEM_PROMPT
                         },
                         {
                             'role': 'user',
                             'content': combined_prompt
                         }
-                    ]
+                    ],
+                    stream=True
                 )
-                return response['message']['content']
-            else:
-                # Fallback: simple concatenation
-                return "\n\n".join(summaries)
+                async for part in stream:
+                    content = part['message']['content']
+                    if content:
+                        parts.append(content)
+                        yield content
         except Exception as e:
             logger.error(f"Error combining summaries: {e}")
-            return "\n\n".join(summaries)
+            if not parts:
+                # Nothing sent yet: fall back to the chunk summaries
+                yield "\n\n".join(summaries)
+            return
+        
+        self._cache_put(cache_key, "".join(parts))
+    
+    async def _combine_summaries(self, summaries: List[str], document_type: str) -> str:
+        """Combine multiple chunk summaries into final summary"""
+        
+        parts = []
+        async for content in self.stream_combined_summary(summaries, document_type):
+            parts.append(content)
+        return "".join(parts)
     
     def _calculate_summary_confidence(self, summaries: List[str]) -> float:
         """Calculate confidence based on consistency across chunks"""
@@ -427,6 +552,10 @@ Format as a structured analysis with specific insights and recommendations."""
                 "confidence": 0.0
             }
 
+def model_names(models) -> List[str]:
+    """Model names from an Ollama list response (older clients report 'name', newer 'model')"""
+    return [model.get('model') or model.get('name') for model in models['models']]
+
 # Text splitter for long documents
 class RecursiveCharacterTextSplitter:
     """Simple text splitter for long documents"""
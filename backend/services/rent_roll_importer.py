@@ -10,6 +10,8 @@ from typing import List, Dict, Any, Tuple
 from datetime import datetime
 import logging
 
+from ..utils.tagged_cache import publish_invalidation
+
 logger = logging.getLogger(__name__)
 
 
@@ -65,6 +67,9 @@ class RentRollImporter:
             
             conn.close()
             
+            # Cached analytics are computed from stores and property metrics
+            publish_invalidation(["stores", "properties"])
+            
             return {
                 'status': 'success',
                 'imported_count': imported_count,
@@ -0,0 +1,153 @@
+"""
+Tests for the streaming analytics export (run with pytest)
+
+Rows come from iter_export_chunks over an in-memory database with the summary
+sections stubbed, then go through each encoder and are read back.
+"""
+import asyncio
+import csv
+import io
+import json
+import math
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.enhanced_schema import Base, EnhancedProperty, ExtractedMetric, FinancialDocument
+from backend.services import analytics_export as export_module
+from backend.services.analytics_engine import AnalyticsEngine
+
+
+UPDATED_AT = datetime(2025, 1, 2, 3, 4, 5)
+
+SECTIONS = {
+    "get_dashboard_metrics": {
+        "total_properties": 2,
+        "average_occupancy": float("nan"),
+        "updated_at": UPDATED_AT,
+        "note": None,
+        "alerts": [{"level": "high"}],
+    },
+    "get_portfolio_analytics": {"financial_metrics": {"total_noi": 1234.5}},
+    "get_kpi_dashboard": {},
+}
+
+
+def _section_stub(result):
+    async def compute(self):
+        return result
+    return compute
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [EnhancedProperty.__table__, FinancialDocument.__table__, ExtractedMetric.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    session_factory = sessionmaker(bind=engine)
+
+    db = session_factory()
+    property_id = uuid.uuid4()
+    prop = EnhancedProperty(id=property_id, name="Property a", address="1 Main St")
+    document = FinancialDocument(id=uuid.uuid4(), property_id=prop.id, file_path="a.pdf",
+                                 document_type="financial_statement")
+    db.add_all([prop, document])
+    now = datetime.utcnow()
+    for i, (name, value) in enumerate([("noi", 1500.0), ("cap_rate", 0.057), ("occupancy", 0.91)]):
+        db.add(ExtractedMetric(document_id=document.id, metric_name=name, metric_value=value,
+                               confidence_score=0.9, extraction_method="table_structured",
+                               created_at=now - timedelta(days=3, hours=-i)))
+    # Outside the date range
+    db.add(ExtractedMetric(document_id=document.id, metric_name="noi", metric_value=99999,
+                           confidence_score=0.9, extraction_method="table_structured",
+                           created_at=now - timedelta(days=60)))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(export_module, "SessionLocal", session_factory)
+    monkeypatch.setattr(export_module, "EXPORT_CHUNK_ROWS", 2)
+    for method, result in SECTIONS.items():
+        monkeypatch.setattr(AnalyticsEngine, method, _section_stub(result))
+
+    async def collect():
+        return [rows async for rows in export_module.iter_export_chunks(30)]
+
+    yield asyncio.run(collect()), str(property_id)
+    engine.dispose()
+
+
+def _encode(encoder, chunks):
+    async def replay():
+        for rows in chunks:
+            yield rows
+
+    async def collect():
+        return b"".join([data async for data in encoder(replay())])
+
+    return asyncio.run(collect())
+
+
+def _rows(chunks):
+    return [row for rows in chunks for row in rows]
+
+
+def test_chunks_are_bounded_and_skip_old_metrics(chunks):
+    chunks, property_id = chunks
+    assert all(0 < len(rows) <= 2 for rows in chunks)
+
+    history = [row for row in _rows(chunks) if row["section"] == "extracted_metrics"]
+    assert [row["metric"] for row in history] == ["noi", "cap_rate", "occupancy"]
+    assert [row["value"] for row in history] == [1500.0, 0.057, 0.91]
+    assert all(row["property_id"] == property_id and row["confidence"] == 0.9 for row in history)
+
+
+def test_value_and_text_value_columns(chunks):
+    chunks, _ = chunks
+    rows = {row["metric"]: row for row in _rows(chunks) if row["section"] != "extracted_metrics"}
+
+    assert rows["total_properties"]["value"] == 2.0
+    assert rows["total_properties"]["text_value"] is None
+    # NaN is not a JSON number, so it is exported as text
+    assert rows["average_occupancy"]["value"] is None
+    assert rows["average_occupancy"]["text_value"] == "nan"
+    assert rows["updated_at"]["value"] is None
+    assert rows["updated_at"]["text_value"] == UPDATED_AT.isoformat()
+    assert rows["note"]["value"] is None and rows["note"]["text_value"] is None
+    assert rows["alerts.0.level"]["text_value"] == "high"
+    assert rows["financial_metrics.total_noi"]["section"] == "portfolio_analytics"
+    assert rows["financial_metrics.total_noi"]["value"] == 1234.5
+
+
+def test_csv_round_trips(chunks):
+    chunks, _ = chunks
+    reader = csv.DictReader(io.StringIO(_encode(export_module.stream_csv, chunks).decode("utf-8")))
+
+    assert reader.fieldnames == export_module.EXPORT_COLUMNS
+    expected = [
+        {column: "" if row[column] is None else str(row[column]) for column in export_module.EXPORT_COLUMNS}
+        for row in _rows(chunks)
+    ]
+    assert list(reader) == expected
+
+
+def test_ndjson_round_trips(chunks):
+    chunks, _ = chunks
+    lines = _encode(export_module.stream_ndjson, chunks).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == _rows(chunks)
+
+
+@pytest.mark.skipif(not export_module.PARQUET_AVAILABLE, reason="pyarrow is not installed")
+def test_parquet_reads_back(chunks):
+    import pyarrow.parquet as pq
+
+    chunks, _ = chunks
+    table = pq.read_table(io.BytesIO(_encode(export_module.stream_parquet, chunks)))
+
+    assert table.column_names == export_module.EXPORT_COLUMNS
+    rows = table.to_pylist()
+    assert rows == _rows(chunks)
+    assert not any(isinstance(row["value"], float) and math.isnan(row["value"]) for row in rows)
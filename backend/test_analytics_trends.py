@@ -0,0 +1,138 @@
+"""
+Tests for the SQL / vectorized metric trend fits (run with pytest)
+
+Both are checked against np.polyfit(range(n), values, 1), which the
+per-row implementation they replaced used.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.enhanced_schema import Base, EnhancedProperty, ExtractedMetric, FinancialDocument
+from backend.services.analytics_engine import AnalyticsEngine
+
+
+START = datetime.utcnow() - timedelta(days=20)
+
+# property -> metric -> values in observation order
+SERIES = {
+    "a": {
+        "noi": [1200.0, 1350.5, 1100.0, 1600.25, 1580.0, 1710.0],
+        "occupancy": [0.91, 0.89, 0.93],
+        "cap_rate": [0.057, 0.0625, 0.0049],
+        "vacancy": [4.0, 4.0, 4.0, 4.0],
+        "single": [10.0],
+    },
+    "b": {
+        "noi": [900.0, 850.0, 700.0, 725.5],
+        "occupancy": [0.0, 0.5],
+    },
+}
+
+
+@pytest.fixture
+def engine_and_ids():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [EnhancedProperty.__table__, FinancialDocument.__table__, ExtractedMetric.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    db = sessionmaker(bind=engine)()
+
+    property_ids = {}
+    for name, metrics in SERIES.items():
+        prop = EnhancedProperty(id=uuid.uuid4(), name=f"Property {name}", address="1 Main St")
+        document = FinancialDocument(id=uuid.uuid4(), property_id=prop.id, file_path=f"{name}.pdf",
+                                     document_type="financial_statement")
+        db.add_all([prop, document])
+        property_ids[name] = str(prop.id)
+        for metric_name, values in metrics.items():
+            # Inserted newest first, so only created_at gives the order
+            for i, value in reversed(list(enumerate(values))):
+                db.add(ExtractedMetric(
+                    document_id=document.id, metric_name=f"{name}_{metric_name}",
+                    metric_value=value, confidence_score=0.9, extraction_method="table_structured",
+                    created_at=START + timedelta(hours=i)
+                ))
+    # An observation before the window is ignored
+    db.add(ExtractedMetric(document_id=document.id, metric_name="b_noi", metric_value=99999,
+                           confidence_score=0.9, extraction_method="table_structured",
+                           created_at=START - timedelta(days=30)))
+    db.commit()
+    yield AnalyticsEngine(db, None), property_ids
+    db.close()
+
+
+def _expected(values):
+    return np.polyfit(range(len(values)), values, 1)[0]
+
+
+def test_metric_trend_statistics_matches_polyfit(engine_and_ids):
+    engine, _ = engine_and_ids
+    trends = engine.metric_trend_statistics(START - timedelta(days=1))
+
+    expected_names = {f"{p}_{m}" for p, metrics in SERIES.items() for m, v in metrics.items() if len(v) >= 2}
+    assert set(trends) == expected_names
+
+    for name in expected_names:
+        prop, metric = name.split("_", 1)
+        values = SERIES[prop][metric]
+        trend = trends[name]
+        assert trend["trend_slope"] == pytest.approx(_expected(values), abs=1e-9)
+        assert trend["data_points"] == len(values)
+        assert trend["previous_value"] == pytest.approx(values[0])
+        assert trend["current_value"] == pytest.approx(values[-1])
+
+    assert trends["a_vacancy"]["trend_direction"] == "stable"
+    assert trends["a_noi"]["trend_direction"] == "increasing"
+    assert trends["b_noi"]["trend_direction"] == "decreasing"
+    assert trends["b_occupancy"]["change_pct"] == 0
+
+
+def test_metric_trend_statistics_filters_metric_names(engine_and_ids):
+    engine, _ = engine_and_ids
+    trends = engine.metric_trend_statistics(START - timedelta(days=1), ["a_noi", "b_noi"])
+    assert set(trends) == {"a_noi", "b_noi"}
+
+
+def test_metric_daily_series_keeps_fractional_values(engine_and_ids):
+    engine, _ = engine_and_ids
+    series = engine.metric_daily_series(START - timedelta(days=1))
+
+    for prop, metrics in SERIES.items():
+        for metric, values in metrics.items():
+            by_day = {}
+            for i, value in enumerate(values):
+                by_day.setdefault(str((START + timedelta(hours=i)).date()), []).append(value)
+            columns = series[f"{prop}_{metric}"]
+            assert columns["dates"] == sorted(by_day)
+            assert columns["counts"] == [len(by_day[d]) for d in columns["dates"]]
+            expected = [sum(by_day[d]) / len(by_day[d]) for d in columns["dates"]]
+            # Ratios are stored as fractions, so nothing may be rounded away
+            assert columns["values"] == pytest.approx(expected, rel=1e-12, abs=0)
+
+
+def test_compare_property_trends_matches_polyfit(engine_and_ids):
+    engine, property_ids = engine_and_ids
+    analyses = asyncio.run(engine.compare_property_trends(
+        list(property_ids.values()) + ["not-a-uuid"], days_back=25
+    ))
+
+    assert set(analyses) == set(property_ids.values())
+    for prop, metrics in SERIES.items():
+        analysis = analyses[property_ids[prop]]
+        for metric, values in metrics.items():
+            name = f"{prop}_{metric}"
+            assert analysis["trends_data"][name]["values"] == pytest.approx(values)
+            if len(values) < 2:
+                assert name not in analysis["trend_analysis"]
+                continue
+            trend = analysis["trend_analysis"][name]
+            assert trend["trend_slope"] == pytest.approx(_expected(values), abs=1e-9)
+            assert trend["data_points"] == len(values)
+            expected_change = (values[-1] - values[0]) / values[0] * 100 if values[0] else 0
+            assert trend["change_pct"] == pytest.approx(expected_change)
@@ -0,0 +1,86 @@
+"""
+Tests for BufferedAuditSink shutdown (run with pytest)
+"""
+import asyncio
+
+from backend.services.audit_log import BufferedAuditSink
+
+
+class RecordingSession:
+    """Stands in for a SQLAlchemy session, recording committed rows"""
+
+    def __init__(self, written):
+        self.written = written
+        self.pending = []
+
+    def bulk_insert_mappings(self, model, rows):
+        self.pending.extend(rows)
+
+    def commit(self):
+        self.written.extend(self.pending)
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+def _sink(written, **kwargs):
+    return BufferedAuditSink(session_factory=lambda: RecordingSession(written), **kwargs)
+
+
+def test_stop_writes_the_batch_being_assembled():
+    written = []
+
+    async def scenario():
+        sink = _sink(written, batch_size=100, flush_interval=60)
+        for i in range(5):
+            sink.submit(f"action-{i}")
+        # Let the flush task take the events into its (unfilled) batch
+        await asyncio.sleep(0.05)
+        await sink.stop()
+        return sink.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert [row["action"] for row in written] == [f"action-{i}" for i in range(5)]
+    assert stats["written"] == 5
+    assert stats["pending"] == 0
+
+
+def test_stop_writes_events_still_queued():
+    written = []
+
+    async def scenario():
+        sink = _sink(written, batch_size=2, flush_interval=60)
+        for i in range(7):
+            sink.submit(f"action-{i}")
+        await sink.stop()
+        return sink.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert sorted(row["action"] for row in written) == sorted(f"action-{i}" for i in range(7))
+    assert stats["written"] == 7
+    assert stats["failed"] == 0
+
+
+def test_stop_waits_for_a_flush_in_progress():
+    written = []
+
+    class SlowSession(RecordingSession):
+        def commit(self):
+            import time
+            time.sleep(0.2)
+            super().commit()
+
+    async def scenario():
+        sink = BufferedAuditSink(session_factory=lambda: SlowSession(written),
+                                 batch_size=3, flush_interval=60)
+        for i in range(3):
+            sink.submit(f"action-{i}")
+        # The full batch is now being written in a worker thread
+        await asyncio.sleep(0.05)
+        await sink.stop()
+
+    asyncio.run(scenario())
+    assert len(written) == 3
@@ -0,0 +1,83 @@
+"""
+Tests for document download Range / conditional request handling (run with pytest)
+"""
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from backend.api.routes.documents import _not_modified, _range_applies, parse_range_header
+
+
+SIZE = 100
+ETAG = '"abc123"'
+LAST_MODIFIED = datetime(2024, 3, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+LAST_MODIFIED_HEADER = "Fri, 01 Mar 2024 12:00:00 GMT"
+
+
+def _request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-10", (10, 10)),
+    ("bytes=90-200", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=95-", (95, 99)),
+    ("bytes=0-", (0, 99)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range_header(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=100-", "bytes=150-160", "bytes=20-10", "bytes=-0",
+])
+def test_unsatisfiable_ranges_raise_416(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range_header(header, SIZE)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+@pytest.mark.parametrize("header", [
+    None, "", "bytes=0-9,20-29", "items=0-9", "bytes=", "bytes=-", "bytes=5",
+    "bytes=a-b", "bytes=5--3", "bytes=-5-3", "bytes=+5-9", "bytes=0x1-9",
+])
+def test_multi_range_and_malformed_headers_are_ignored(header):
+    assert parse_range_header(header, SIZE) is None
+
+
+def test_if_none_match():
+    assert _not_modified(_request(if_none_match=ETAG), ETAG, LAST_MODIFIED)
+    assert _not_modified(_request(if_none_match=f'"other", W/{ETAG}'), ETAG, LAST_MODIFIED)
+    assert _not_modified(_request(if_none_match="*"), ETAG, LAST_MODIFIED)
+    assert not _not_modified(_request(if_none_match='"other"'), ETAG, LAST_MODIFIED)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    request = _request(if_none_match='"other"', if_modified_since=LAST_MODIFIED_HEADER)
+    assert not _not_modified(request, ETAG, LAST_MODIFIED)
+
+
+def test_if_modified_since():
+    assert _not_modified(_request(if_modified_since=LAST_MODIFIED_HEADER), ETAG, LAST_MODIFIED)
+    assert _not_modified(_request(if_modified_since="Sat, 02 Mar 2024 00:00:00 GMT"), ETAG, LAST_MODIFIED)
+    assert not _not_modified(_request(if_modified_since="Thu, 29 Feb 2024 00:00:00 GMT"), ETAG, LAST_MODIFIED)
+    assert not _not_modified(_request(if_modified_since="not a date"), ETAG, LAST_MODIFIED)
+    assert not _not_modified(_request(), ETAG, LAST_MODIFIED)
+
+
+def test_if_range():
+    assert _range_applies(_request(), ETAG, LAST_MODIFIED_HEADER)
+    assert _range_applies(_request(if_range=ETAG), ETAG, LAST_MODIFIED_HEADER)
+    assert _range_applies(_request(if_range=LAST_MODIFIED_HEADER), ETAG, LAST_MODIFIED_HEADER)
+    assert not _range_applies(_request(if_range='"stale"'), ETAG, LAST_MODIFIED_HEADER)
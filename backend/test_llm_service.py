@@ -0,0 +1,221 @@
+"""
+Tests for LLMService summarization against a local stub Ollama server (run with pytest)
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api import ai_features
+from backend.database import get_db
+from backend.services import llm_service as llm_module
+from backend.services.audit_log import get_audit_logger
+from backend.services.auth import require_analyst
+from backend.services.llm_service import COMBINE_SYSTEM_PROMPT, LLMService
+
+
+MODEL = "phi3:mini"
+CHUNK_DELAY = 0.2
+COMBINED_PIECES = ["Combined ", "summary ", "of chunks."]
+
+
+class StubOllama(ThreadingHTTPServer):
+    """Answers /api/tags and /api/chat, recording every chat request"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.chats = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": MODEL, "model": MODEL}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.chats.append(body)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if body["messages"][0]["content"] == COMBINE_SYSTEM_PROMPT:
+                self._combine(body)
+            else:
+                time.sleep(CHUNK_DELAY)
+                text = body["messages"][-1]["content"]
+                digest = hashlib.sha256(text.encode()).hexdigest()[:12]
+                self._send_json(_message(f"summary {digest}", done=True))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _combine(self, body):
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for piece in COMBINED_PIECES:
+            self.wfile.write(json.dumps(_message(piece)).encode() + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps(_message("", done=True)).encode() + b"\n")
+
+
+def _message(content, done=False):
+    return {
+        "model": MODEL,
+        "created_at": "2024-01-01T00:00:00Z",
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+
+
+def _document(chunks):
+    # The splitter cuts 4000-character chunks every 3800 characters
+    words = "".join(f"w{i:06d} " for i in range(chunks * 500))
+    return words[:4000 + (chunks - 1) * 3800]
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(stub, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_MAX_CONCURRENCY", 3)
+    service = LLMService(MODEL, host=stub.url)
+    assert service.is_available
+    return service
+
+
+def _chunk_chats(stub):
+    return [chat for chat in stub.chats if chat["messages"][0]["content"] != COMBINE_SYSTEM_PROMPT]
+
+
+def test_chunks_are_summarized_concurrently_within_the_limit(service, stub):
+    started = time.monotonic()
+    result = asyncio.run(service.summarize_document(_document(6), "lease"))
+    elapsed = time.monotonic() - started
+
+    assert result["chunks_processed"] == 6
+    assert result["summary"] == "".join(COMBINED_PIECES)
+    assert len(_chunk_chats(stub)) == 6
+    assert stub.max_in_flight == 3
+    # Two waves of three, not six serial requests
+    assert elapsed < 6 * CHUNK_DELAY
+
+
+def test_unchanged_document_is_served_from_the_cache(service, stub):
+    async def summarize_twice():
+        first = await service.summarize_document(_document(3), "lease")
+        calls = len(stub.chats)
+        second = await service.summarize_document(_document(3), "lease")
+        return first, calls, second
+
+    first, calls, second = asyncio.run(summarize_twice())
+
+    assert calls == 4
+    assert len(stub.chats) == calls
+    assert second["summary"] == first["summary"]
+    assert service.get_cache_stats()["hits"] == 4
+
+
+def test_changed_chunk_is_the_only_one_resent(service, stub):
+    async def summarize_edited():
+        await service.summarize_document(_document(3), "lease")
+        # Inside the second chunk only, clear of both overlaps
+        edited = _document(3)[:5800] + "EDITED" + _document(3)[5806:]
+        await service.summarize_document(edited, "lease")
+
+    asyncio.run(summarize_edited())
+
+    # Three chunks, then the edited chunk; the reduce prompt changed too
+    assert len(_chunk_chats(stub)) == 4
+    assert len(stub.chats) == 6
+
+
+def test_combined_summary_is_streamed_in_pieces(service):
+    async def collect():
+        return [piece async for piece in service.stream_document_summary(_document(2), "lease")]
+
+    assert asyncio.run(collect()) == COMBINED_PIECES
+
+
+class Documents:
+    """Session stand-in holding one document for FinancialDocument.id lookups"""
+
+    def __init__(self, document):
+        self.document = document
+        self.wanted = None
+
+    def query(self, model):
+        return self
+
+    def filter(self, condition):
+        self.wanted = condition.right.value
+        return self
+
+    def first(self):
+        return self.document if str(self.document.id) == self.wanted else None
+
+
+def test_stream_endpoint_returns_combined_summary(service, tmp_path):
+    document_file = tmp_path / "lease.txt"
+    document_file.write_text(_document(2), encoding="utf-8")
+    document = SimpleNamespace(id=uuid.uuid4(), property_id=uuid.uuid4(), file_path=str(document_file))
+
+    events = []
+
+    class AuditLogger:
+        async def log_event(self, **event):
+            events.append(event)
+
+    app = FastAPI()
+    app.include_router(ai_features.router)
+    app.dependency_overrides[require_analyst] = lambda: SimpleNamespace(id="analyst")
+    app.dependency_overrides[get_db] = lambda: Documents(document)
+    app.dependency_overrides[ai_features.get_llm_service] = lambda: service
+    app.dependency_overrides[get_audit_logger] = lambda: AuditLogger()
+
+    with TestClient(app) as client:
+        response = client.post(f"/ai/summarize/{document.id}/stream", data={"document_type": "lease"})
+        missing = client.post(f"/ai/summarize/{uuid.uuid4()}/stream", data={"document_type": "lease"})
+
+    assert response.status_code == 200
+    assert response.text == "".join(COMBINED_PIECES)
+    assert events[0]["document_id"] == str(document.id)
+    assert missing.status_code == 404
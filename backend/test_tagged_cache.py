@@ -0,0 +1,113 @@
+"""
+Tests for the tagged aggregate cache (run with pytest; needs fakeredis)
+"""
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from backend.utils.tagged_cache import TaggedCache
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def cache():
+    return TaggedCache()
+
+
+class Counter:
+    """compute callback returning 1, 2, 3... and counting its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_second_read_is_a_hit(redis_client, cache):
+    compute = Counter()
+
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (1, "miss")
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (1, "hit")
+    assert compute.calls == 1
+
+
+def test_invalidated_entry_is_recomputed_once(redis_client, cache):
+    compute = Counter()
+    cache.get_or_compute(redis_client, "k", ["documents", "processing"], compute)
+
+    cache.invalidate(redis_client, ["processing"])
+
+    assert cache.get_or_compute(redis_client, "k", ["documents", "processing"], compute) == (2, "miss")
+    assert cache.get_or_compute(redis_client, "k", ["documents", "processing"], compute) == (2, "hit")
+    assert compute.calls == 2
+
+
+def test_other_tags_do_not_invalidate(redis_client, cache):
+    compute = Counter()
+    cache.get_or_compute(redis_client, "k", ["documents"], compute)
+
+    cache.invalidate(redis_client, ["alerts"])
+
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (1, "hit")
+
+
+def test_stale_entry_is_served_while_it_refreshes(redis_client, cache):
+    cache.get_or_compute(redis_client, "k", ["documents"], lambda: "old")
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_compute():
+        started.set()
+        release.wait(2)
+        return "new"
+
+    # Past fresh_ttl: the old value is returned and a refresh starts
+    assert cache.get_or_compute(redis_client, "k", ["documents"], slow_compute, fresh_ttl=0) == ("old", "stale")
+    assert started.wait(2)
+
+    # Still refreshing: readers keep getting the old value without computing
+    unused = Counter()
+    assert cache.get_or_compute(redis_client, "k", ["documents"], unused, fresh_ttl=0) == ("old", "stale")
+    assert unused.calls == 0
+
+    release.set()
+    _wait_for(lambda: cache.get_stats()["refreshes"] == 1)
+    assert cache.get_or_compute(redis_client, "k", ["documents"], unused) == ("new", "hit")
+
+
+def test_write_during_compute_leaves_entry_invalid(redis_client, cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            # A write lands after the computation read its data
+            cache.invalidate(redis_client, ["documents"])
+        return len(calls)
+
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (1, "miss")
+    # The stored entry predates the write, so the next read recomputes
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (2, "miss")
+    assert cache.get_or_compute(redis_client, "k", ["documents"], compute) == (2, "hit")
+
+
+def test_without_redis_every_read_computes(cache):
+    compute = Counter()
+
+    assert cache.get_or_compute(None, "k", ["documents"], compute) == (1, "bypass")
+    assert cache.get_or_compute(None, "k", ["documents"], compute) == (2, "bypass")
@@ -0,0 +1,131 @@
+"""
+Buffered Sink Utility
+Bounded in-memory queue drained by a background task that writes rows in
+batches, so request handlers never wait on a database insert
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedSink(ABC):
+    """
+    Base class for batched background writers.
+
+    Rows are queued in a bounded asyncio queue and written by a background
+    task, flushed when a batch fills or the flush interval elapses. When the
+    queue is full new rows are dropped (and counted) rather than blocking the
+    caller. Subclasses implement _write_rows, which runs in a worker thread.
+    """
+
+    # Used in log messages ("Failed to write 20 audit events")
+    row_label = "rows"
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 1.0):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_delay_seconds": 0.0
+        }
+
+    def start(self):
+        """Start the background flush task on the running event loop"""
+        if self._task and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task, writing out everything still buffered"""
+        if not self._task:
+            return
+        if not self._task.done():
+            # Sentinel rather than cancel(), so the batch being assembled is not lost
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """Queue a row for writing; returns False if it was dropped"""
+        if not self._task or self._task.done():
+            self.start()
+
+        try:
+            self._queue.put_nowait((time.monotonic(), row))
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            return False
+
+        self._stats["enqueued"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for monitoring: written, dropped, failed and worst-case write delay"""
+        return {
+            **self._stats,
+            "pending": self._queue.qsize() if self._queue else 0
+        }
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    await self._flush(batch)
+                    return
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        rows = [row for _, row in batch]
+        try:
+            await asyncio.to_thread(self._write_rows, rows)
+        except Exception as e:
+            self._stats["failed"] += len(rows)
+            logger.error(f"Failed to write {len(rows)} {self.row_label}: {str(e).splitlines()[0]}")
+            return
+
+        oldest = min(enqueued_at for enqueued_at, _ in batch)
+        self._stats["written"] += len(rows)
+        self._stats["batches"] += 1
+        self._stats["max_delay_seconds"] = max(
+            self._stats["max_delay_seconds"], round(time.monotonic() - oldest, 3)
+        )
+
+    @abstractmethod
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        """Insert a batch of rows in a single transaction"""
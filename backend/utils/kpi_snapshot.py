@@ -0,0 +1,358 @@
+"""
+KPI Snapshots
+Materialized KPI payloads in the kpi_snapshot table. Each scope (one KPI
+endpoint's payload) is recomputed in a single pass when the entities it is
+built from change - the tagged cache's invalidation events name them - or
+when it gets older than KPI_SNAPSHOT_MAX_AGE. Endpoints read the latest
+snapshot and a short history (for sparklines) with one indexed query.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import (Column, DateTime, Index, Integer, MetaData, String,
+                        Table, Text, select)
+
+from .tagged_cache import INVALIDATION_CHANNEL, RELEASE_KEY_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Snapshots kept per scope (the newest is served, all of them feed sparklines)
+KPI_SNAPSHOT_HISTORY = int(os.getenv("KPI_SNAPSHOT_HISTORY", "96"))
+
+# Recompute even without writes after this many seconds (time-window KPIs
+# such as "uploads today" drift on their own)
+KPI_SNAPSHOT_MAX_AGE = int(os.getenv("KPI_SNAPSHOT_MAX_AGE", "300"))
+
+# Invalidations arriving within this many seconds share one recomputation
+KPI_SNAPSHOT_DEBOUNCE = float(os.getenv("KPI_SNAPSHOT_DEBOUNCE", "1.0"))
+
+# Cross-process refresh lock (only one API process recomputes a scope)
+REFRESH_LOCK_SECONDS = 60
+
+_metadata = MetaData()
+
+kpi_snapshot = Table(
+    "kpi_snapshot", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("scope", String(50), nullable=False),
+    Column("computed_at", DateTime, nullable=False),
+    Column("reason", String(100)),
+    Column("compute_ms", Integer),
+    Column("metrics", Text, nullable=False),
+    Index("idx_kpi_snapshot_scope_time", "scope", "computed_at"),
+)
+
+
+class KpiSnapshotStore:
+    """
+    Usage:
+        kpi_store = KpiSnapshotStore(engine)
+        kpi_store.register("financial", compute_financial_kpis, ["properties"])
+        install_kpi_snapshots(app, kpi_store, get_redis=lambda: redis_client)
+        ...
+        snapshots = kpi_store.get("financial")   # newest first
+
+    compute(conn) receives a connection inside a transaction and returns
+    a JSON-serializable dict.
+    """
+
+    def __init__(self, engine, get_redis: Callable[[], Any] = None, history: int = None,
+                 max_age: int = None, debounce: float = None):
+        self.engine = engine
+        self.get_redis = get_redis
+        self.history = history or KPI_SNAPSHOT_HISTORY
+        self.max_age = KPI_SNAPSHOT_MAX_AGE if max_age is None else max_age
+        self.debounce = KPI_SNAPSHOT_DEBOUNCE if debounce is None else debounce
+        self._scopes: Dict[str, tuple] = {}
+        self._table_ready = False
+        self._scope_locks: Dict[str, threading.Lock] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"refreshes": 0, "skipped": 0, "failures": 0, "invalidations": 0}
+        self._compute_ms: Dict[str, int] = {}
+
+    def register(self, scope: str, compute: Callable[[Any], Dict[str, Any]], tags: Iterable[str]):
+        """Materialize compute's result as scope, recomputed when any of tags is invalidated"""
+        self._scopes[scope] = (compute, frozenset(tags))
+        self._scope_locks[scope] = threading.Lock()
+
+    def snapshots(self, scope: str, limit: int = None) -> List[Dict[str, Any]]:
+        """Latest snapshots of scope, newest first (one read on the scope/time index)"""
+        self._ensure_table()
+        query = (
+            select(kpi_snapshot.c.computed_at, kpi_snapshot.c.reason, kpi_snapshot.c.metrics)
+            .where(kpi_snapshot.c.scope == scope)
+            .order_by(kpi_snapshot.c.computed_at.desc())
+            .limit(limit or self.history)
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        return [
+            {"computed_at": row.computed_at, "reason": row.reason, "metrics": json.loads(row.metrics)}
+            for row in rows
+        ]
+
+    def get(self, scope: str, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Snapshots of scope for serving, newest first. The first read computes
+        the scope; an outdated snapshot is served while a refresh is queued.
+        """
+        rows = self.snapshots(scope, limit)
+        if not rows:
+            self.refresh(scope, "initial", exclusive=False)
+            return self.snapshots(scope, limit)
+
+        age = (datetime.utcnow() - rows[0]["computed_at"]).total_seconds()
+        self._last_seen[scope] = time.time() - age
+        if age >= self.max_age:
+            if self.running:
+                self.request(scope, "max_age")
+            else:
+                self.refresh(scope, "max_age")
+                return self.snapshots(scope, limit)
+        return rows
+
+    def refresh(self, scope: str, reason: str = "manual", exclusive: bool = True) -> bool:
+        """
+        Recompute scope and append the snapshot (pruning old history).
+        Returns False if another process holds the refresh lock.
+        """
+        compute, _ = self._scopes[scope]
+        token = None
+        redis_client = self.redis_client if exclusive else None
+        if redis_client is not None:
+            token = self._acquire(redis_client, scope)
+            if token is None:
+                self._last_seen[scope] = time.time()
+                self._count("skipped")
+                return False
+
+        self._ensure_table()
+        try:
+            with self._scope_locks[scope]:
+                started = time.perf_counter()
+                with self.engine.begin() as conn:
+                    metrics = compute(conn)
+                    compute_ms = int((time.perf_counter() - started) * 1000)
+                    conn.execute(kpi_snapshot.insert().values(
+                        scope=scope,
+                        computed_at=datetime.utcnow(),
+                        reason=reason[:100],
+                        compute_ms=compute_ms,
+                        metrics=json.dumps(metrics, default=str)
+                    ))
+                    keep = (
+                        select(kpi_snapshot.c.id)
+                        .where(kpi_snapshot.c.scope == scope)
+                        .order_by(kpi_snapshot.c.computed_at.desc())
+                        .limit(self.history)
+                    )
+                    conn.execute(
+                        kpi_snapshot.delete()
+                        .where(kpi_snapshot.c.scope == scope)
+                        .where(kpi_snapshot.c.id.notin_(select(keep.subquery().c.id)))
+                    )
+            self._last_seen[scope] = time.time()
+            self._compute_ms[scope] = compute_ms
+            self._count("refreshes")
+            return True
+        except Exception as e:
+            logger.error(f"KPI snapshot refresh failed for {scope}: {e}")
+            self._count("failures")
+            raise
+        finally:
+            if token:
+                self._release(redis_client, scope, token)
+
+    def request(self, scope: str, reason: str):
+        """Queue a background refresh of scope (debounced)"""
+        with self._lock:
+            first, reasons = self._pending.get(scope, (time.monotonic(), set()))
+            self._pending[scope] = (first, reasons | {reason})
+        self._wake.set()
+
+    def notify(self, tags: Iterable[str]):
+        """Queue refreshes of the scopes built from any of tags"""
+        tags = set(tags)
+        for scope, (_, scope_tags) in self._scopes.items():
+            if scope_tags & tags:
+                self.request(scope, ",".join(sorted(scope_tags & tags)))
+
+    @property
+    def redis_client(self):
+        """Current Redis client (None: no invalidation events or cross-process locking)"""
+        return self.get_redis() if self.get_redis else None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Refresh in a background thread on invalidation events and max age"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kpi-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            pending = sorted(self._pending)
+        return {
+            **stats,
+            "running": self.running,
+            "pending": pending,
+            "scopes": {
+                scope: {
+                    "tags": sorted(tags),
+                    "age_seconds": round(time.time() - self._last_seen[scope], 1) if scope in self._last_seen else None,
+                    "last_compute_ms": self._compute_ms.get(scope)
+                }
+                for scope, (_, tags) in self._scopes.items()
+            }
+        }
+
+    def _run(self):
+        pubsub = None
+        retry_at = 0.0
+        while not self._stop.is_set():
+            redis_client = self.redis_client if pubsub is None and time.monotonic() >= retry_at else None
+            if redis_client is not None:
+                try:
+                    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+                except Exception as e:
+                    logger.warning(f"KPI snapshots: cannot subscribe to invalidations: {e}")
+                    pubsub, retry_at = None, time.monotonic() + 30
+
+            if pubsub is not None:
+                try:
+                    message = pubsub.get_message(timeout=min(1.0, self.debounce or 1.0))
+                    while message:
+                        self._on_message(message)
+                        message = pubsub.get_message()
+                except Exception as e:
+                    logger.warning(f"KPI snapshots: invalidation listener failed: {e}")
+                    pubsub, retry_at = None, time.monotonic() + 30
+            else:
+                self._wake.wait(1.0)
+            self._wake.clear()
+
+            self._queue_expired()
+            for scope, reasons in self._due():
+                try:
+                    self.refresh(scope, ",".join(sorted(reasons)))
+                except Exception:
+                    pass
+
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+    def _on_message(self, message):
+        try:
+            tags = json.loads(message["data"])["tags"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self._count("invalidations")
+        self.notify(tags)
+
+    def _queue_expired(self):
+        now = time.time()
+        for scope in self._scopes:
+            last = self._last_seen.get(scope)
+            if last is not None and now - last >= self.max_age and scope not in self._pending:
+                # Another process may have refreshed it meanwhile
+                rows = self.snapshots(scope, limit=1)
+                if rows:
+                    self._last_seen[scope] = now - (datetime.utcnow() - rows[0]["computed_at"]).total_seconds()
+                if not rows or now - self._last_seen[scope] >= self.max_age:
+                    self.request(scope, "max_age")
+
+    def _due(self) -> List[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            due = [(scope, reasons) for scope, (first, reasons) in self._pending.items()
+                   if now - first >= self.debounce]
+            for scope, _ in due:
+                del self._pending[scope]
+        return due
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            _metadata.create_all(self.engine, tables=[kpi_snapshot], checkfirst=True)
+            self._table_ready = True
+
+    def _acquire(self, redis_client, scope: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(f"kpi_snapshot:lock:{scope}", token, nx=True, ex=REFRESH_LOCK_SECONDS):
+                return token
+            return None
+        except Exception as e:
+            # Without Redis there is nothing to coordinate with
+            logger.warning(f"KPI snapshot lock unavailable for {scope}: {e}")
+            return ""
+
+    def _release(self, redis_client, scope: str, token: str):
+        try:
+            redis_client.register_script(RELEASE_KEY_SCRIPT)(
+                keys=[f"kpi_snapshot:lock:{scope}"], args=[token]
+            )
+        except Exception as e:
+            logger.warning(f"KPI snapshot unlock failed for {scope}: {e}")
+
+    def _count(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+
+def sparkline(snapshots: List[Dict[str, Any]], *path: str) -> List[Any]:
+    """Oldest-to-newest values at path (e.g. "overview", "total_documents") across snapshots"""
+    points = []
+    for snapshot in reversed(snapshots):
+        value = snapshot["metrics"]
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        points.append(value)
+    return points
+
+
+def install_kpi_snapshots(app, store: KpiSnapshotStore,
+                          get_redis: Callable[[], Any] = None) -> KpiSnapshotStore:
+    """
+    Run the store's background refresher for the app's lifetime. get_redis
+    returns the client for invalidation events and refresh locks.
+    """
+    if get_redis is not None:
+        store.get_redis = get_redis
+
+    @app.on_event("startup")
+    async def start_kpi_snapshots():
+        store.start()
+
+    @app.on_event("shutdown")
+    async def stop_kpi_snapshots():
+        store.stop()
+
+    return store
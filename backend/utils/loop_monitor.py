@@ -0,0 +1,173 @@
+"""
+Event Loop Lag Monitor
+Measures how late the asyncio event loop runs a periodic tick and, when the
+loop stalls, captures the stack of the call blocking it, so synchronous I/O
+left in async code can be found and moved to the threadpool
+"""
+import asyncio
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+import anyio.to_thread
+
+logger = logging.getLogger(__name__)
+
+# Tick interval; lag is how much later than this the tick actually runs
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+
+# Ticks later than this count as stalls and the blocking call is captured
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+
+# Worker threads for sync route handlers and run_in_threadpool (blocking
+# database/storage access); each blocking request holds one while it runs
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# Frames from these paths are skipped when naming the blocking call site
+_LIBRARY_PATHS = tuple({sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["purelib"]})
+
+
+def set_threadpool_size(size: int = None):
+    """Size the threadpool Starlette uses for sync handlers (call inside the loop)"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = size or THREADPOOL_SIZE
+
+
+class LoopLagMonitor:
+    """
+    Ticks on the event loop every `interval` seconds and records how late
+    each tick ran. A watchdog thread notices ticks that are overdue while the
+    loop is still blocked and records the loop thread's stack at that moment.
+    """
+
+    def __init__(self, interval: float = None, warn_ms: float = None):
+        self.interval = interval or LOOP_LAG_INTERVAL
+        self.warn_seconds = (warn_ms or LOOP_LAG_WARN_MS) / 1000
+        self.ticks = 0
+        self.stalls = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.blocking_sites: Dict[str, int] = {}
+        self._heartbeat = 0.0
+        self._captured_heartbeat = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start ticking on the running loop and start the watchdog thread"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join(timeout=1)
+
+    async def _tick(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self._record(max(0.0, now - expected))
+
+    def _record(self, lag: float):
+        self.ticks += 1
+        self.total_lag += lag
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.warn_seconds:
+            self.stalls += 1
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def _watch(self):
+        """Watchdog thread: capture the loop thread's stack during a stall"""
+        while not self._stop.wait(self.warn_seconds / 2):
+            heartbeat = self._heartbeat
+            overdue = time.perf_counter() - heartbeat - self.interval
+            if overdue < self.warn_seconds or heartbeat == self._captured_heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._captured_heartbeat = heartbeat
+            stack = traceback.extract_stack(frame)
+            site = self._blocking_site(stack)
+            self.blocking_sites[site] = self.blocking_sites.get(site, 0) + 1
+            logger.warning(
+                f"Event loop blocked > {overdue * 1000:.0f} ms in {site}\n"
+                + "".join(traceback.format_list(stack[-8:]))
+            )
+
+    @staticmethod
+    def _blocking_site(stack: traceback.StackSummary) -> str:
+        """Innermost application frame (outside the stdlib/site-packages)"""
+        for frame in reversed(stack):
+            if not frame.filename.startswith(_LIBRARY_PATHS):
+                return f"{frame.filename}:{frame.lineno} ({frame.name})"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} ({frame.name})"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lag counters and the call sites most often caught blocking the loop"""
+        limiter = None
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+        except Exception:
+            pass
+        top_sites = sorted(self.blocking_sites.items(), key=lambda item: item[1], reverse=True)[:10]
+        return {
+            "running": self._task is not None,
+            "interval_ms": round(self.interval * 1000, 1),
+            "ticks": self.ticks,
+            "stalls": self.stalls,
+            "avg_lag_ms": round(self.total_lag / self.ticks * 1000, 3) if self.ticks else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "threadpool_size": limiter.total_tokens if limiter else None,
+            "threadpool_busy": limiter.borrowed_tokens if limiter else None,
+            "blocking_sites": [{"site": site, "count": count} for site, count in top_sites],
+        }
+
+
+# Shared monitor, started by install_loop_monitor
+loop_monitor = LoopLagMonitor()
+
+
+def install_loop_monitor(app, threadpool_size: int = None) -> LoopLagMonitor:
+    """
+    Size the sync-handler threadpool and run the loop lag monitor for the
+    app's lifetime. Returns the monitor (for stats).
+    """
+
+    @app.on_event("startup")
+    async def start_loop_monitor():
+        set_threadpool_size(threadpool_size)
+        loop_monitor.start()
+
+    @app.on_event("shutdown")
+    async def stop_loop_monitor():
+        await loop_monitor.stop()
+
+    return loop_monitor
@@ -0,0 +1,340 @@
+"""
+Request Performance Recorder
+Measures sampled requests (duration, SQL statements, cache lookups,
+Redis/MinIO/Ollama calls, response size) and writes them to the
+performance_logs table in batches
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (Boolean, Column, DateTime, Integer, MetaData, String,
+                        Table, event)
+
+from .buffered_sink import BufferedSink
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests that are measured and recorded (0.0 - 1.0)
+PERF_SAMPLE_RATE = float(os.getenv("PERF_SAMPLE_RATE", "0.1"))
+
+# Requests slower than this are flagged is_slow (matches migration 012)
+SLOW_REQUEST_MS = 1000
+
+_metadata = MetaData()
+
+performance_logs = Table(
+    "performance_logs", _metadata,
+    Column("id", String(36), primary_key=True),
+    Column("request_id", String(100), nullable=False, unique=True),
+    Column("endpoint", String(255), nullable=False),
+    Column("method", String(10)),
+    Column("start_time", DateTime, nullable=False),
+    Column("end_time", DateTime, nullable=False),
+    Column("duration_ms", Integer),
+    Column("db_queries_count", Integer),
+    Column("db_time_ms", Integer),
+    Column("cache_hits", Integer, default=0),
+    Column("cache_misses", Integer, default=0),
+    Column("cache_time_ms", Integer, default=0),
+    Column("external_service_calls", Integer, default=0),
+    Column("external_service_time_ms", Integer, default=0),
+    Column("status_code", Integer),
+    Column("response_size_bytes", Integer),
+    Column("user_id", String(36)),
+    Column("ip_address", String(45)),
+    Column("is_slow", Boolean),
+    Column("is_error", Boolean),
+    Column("logged_at", DateTime, nullable=False),
+)
+
+
+class RequestSample:
+    """Counters for one measured request (shared across threads it spawns)"""
+
+    __slots__ = ("db_queries", "db_time", "cache_hits", "cache_misses", "cache_time",
+                 "external_calls", "external_time", "response_size", "user_id", "_lock")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.external_calls = 0
+        self.external_time = 0.0
+        self.response_size = 0
+        self.user_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add_query(self, elapsed: float):
+        with self._lock:
+            self.db_queries += 1
+            self.db_time += elapsed
+
+    def add_cache(self, hit: bool, elapsed: float):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+            self.cache_time += elapsed
+
+    def add_external(self, service: str, elapsed: float):
+        with self._lock:
+            self.external_calls += 1
+            self.external_time += elapsed
+
+
+_current_sample: contextvars.ContextVar[Optional[RequestSample]] = contextvars.ContextVar(
+    "reims_request_sample", default=None
+)
+
+
+def current_sample() -> Optional[RequestSample]:
+    """Sample for the request being handled, or None if it is not measured"""
+    return _current_sample.get()
+
+
+def record_cache(hit: bool, elapsed: float = 0.0):
+    """Count a cache lookup against the current request"""
+    sample = _current_sample.get()
+    if sample is not None:
+        sample.add_cache(hit, elapsed)
+
+
+def set_request_user(user_id: Optional[str]):
+    """Attach the authenticated user to the current request's sample"""
+    sample = _current_sample.get()
+    if sample is not None and user_id is not None:
+        sample.user_id = str(user_id)
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_sample.get() is not None:
+        conn.info.setdefault("reims_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sample = _current_sample.get()
+    starts = conn.info.get("reims_query_start")
+    if sample is not None and starts:
+        sample.add_query(time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("reims_query_start"):
+        conn.info["reims_query_start"].pop()
+
+
+def instrument_engine(engine):
+    """Count and time every SQL statement executed through an engine"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _timed(func, service: str):
+    """Wrap a client method so calls made while measuring are counted"""
+    if getattr(func, "_reims_perf_service", None):
+        return func
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            sample = _current_sample.get()
+            if sample is None:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                sample.add_external(service, time.perf_counter() - started)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sample = _current_sample.get()
+            if sample is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sample.add_external(service, time.perf_counter() - started)
+
+    wrapper._reims_perf_service = service
+    return wrapper
+
+
+def _patch(cls, method: str, service: str):
+    original = cls.__dict__.get(method)
+    if original is not None:
+        setattr(cls, method, _timed(original, service))
+
+
+def instrument_clients():
+    """
+    Count and time Redis, MinIO and Ollama calls at the client-class level,
+    so every client instance is covered wherever it was created.
+    Outside a measured request the wrappers just call through.
+    """
+    try:
+        import redis
+        _patch(redis.Redis, "execute_command", "redis")
+        _patch(redis.client.Pipeline, "execute", "redis")
+    except ImportError:
+        pass
+
+    try:
+        from minio import Minio
+        # Single choke point for every S3 request the client makes
+        _patch(Minio, "_url_open", "minio")
+    except ImportError:
+        pass
+
+    try:
+        import ollama
+        for cls in (ollama.Client, ollama.AsyncClient):
+            _patch(cls, "_request", "ollama")
+            _patch(cls, "_stream", "ollama")
+    except (ImportError, AttributeError):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Batched writer
+# ---------------------------------------------------------------------------
+
+class PerformanceLogSink(BufferedSink):
+    """Batched writer for performance_logs rows"""
+
+    row_label = "performance samples"
+
+    def __init__(self, engine=None, max_queue_size: int = 5000, batch_size: int = 200,
+                 flush_interval: float = 2.0):
+        super().__init__(max_queue_size, batch_size, flush_interval)
+        self.engine = engine
+        self._table_ready = False
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        if self.engine is None:
+            raise RuntimeError("performance recorder is not installed")
+        if not self._table_ready:
+            _metadata.create_all(self.engine, tables=[performance_logs], checkfirst=True)
+            self._table_ready = True
+        with self.engine.begin() as conn:
+            conn.execute(performance_logs.insert(), rows)
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------------
+
+class PerformanceRecorderMiddleware:
+    """
+    ASGI middleware measuring a sample of HTTP requests.
+
+    Usage:
+        app.add_middleware(PerformanceRecorderMiddleware, sink=performance_sink)
+    """
+
+    def __init__(self, app, sink: PerformanceLogSink, sample_rate: float = None):
+        self.app = app
+        self.sink = sink
+        self.sample_rate = PERF_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        sample = RequestSample()
+        token = _current_sample.set(sample)
+        start_time = datetime.utcnow()
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                sample.response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_sample.reset(token)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            self._submit(scope, sample, start_time, duration_ms, status_code)
+
+    def _submit(self, scope, sample: RequestSample, start_time: datetime,
+                duration_ms: int, status_code: int):
+        # Group by route template (/api/properties/{id}) rather than raw path
+        route = scope.get("route")
+        endpoint = getattr(route, "path", None) or scope.get("path", "")
+        client = scope.get("client")
+
+        self.sink.enqueue({
+            "id": str(uuid.uuid4()),
+            "request_id": uuid.uuid4().hex,
+            "endpoint": endpoint[:255],
+            "method": scope.get("method"),
+            "start_time": start_time,
+            "end_time": datetime.utcnow(),
+            "duration_ms": duration_ms,
+            "db_queries_count": sample.db_queries,
+            "db_time_ms": int(sample.db_time * 1000),
+            "cache_hits": sample.cache_hits,
+            "cache_misses": sample.cache_misses,
+            "cache_time_ms": int(sample.cache_time * 1000),
+            "external_service_calls": sample.external_calls,
+            "external_service_time_ms": int(sample.external_time * 1000),
+            "status_code": status_code,
+            "response_size_bytes": sample.response_size,
+            "user_id": sample.user_id,
+            "ip_address": client[0] if client else None,
+            "is_slow": duration_ms > SLOW_REQUEST_MS,
+            "is_error": status_code >= 400,
+            "logged_at": datetime.utcnow(),
+        })
+
+
+# Shared sink; its engine is set by install_performance_recorder
+performance_sink = PerformanceLogSink()
+
+
+def install_performance_recorder(app, engine, *other_engines,
+                                 sample_rate: float = None) -> PerformanceLogSink:
+    """
+    Instrument the engine(s) and service clients, add the middleware to the
+    app and flush pending samples on shutdown. Samples are written through
+    the first engine. Returns the sink (for stats).
+    """
+    performance_sink.engine = engine
+    for instrumented in (engine,) + other_engines:
+        instrument_engine(instrumented)
+    instrument_clients()
+    app.add_middleware(PerformanceRecorderMiddleware, sink=performance_sink, sample_rate=sample_rate)
+
+    @app.on_event("shutdown")
+    async def flush_performance_logs():
+        await performance_sink.stop()
+
+    return performance_sink
@@ -0,0 +1,139 @@
+"""
+Schema Capability Registry
+Caches which tables and columns exist, so routes that support several
+schema generations do not introspect the database on every request.
+Capabilities are loaded once, reloaded when a migration announces a
+schema change, and queries built from them are cached per schema version.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet
+
+from sqlalchemy import inspect
+
+from .tagged_cache import redis_from_env
+
+logger = logging.getLogger(__name__)
+
+# Redis counter bumped by migration runners after they change the schema
+SCHEMA_VERSION_KEY = "reims:schema_version"
+
+# How often (seconds) a running app checks the counter for schema changes
+SCHEMA_CHECK_SECONDS = float(os.getenv("SCHEMA_CHECK_SECONDS", "30"))
+
+# Shared version not read yet (distinct from None: key never set)
+_UNSEEN = object()
+
+
+class SchemaRegistry:
+    """
+    Table/column capabilities of one engine's database.
+
+    Usage:
+        schema_registry.sync(redis_client)
+        if schema_registry.has_column("properties", "current_value"): ...
+        query = schema_registry.prepared("analytics.kpis", build_query)
+    """
+
+    def __init__(self, engine, check_interval: float = None):
+        self.engine = engine
+        self.check_interval = SCHEMA_CHECK_SECONDS if check_interval is None else check_interval
+        self.version = 0
+        self._tables: Dict[str, FrozenSet[str]] = {}
+        self._prepared: Dict[str, Any] = {}
+        self._loaded = False
+        self._stamp = _UNSEEN
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "prepared_builds": 0, "prepared_hits": 0}
+
+    def load(self):
+        """Introspect tables and columns (at startup, and after migrations)"""
+        inspector = inspect(self.engine)
+        tables = {
+            table: frozenset(column["name"] for column in inspector.get_columns(table))
+            for table in inspector.get_table_names()
+        }
+        with self._lock:
+            self._tables = tables
+            self._prepared = {}
+            self._loaded = True
+            self.version += 1
+            self._stats["loads"] += 1
+        logger.info(f"Schema registry loaded {len(tables)} tables (version {self.version})")
+
+    refresh = load
+
+    def sync(self, redis_client=None):
+        """
+        Load on first use, then reload if a migration bumped the shared
+        schema version. The shared version is read at most every
+        check_interval seconds.
+        """
+        if not self._loaded:
+            self.load()
+        if redis_client is None or time.monotonic() < self._next_check:
+            return
+
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            stamp = redis_client.get(SCHEMA_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read schema version: {e}")
+            return
+        if self._stamp is _UNSEEN:
+            self._stamp = stamp
+        elif stamp != self._stamp:
+            self._stamp = stamp
+            self.load()
+
+    def has_table(self, table: str) -> bool:
+        return table in self._tables
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in self._tables.get(table, ())
+
+    def columns(self, table: str) -> FrozenSet[str]:
+        return self._tables.get(table, frozenset())
+
+    def prepared(self, name: str, build: Callable[["SchemaRegistry"], Any]) -> Any:
+        """
+        Return the object build(registry) produced for the current schema
+        version, building it on first use after each (re)load
+        """
+        with self._lock:
+            if name in self._prepared:
+                self._stats["prepared_hits"] += 1
+                return self._prepared[name]
+            version = self.version
+        built = build(self)
+        with self._lock:
+            # Don't cache something built from a schema reloaded meanwhile
+            if version == self.version:
+                self._prepared[name] = built
+            self._stats["prepared_builds"] += 1
+        return built
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "version": self.version,
+                "tables": len(self._tables),
+                "prepared": sorted(self._prepared)
+            }
+
+
+def publish_schema_change(redis_client=None):
+    """
+    Tell running apps to reload their schema registries. Migration runners
+    call this after changing the schema; failures are logged, not raised.
+    """
+    try:
+        if redis_client is None:
+            redis_client = redis_from_env()
+        redis_client.incr(SCHEMA_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Could not publish schema change: {e}")
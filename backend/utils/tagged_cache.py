@@ -0,0 +1,244 @@
+"""
+Tagged Cache
+Redis cache for aggregate (dashboard/analytics) results. Each entry is
+tagged with the entities it is computed from; writes to those entities
+call tagged_cache.invalidate, which bumps the tags' versions so dependent entries
+are recomputed on their next read. Recomputation is single-flight across
+processes, and readers are served the previous value while it runs.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Add queue service path (shared Redis scripts)
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "queue_service"))
+from job_dedup import RELEASE_KEY_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "cache:"
+
+# Invalidation events are also published here, for anything that wants to
+# push updates (e.g. to open dashboards)
+INVALIDATION_CHANNEL = "cache:invalidations"
+
+# Defaults: entries are fresh for CACHE_FRESH_SECONDS (unless invalidated)
+# and kept for serving while they are recomputed up to CACHE_STALE_SECONDS
+CACHE_FRESH_SECONDS = int(os.getenv("CACHE_FRESH_SECONDS", "60"))
+CACHE_STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", "3600"))
+
+# Recomputation lock: held at most this long; readers with nothing to
+# serve wait up to CACHE_LOCK_WAIT_SECONDS for the holder's result
+CACHE_LOCK_SECONDS = 30
+CACHE_LOCK_WAIT_SECONDS = float(os.getenv("CACHE_LOCK_WAIT_SECONDS", "5"))
+LOCK_POLL_SECONDS = 0.05
+
+
+def _entry_key(key: str) -> str:
+    return f"{CACHE_PREFIX}entry:{key}"
+
+
+def _lock_key(key: str) -> str:
+    return f"{CACHE_PREFIX}lock:{key}"
+
+
+def _tag_key(tag: str) -> str:
+    return f"{CACHE_PREFIX}tag:{tag}"
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class TaggedCache:
+    """
+    Usage:
+        value, status = tagged_cache.get_or_compute(
+            redis_client, "dashboard:overview", ["documents", "processing"],
+            compute_overview
+        )
+
+    compute is called without arguments and may run in a background thread
+    (stale-while-revalidate), so it must open its own database session.
+    status is one of hit, stale, miss, coalesced or bypass (no Redis).
+    """
+
+    def __init__(self, refresh_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers,
+                                            thread_name_prefix="cache-refresh")
+        self._lock = threading.Lock()
+        self._stats = {
+            "hit": 0, "stale": 0, "miss": 0, "coalesced": 0, "bypass": 0,
+            "refreshes": 0, "invalidations": 0, "errors": 0
+        }
+
+    def get_or_compute(self, redis_client, key: str, tags: Iterable[str],
+                       compute: Callable[[], Any], fresh_ttl: int = None,
+                       stale_ttl: int = None) -> Tuple[Any, str]:
+        fresh_ttl = CACHE_FRESH_SECONDS if fresh_ttl is None else fresh_ttl
+        stale_ttl = CACHE_STALE_SECONDS if stale_ttl is None else stale_ttl
+        tags = sorted(set(tags))
+
+        if redis_client is None:
+            return self._result(compute(), "bypass")
+        try:
+            entry, versions = self._read(redis_client, key, tags)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            self._count("errors")
+            return self._result(compute(), "bypass")
+
+        if entry is not None:
+            invalidated = entry["tags"] != versions
+            if not invalidated and time.time() - entry["computed_at"] < fresh_ttl:
+                return self._result(entry["value"], "hit")
+
+            token = self._acquire(redis_client, key)
+            if token and invalidated:
+                # The underlying data changed: this reader waits for the new
+                # value, concurrent readers keep getting the old one meanwhile
+                try:
+                    return self._result(self._compute_and_store(redis_client, key, tags, compute, stale_ttl), "miss")
+                finally:
+                    self._release(redis_client, key, token)
+            if token:
+                # Merely old: refresh in the background
+                self._executor.submit(self._refresh, redis_client, key, tags, compute, stale_ttl, token)
+            return self._result(entry["value"], "stale")
+
+        # Nothing cached: one reader computes, the others wait for its result
+        token = self._acquire(redis_client, key)
+        if token:
+            try:
+                return self._result(self._compute_and_store(redis_client, key, tags, compute, stale_ttl), "miss")
+            finally:
+                self._release(redis_client, key, token)
+
+        deadline = time.monotonic() + CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            try:
+                entry, _ = self._read(redis_client, key, [])
+            except Exception:
+                break
+            if entry is not None:
+                return self._result(entry["value"], "coalesced")
+        return self._result(compute(), "miss")
+
+    def invalidate(self, redis_client, tags: Iterable[str]):
+        """Mark entries depending on any of tags as changed, and publish the event"""
+        tags = sorted(set(tags))
+        if redis_client is None or not tags:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(_tag_key(tag))
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"tags": tags, "at": time.time()}))
+            pipe.execute()
+            self._count("invalidations")
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {tags}: {e}")
+            self._count("errors")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        served = stats["hit"] + stats["stale"] + stats["miss"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hit"] + stats["stale"] + stats["coalesced"]) / served, 3) if served else 0.0
+        return stats
+
+    def _read(self, redis_client, key: str, tags: List[str]):
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(_entry_key(key))
+        for tag in tags:
+            pipe.get(_tag_key(tag))
+        raw, *versions = pipe.execute()
+        entry = json.loads(raw) if raw else None
+        return entry, {tag: _text(version) for tag, version in zip(tags, versions)}
+
+    def _compute_and_store(self, redis_client, key: str, tags: List[str],
+                           compute: Callable[[], Any], stale_ttl: int) -> Any:
+        # Versions are read before computing, so a write that lands during
+        # the computation leaves the stored entry already invalidated
+        _, versions = self._read(redis_client, key, tags)
+        value = compute()
+        entry = {"value": value, "tags": versions, "computed_at": time.time()}
+        try:
+            redis_client.set(_entry_key(key), json.dumps(entry, default=str), ex=stale_ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+            self._count("errors")
+        return value
+
+    def _refresh(self, redis_client, key, tags, compute, stale_ttl, token):
+        try:
+            self._compute_and_store(redis_client, key, tags, compute, stale_ttl)
+            self._count("refreshes")
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+            self._count("errors")
+        finally:
+            self._release(redis_client, key, token)
+
+    def _acquire(self, redis_client, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(_lock_key(key), token, nx=True, ex=CACHE_LOCK_SECONDS):
+                return token
+        except Exception as e:
+            logger.warning(f"Cache lock failed for {key}: {e}")
+            self._count("errors")
+        return None
+
+    def _release(self, redis_client, key: str, token: str):
+        try:
+            # Delete the lock only if it still holds our token
+            redis_client.register_script(RELEASE_KEY_SCRIPT)(keys=[_lock_key(key)], args=[token])
+        except Exception as e:
+            logger.warning(f"Cache unlock failed for {key}: {e}")
+
+    def _result(self, value: Any, status: str) -> Tuple[Any, str]:
+        self._count(status)
+        return value, status
+
+    def _count(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+
+tagged_cache = TaggedCache()
+
+
+def redis_from_env():
+    """
+    Client for REDIS_HOST/PORT/DB, for code running outside the API (scripts,
+    migration runners, data loads) that has no shared client to borrow
+    """
+    import redis
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        socket_connect_timeout=2
+    )
+
+
+def publish_invalidation(tags: Iterable[str], redis_client=None):
+    """
+    Invalidate tags from outside the API (scripts, data loads), creating a
+    client with redis_from_env if none is given. Failures are logged.
+    """
+    try:
+        if redis_client is None:
+            redis_client = redis_from_env()
+    except Exception as e:
+        logger.warning(f"Could not publish cache invalidation: {e}")
+        return
+    tagged_cache.invalidate(redis_client, tags)
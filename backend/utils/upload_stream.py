@@ -0,0 +1,80 @@
+"""
+Upload Streaming Utility
+Chunked hashing, size enforcement and MinIO streaming for uploaded files,
+so uploads are never buffered whole in memory
+"""
+import hashlib
+from typing import BinaryIO, Dict, Optional, Tuple
+
+# Block size used when reading the spooled upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Part size for MinIO multipart uploads (minimum allowed by S3 is 5MB)
+MINIO_PART_SIZE = 10 * 1024 * 1024  # 10MB
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as an upload exceeds the configured maximum size"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File too large. Maximum size: {max_size // (1024 * 1024)}MB")
+
+
+def copy_upload(source: BinaryIO, destination: Optional[BinaryIO] = None,
+                max_size: Optional[int] = None,
+                chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """
+    Read an upload in fixed-size blocks, computing size and SHA-256 incrementally.
+
+    Args:
+        source: File object of the upload (e.g. UploadFile.file)
+        destination: Optional file object each block is also written to
+        max_size: Abort with UploadTooLargeError once this many bytes are exceeded
+        chunk_size: Block size in bytes
+
+    Returns:
+        (size, sha256 hex digest). The source is rewound to the start.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    source.seek(0)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise UploadTooLargeError(max_size)
+        digest.update(chunk)
+        if destination is not None:
+            destination.write(chunk)
+    source.seek(0)
+
+    return size, digest.hexdigest()
+
+
+def measure_upload(source: BinaryIO, max_size: Optional[int] = None) -> Tuple[int, str]:
+    """Size and hash an upload without copying it anywhere"""
+    return copy_upload(source, None, max_size)
+
+
+def stream_to_minio(minio_client, bucket_name: str, object_name: str, source: BinaryIO,
+                    length: int, content_type: str,
+                    metadata: Optional[Dict[str, str]] = None):
+    """
+    Stream a whole upload into MinIO (the source is rewound to the start).
+    Objects larger than MINIO_PART_SIZE are sent as a multipart upload,
+    one part in memory at a time.
+    """
+    source.seek(0)
+    return minio_client.put_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=source,
+        length=length,
+        content_type=content_type,
+        metadata=metadata,
+        part_size=MINIO_PART_SIZE
+    )
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass label scanning vs. per-label line search
+Runs both strategies over a synthetic corpus of financial statements,
+checks they extract identical values, and reports the speedup.
+
+Usage:
+    python benchmark_financial_extractors.py [--documents 200] [--filler 400]
+
+With the defaults the scanner measured 2.2-4.1x faster on balance
+sheets, 7.3-8.2x on income statements and 2.9-3.7x on cash flow
+statements (six runs; timings vary noticeably between runs).
+"""
+import argparse
+import random
+import re
+import time
+from decimal import Decimal
+from typing import Dict, Optional
+
+from financial_extractors import (
+    BalanceSheetExtractor,
+    CashFlowExtractor,
+    IncomeStatementExtractor,
+)
+
+STATEMENT_LINES = {
+    BalanceSheetExtractor: [
+        "Cash - Operating", "Accounts Receivable", "Total Current Assets",
+        "Land", "Buildings", "Accum. Depreciation - Buildings",
+        "Total Property & Equipment", "Total Assets", "Accounts Payable",
+        "Total Current Liabilities", "Long-Term Debt - Mortgage",
+        "Total Liabilities", "Partners' Equity", "Total Liabilities & Equity",
+    ],
+    IncomeStatementExtractor: [
+        "Rental Income - Base Rent", "CAM Recoveries", "Total Income",
+        "Repairs & Maintenance", "Utilities", "Property Taxes",
+        "Total Operating Expenses", "Net Operating Income",
+        "Interest Expense", "Depreciation", "Net Income",
+    ],
+    CashFlowExtractor: [
+        "Net Income", "Net Cash Provided by Operating Activities",
+        "Capital Improvements", "Net Cash Used in Investing Activities",
+        "Principal Payments", "Net Cash Used in Financing Activities",
+        "Net Increase in Cash", "Cash at Beginning of Period",
+        "Cash at End of Period",
+    ],
+}
+
+FILLER_LINES = [
+    "Account Description", "Period to Date", "Year to Date", "%",
+    "Page 1 of 3", "Unaudited - for management use only", "GL Code 4010-0000",
+]
+
+
+def legacy_search_for_value(extractor, label_pattern: str, context_lines: int = 2) -> Optional[Decimal]:
+    """Original implementation: re-split the text and search it per label"""
+    lines = extractor.text.split('\n')
+    for i, line in enumerate(lines):
+        if re.search(label_pattern, line, re.IGNORECASE):
+            search_area = '\n'.join(lines[i:i+context_lines+1])
+            numbers = re.findall(r'\$?[\d,]+\.?\d*', search_area)
+            for num in numbers:
+                value = extractor._parse_currency(num)
+                if value and abs(value) > 0:
+                    return value
+    return None
+
+
+def build_statement(extractor_cls, filler: int, rng: random.Random) -> str:
+    """One statement: labelled amounts interleaved with filler lines"""
+    lines = []
+    for label in STATEMENT_LINES[extractor_cls]:
+        for _ in range(filler // len(STATEMENT_LINES[extractor_cls])):
+            lines.append(rng.choice(FILLER_LINES))
+        lines.append(label)
+        lines.append(f"${rng.randint(1000, 9_999_999):,}.{rng.randint(0, 99):02d}")
+        lines.append(f"{rng.uniform(0, 100):.2f}")
+    return '\n'.join(lines)
+
+
+def run_legacy(extractor) -> Dict[str, Optional[Decimal]]:
+    return {
+        label: legacy_search_for_value(extractor, pattern)
+        for label, pattern in extractor.LABEL_PATTERNS.items()
+    }
+
+
+def run_scanner(extractor) -> Dict[str, Optional[Decimal]]:
+    return extractor._scan_labels()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark financial label extraction')
+    parser.add_argument('--documents', type=int, default=200, help='Statements per type')
+    parser.add_argument('--filler', type=int, default=400, help='Filler lines per statement')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Corpus: {args.documents} statements per type, ~{args.filler} filler lines each\n")
+    print(f"{'Statement':<28}{'legacy (s)':>12}{'scanner (s)':>13}{'speedup':>10}")
+
+    for extractor_cls in STATEMENT_LINES:
+        corpus = [build_statement(extractor_cls, args.filler, rng) for _ in range(args.documents)]
+
+        started = time.perf_counter()
+        legacy_results = [run_legacy(extractor_cls('<benchmark>', text=text)) for text in corpus]
+        legacy_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scanner_results = [run_scanner(extractor_cls('<benchmark>', text=text)) for text in corpus]
+        scanner_time = time.perf_counter() - started
+
+        if legacy_results != scanner_results:
+            raise SystemExit(f"Mismatch between strategies for {extractor_cls.__name__}")
+
+        print(f"{extractor_cls.__name__:<28}{legacy_time:>12.3f}{scanner_time:>13.3f}"
+              f"{legacy_time / scanner_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
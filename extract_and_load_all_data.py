@@ -2,18 +2,31 @@
 """
 Complete data extraction, validation, and loading pipeline
 Downloads PDFs from MinIO, extracts data, validates, and loads into SQLite
+
+Documents flow through a bounded download pool and a process pool for PDF
+extraction; a single writer (the main thread) loads results in batched
+transactions. Each loaded document is checkpointed by (ETag, extractor
+version) so a rerun skips documents that have not changed.
+
+Usage:
+    python extract_and_load_all_data.py [--download-workers 4] [--extract-workers N]
+                                        [--commit-every 50] [--force]
 """
+import argparse
 import sqlite3
 import json
 import os
+import queue
 import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from minio import Minio
 from pathlib import Path
 import sys
 
 # Import our extraction modules
-from financial_extractors import extract_financial_document
+from financial_extractors import EXTRACTOR_VERSION, extract_financial_document
 
 # MinIO configuration
 MINIO_CLIENT = Minio(
@@ -25,6 +38,11 @@ MINIO_CLIENT = Minio(
 
 BUCKET_NAME = "reims-files"
 
+# Pipeline defaults
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_EXTRACT_WORKERS = os.cpu_count() or 2
+DEFAULT_COMMIT_EVERY = 50  # documents per committed transaction
+
 def load_mappings():
     """Load property-document mappings"""
     with open('property_document_mappings.json', 'r') as f:
@@ -34,6 +52,67 @@ def download_from_minio(minio_path: str, local_path: str):
     """Download file from MinIO to local path"""
     MINIO_CLIENT.fget_object(BUCKET_NAME, minio_path, local_path)
 
+def ensure_checkpoint_table(conn: sqlite3.Connection):
+    """Create the ETL checkpoint table if needed"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS etl_checkpoints (
+            minio_path TEXT PRIMARY KEY,
+            etag TEXT NOT NULL,
+            extractor_version TEXT NOT NULL,
+            document_id TEXT,
+            extracted_data TEXT,
+            processed_at TEXT
+        )
+    """)
+    conn.commit()
+
+def load_checkpoints(conn: sqlite3.Connection) -> dict:
+    """minio_path -> (etag, extractor_version, extracted data)"""
+    cursor = conn.execute(
+        "SELECT minio_path, etag, extractor_version, extracted_data FROM etl_checkpoints"
+    )
+    return {
+        row[0]: (row[1], row[2], json.loads(row[3]) if row[3] else {})
+        for row in cursor.fetchall()
+    }
+
+def record_checkpoint(conn: sqlite3.Connection, doc: dict, etag: str, document_id: str, extracted_data: dict):
+    """Mark a document as loaded for this ETag and extractor version"""
+    conn.execute("""
+        INSERT INTO etl_checkpoints (
+            minio_path, etag, extractor_version, document_id, extracted_data, processed_at
+        ) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(minio_path) DO UPDATE SET
+            etag = excluded.etag,
+            extractor_version = excluded.extractor_version,
+            document_id = excluded.document_id,
+            extracted_data = excluded.extracted_data,
+            processed_at = excluded.processed_at
+    """, (doc['minio_path'], etag, EXTRACTOR_VERSION, document_id,
+          json.dumps(extracted_data), datetime.now().isoformat()))
+
+def fetch_document(doc: dict, checkpoint: tuple, file_slots: threading.BoundedSemaphore, force: bool = False):
+    """
+    Stat a document and download it unless its checkpoint is current.
+    
+    Returns:
+        (etag, temp path) - temp path is None when the document can be skipped.
+        A file slot is held for every downloaded file until it is extracted.
+    """
+    etag = MINIO_CLIENT.stat_object(BUCKET_NAME, doc['minio_path']).etag
+    if not force and checkpoint and checkpoint[:2] == (etag, EXTRACTOR_VERSION):
+        return etag, None
+    
+    file_slots.acquire()
+    try:
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            tmp_path = tmp.name
+        download_from_minio(doc['minio_path'], tmp_path)
+        return etag, tmp_path
+    except Exception:
+        file_slots.release()
+        raise
+
 def validate_balance_sheet(data: dict) -> tuple[bool, list]:
     """Validate balance sheet - Assets = Liabilities + Equity"""
     errors = []
@@ -112,19 +191,21 @@ def upsert_property_metrics(conn: sqlite3.Connection, property_id: int, metrics:
 
 def insert_extracted_metrics(conn: sqlite3.Connection, document_id: str, metrics: dict):
     """Insert extracted metrics into extracted_metrics table"""
-    cursor = conn.cursor()
-    
-    for metric_name, metric_value in metrics.items():
-        if isinstance(metric_value, (int, float)) and metric_name != 'tenants':
-            cursor.execute("""
-                INSERT INTO extracted_metrics (
-                    id, document_id, metric_name, metric_value,
-                    confidence_score, extraction_method, created_at
-                ) VALUES (
-                    hex(randomblob(16)), ?, ?, ?,
-                    0.85, 'pdf_text_extraction', ?
-                )
-            """, (document_id, metric_name, float(metric_value), datetime.now().isoformat()))
+    created_at = datetime.now().isoformat()
+    rows = [
+        (document_id, metric_name, float(metric_value), created_at)
+        for metric_name, metric_value in metrics.items()
+        if isinstance(metric_value, (int, float)) and metric_name != 'tenants'
+    ]
+    conn.executemany("""
+        INSERT INTO extracted_metrics (
+            id, document_id, metric_name, metric_value,
+            confidence_score, extraction_method, created_at
+        ) VALUES (
+            hex(randomblob(16)), ?, ?, ?,
+            0.85, 'pdf_text_extraction', ?
+        )
+    """, rows)
 
 def update_document_status(conn: sqlite3.Connection, filename: str, status: str):
     """Update document processing status"""
@@ -143,28 +224,24 @@ def update_document_status(conn: sqlite3.Connection, filename: str, status: str)
         WHERE file_name = ?
     """, (status, datetime.now().isoformat(), filename))
 
-def process_property_documents(conn: sqlite3.Connection, property_data: dict, mappings: list):
-    """Process all documents for a property"""
+def process_property_documents(conn: sqlite3.Connection, property_data: dict,
+                               property_docs: list, doc_results: dict):
+    """
+    Validate and load all documents for a property.
+    
+    doc_results maps minio_path -> (etag, extracted data, skipped, error) as
+    produced by the download/extraction pools. Skipped documents are already
+    loaded; their checkpointed data still feeds the property update.
+    """
     property_id = property_data['id']
     property_name = property_data['name']
     
     print(f"\n{'='*80}")
     print(f"Processing: {property_name} (ID: {property_id})")
     print(f"{'='*80}")
-    
-    # Get all documents for this property
-    property_docs = [m for m in mappings if m['property_id'] == property_id]
     print(f"Found {len(property_docs)} documents")
     
-    # Group by document type
-    docs_by_type = {}
-    for doc in property_docs:
-        doc_type = doc['document_type']
-        if doc_type not in docs_by_type:
-            docs_by_type[doc_type] = []
-        docs_by_type[doc_type].append(doc)
-    
-    # Process each document
+    # Process each document (in mapping order so later documents win)
     property_metrics = {}
     all_valid = True
     
@@ -173,16 +250,19 @@ def process_property_documents(conn: sqlite3.Connection, property_data: dict, ma
         print(f"    Type: {doc['document_type']}")
         print(f"    Year: {doc['document_year']}")
         
+        etag, extracted_data, skipped, error = doc_results[doc['minio_path']]
+        
+        if error is not None:
+            print(f"    ❌ Error: {error}")
+            all_valid = False
+            continue
+        
+        if skipped:
+            print(f"    ⏭️  Unchanged since last load (checkpoint {etag})")
+            property_metrics.update(extracted_data)
+            continue
+        
         try:
-            # Download from MinIO to temp file
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-                tmp_path = tmp.name
-            
-            download_from_minio(doc['minio_path'], tmp_path)
-            print(f"    Downloaded to temp file")
-            
-            # Extract data
-            extracted_data = extract_financial_document(tmp_path, doc['document_type'])
             print(f"    Extracted {len(extracted_data)} metrics")
             
             # Validate
@@ -212,8 +292,10 @@ def process_property_documents(conn: sqlite3.Connection, property_data: dict, ma
             # Update document status
             update_document_status(conn, doc['filename'], 'processed')
             
-            # Clean up temp file
-            os.unlink(tmp_path)
+            # Checkpoint (committed together with the metrics); empty
+            # extractions are retried on the next run
+            if extracted_data:
+                record_checkpoint(conn, doc, etag, doc_id, extracted_data)
             
             print(f"    ✅ Loaded to database")
             
@@ -229,6 +311,122 @@ def process_property_documents(conn: sqlite3.Connection, property_data: dict, ma
     
     return all_valid
 
+def run_pipeline(conn: sqlite3.Connection, properties: list, mappings: list,
+                 download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 extract_workers: int = DEFAULT_EXTRACT_WORKERS,
+                 commit_every: int = DEFAULT_COMMIT_EVERY,
+                 force: bool = False) -> dict:
+    """
+    Download and extract documents concurrently, loading each property as
+    soon as all of its documents are ready.
+    
+    Each property is loaded inside a savepoint (rolled back on failure);
+    the transaction is committed every `commit_every` documents.
+    """
+    checkpoints = load_checkpoints(conn)
+    property_ids = {p['id'] for p in properties}
+    docs_by_property = {p['id']: [] for p in properties}
+    for doc in mappings:
+        if doc['property_id'] in property_ids:
+            docs_by_property[doc['property_id']].append(doc)
+    all_docs = [doc for docs in docs_by_property.values() for doc in docs]
+    
+    # Results arrive from pool threads; the main thread is the only writer
+    ready = queue.Queue()
+    # Bounds the number of downloaded files waiting for extraction
+    file_slots = threading.BoundedSemaphore(download_workers + extract_workers)
+    
+    results = {}
+    doc_results = {}
+    remaining = {pid: len(docs) for pid, docs in docs_by_property.items()}
+    uncommitted = 0
+    
+    def write_property(property_data: dict):
+        nonlocal uncommitted
+        name = property_data['name']
+        docs = docs_by_property[property_data['id']]
+        try:
+            conn.execute("SAVEPOINT property_load")
+            success = process_property_documents(conn, property_data, docs, doc_results)
+            if success:
+                conn.execute("RELEASE property_load")
+                results[name] = 'SUCCESS'
+                print(f"\n✅ {name}: Loaded")
+            else:
+                conn.execute("ROLLBACK TO property_load")
+                conn.execute("RELEASE property_load")
+                results[name] = 'FAILED - Rolled back'
+                print(f"\n❌ {name}: Rolled back")
+        except Exception as e:
+            conn.execute("ROLLBACK TO property_load")
+            conn.execute("RELEASE property_load")
+            results[name] = f'ERROR: {e}'
+            print(f"\n❌ {name}: Error - {e}")
+        
+        uncommitted += len(docs)
+        if uncommitted >= commit_every:
+            conn.commit()
+            conn.execute("BEGIN")
+            uncommitted = 0
+    
+    properties_by_id = {p['id']: p for p in properties}
+    
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=extract_workers) as extraction:
+        
+        def on_extracted(doc, etag, tmp_path, future):
+            file_slots.release()
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            try:
+                ready.put((doc, etag, future.result(), False, None))
+            except Exception as e:
+                ready.put((doc, etag, {}, False, e))
+        
+        def on_fetched(doc, future):
+            try:
+                etag, tmp_path = future.result()
+            except Exception as e:
+                ready.put((doc, None, {}, False, e))
+                return
+            if tmp_path is None:
+                checkpointed = checkpoints[doc['minio_path']][2]
+                ready.put((doc, etag, checkpointed, True, None))
+                return
+            try:
+                extract = extraction.submit(extract_financial_document, tmp_path, doc['document_type'])
+            except Exception as e:
+                file_slots.release()
+                ready.put((doc, etag, {}, False, e))
+                return
+            extract.add_done_callback(
+                lambda f, doc=doc, etag=etag, tmp_path=tmp_path: on_extracted(doc, etag, tmp_path, f)
+            )
+        
+        for doc in all_docs:
+            fetch = downloads.submit(fetch_document, doc, checkpoints.get(doc['minio_path']), file_slots, force)
+            fetch.add_done_callback(lambda f, doc=doc: on_fetched(doc, f))
+        
+        conn.execute("BEGIN")
+        
+        # Properties without documents load immediately
+        for pid, count in remaining.items():
+            if count == 0:
+                write_property(properties_by_id[pid])
+        
+        for _ in range(len(all_docs)):
+            doc, etag, extracted_data, skipped, error = ready.get()
+            doc_results[doc['minio_path']] = (etag, extracted_data, skipped, error)
+            remaining[doc['property_id']] -= 1
+            if remaining[doc['property_id']] == 0:
+                write_property(properties_by_id[doc['property_id']])
+        
+        conn.commit()
+    
+    return results
+
 def generate_report(conn: sqlite3.Connection):
     """Generate final validation report"""
     cursor = conn.cursor()
@@ -279,6 +477,17 @@ def generate_report(conn: sqlite3.Connection):
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Extract and load financial data from MinIO')
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help='Concurrent MinIO downloads')
+    parser.add_argument('--extract-workers', type=int, default=DEFAULT_EXTRACT_WORKERS,
+                        help='Processes used for PDF extraction')
+    parser.add_argument('--commit-every', type=int, default=DEFAULT_COMMIT_EVERY,
+                        help='Documents loaded per committed transaction')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore checkpoints and reprocess every document')
+    args = parser.parse_args()
+    
     print("="*80)
     print("FINANCIAL DATA EXTRACTION AND LOADING PIPELINE")
     print("="*80)
@@ -293,6 +502,9 @@ def main():
     print("Connecting to database...")
     conn = sqlite3.connect('reims.db')
     conn.row_factory = sqlite3.Row
+    ensure_checkpoint_table(conn)
+    # Transactions are managed explicitly by the pipeline writer
+    conn.isolation_level = None
     print("✅ Connected to database\n")
     
     # Get all properties
@@ -301,24 +513,14 @@ def main():
     properties = [dict(row) for row in cursor.fetchall()]
     print(f"Found {len(properties)} properties in database\n")
     
-    # Process each property
-    results = {}
-    for property_data in properties:
-        try:
-            conn.execute("BEGIN TRANSACTION")
-            success = process_property_documents(conn, property_data, mappings)
-            if success:
-                conn.commit()
-                results[property_data['name']] = 'SUCCESS'
-                print(f"\n✅ {property_data['name']}: Transaction committed")
-            else:
-                conn.rollback()
-                results[property_data['name']] = 'FAILED - Rolled back'
-                print(f"\n❌ {property_data['name']}: Transaction rolled back")
-        except Exception as e:
-            conn.rollback()
-            results[property_data['name']] = f'ERROR: {e}'
-            print(f"\n❌ {property_data['name']}: Error - {e}")
+    # Process all properties through the pipeline
+    results = run_pipeline(
+        conn, properties, mappings,
+        download_workers=args.download_workers,
+        extract_workers=args.extract_workers,
+        commit_every=args.commit_every,
+        force=args.force
+    )
     
     # Generate final report
     generate_report(conn)
@@ -4,20 +4,112 @@ Financial data extraction from PDF documents
 """
 import fitz  # PyMuPDF
 import re
+from bisect import bisect_right
 from decimal import Decimal
+from itertools import accumulate
 from typing import Dict, List, Optional, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever extraction logic changes so loaders reprocess documents
+EXTRACTOR_VERSION = "2"
+
+# Numeric tokens (currency, comma-grouped and decimal amounts)
+NUMBER_PATTERN = re.compile(r'\$?[\d,]+\.?\d*')
+
+# Characters IGNORECASE matches to ASCII letters that str.lower() leaves alone
+# (dotless i, long s)
+CASE_EQUIVALENTS = re.compile('[\u0131\u017f]')
+
+def _lower_pattern(pattern: str) -> str:
+    """Lowercase a pattern's literals, leaving escapes such as \\s and \\d alone"""
+    return re.sub(r'(\\.)|([^\\]+)', lambda m: m.group(1) or m.group(2).lower(), pattern)
+
+class LabelScanner:
+    """
+    Finds the first value for many labels in a single pass over the text.
+    
+    All label patterns are compiled into one alternation that is run once over
+    the whole text to find candidate lines; only those are tested per label.
+    Semantics match FinancialExtractor._search_for_value: for each label the
+    first matching line whose search area yields a non-zero amount wins.
+    
+    The alternation is run case-sensitively over lowercased text where that
+    finds the same lines: with IGNORECASE, re cannot skip ahead to positions
+    where some label could start and tries every branch at every character.
+    """
+    
+    def __init__(self, label_patterns: Dict[str, str], context_lines: int = 2):
+        self.context_lines = context_lines
+        self.patterns = {
+            label: re.compile(pattern, re.IGNORECASE)
+            for label, pattern in label_patterns.items()
+        }
+        alternation = '|'.join(f'(?:{pattern})' for pattern in label_patterns.values())
+        self.combined = re.compile(alternation, re.IGNORECASE)
+        self.lowered = re.compile(_lower_pattern(alternation)) if alternation.isascii() else None
+    
+    def scan(self, extractor: 'FinancialExtractor') -> Dict[str, Optional[Decimal]]:
+        """Return the first value found for each label (None if not found)"""
+        results = {label: None for label in self.patterns}
+        pending = dict(self.patterns)
+        lines = extractor.lines
+        
+        for i in self._candidate_lines(extractor):
+            for label, pattern in list(pending.items()):
+                if pattern.search(lines[i]):
+                    value = extractor._first_value_from(i, self.context_lines)
+                    if value is not None:
+                        results[label] = value
+                        del pending[label]
+            if not pending:
+                break
+        
+        return results
+    
+    def _candidate_lines(self, extractor: 'FinancialExtractor'):
+        """
+        Indexes of lines touched by a combined-pattern match, in order.
+        Any line on which some label matches is touched by at least one match.
+        """
+        text, combined = extractor.text, self.combined
+        if self.lowered is not None:
+            lowered = text.lower()
+            # Same offsets, and no character only IGNORECASE would match
+            if len(lowered) == len(text) and not CASE_EQUIVALENTS.search(text):
+                text, combined = lowered, self.lowered
+        
+        offsets = extractor.line_offsets
+        last = -1
+        for match in combined.finditer(text):
+            first = max(bisect_right(offsets, match.start()) - 1, last + 1)
+            end = bisect_right(offsets, max(match.end() - 1, match.start())) - 1
+            for i in range(first, end + 1):
+                yield i
+            last = max(last, end)
+
 class FinancialExtractor:
     """Base class for financial document extraction"""
     
-    def __init__(self, pdf_path: str):
+    # Label patterns scanned by extract(); compiled once per class. Leave out
+    # leading optional words: they never change which lines match, and they
+    # stop the combined pattern from skipping ahead to possible label starts
+    LABEL_PATTERNS: Dict[str, str] = {}
+    _scanner: Optional[LabelScanner] = None
+    
+    def __init__(self, pdf_path: str, text: Optional[str] = None):
         self.pdf_path = pdf_path
-        self.doc = fitz.open(pdf_path)
-        self.text = self._extract_full_text()
+        if text is None:
+            self.doc = fitz.open(pdf_path)
+            self.text = self._extract_full_text()
+        else:
+            self.doc = None
+            self.text = text
+        self.lines = self.text.split('\n')
+        self.line_offsets = list(accumulate([0] + [len(line) + 1 for line in self.lines[:-1]]))
+        self._line_values: Dict[int, List[Decimal]] = {}
     
     def _extract_full_text(self) -> str:
         """Extract all text from PDF"""
@@ -38,21 +130,43 @@ class FinancialExtractor:
         except:
             return None
     
+    def _values_on_line(self, index: int) -> List[Decimal]:
+        """Non-zero amounts on a line, tokenized once and reused across labels"""
+        values = self._line_values.get(index)
+        if values is None:
+            values = []
+            for num in NUMBER_PATTERN.findall(self.lines[index]):
+                value = self._parse_currency(num)
+                if value and abs(value) > 0:
+                    values.append(value)
+            self._line_values[index] = values
+        return values
+    
+    def _first_value_from(self, index: int, context_lines: int = 2) -> Optional[Decimal]:
+        """First non-zero amount in a line and the next few lines"""
+        for i in range(index, min(index + context_lines + 1, len(self.lines))):
+            values = self._values_on_line(i)
+            if values:
+                return values[0]
+        return None
+    
     def _search_for_value(self, label_pattern: str, context_lines: int = 2) -> Optional[Decimal]:
         """Search for a financial value near a label"""
-        lines = self.text.split('\n')
-        for i, line in enumerate(lines):
-            if re.search(label_pattern, line, re.IGNORECASE):
-                # Search in current line and next few lines
-                search_area = '\n'.join(lines[i:i+context_lines+1])
-                # Find numbers in the search area
-                numbers = re.findall(r'\$?[\d,]+\.?\d*', search_area)
-                for num in numbers:
-                    value = self._parse_currency(num)
-                    if value and abs(value) > 0:
-                        return value
+        pattern = re.compile(label_pattern, re.IGNORECASE)
+        for i, line in enumerate(self.lines):
+            if pattern.search(line):
+                value = self._first_value_from(i, context_lines)
+                if value is not None:
+                    return value
         return None
     
+    def _scan_labels(self) -> Dict[str, Optional[Decimal]]:
+        """Look up every LABEL_PATTERNS entry in one pass over the text"""
+        cls = type(self)
+        if cls.__dict__.get('_scanner') is None:
+            cls._scanner = LabelScanner(cls.LABEL_PATTERNS)
+        return cls._scanner.scan(self)
+    
     def close(self):
         """Close the PDF document"""
         if self.doc:
@@ -61,26 +175,32 @@ class FinancialExtractor:
 class BalanceSheetExtractor(FinancialExtractor):
     """Extract data from Balance Sheet"""
     
+    LABEL_PATTERNS = {
+        'total_assets': r'total\s+assets',
+        'property_and_equipment': r'total\s+property\s+(&|and)\s+equipment',
+        'current_assets': r'current\s+assets',
+        'fixed_assets': r'(fixed|property|plant|equipment)\s+assets',
+        'total_liabilities': r'total\s+liabilities',
+        'current_liabilities': r'current\s+liabilities',
+        'long_term_debt': r'long[- ]term\s+(debt|liabilities)',
+        # Also matches total, stockholders' and shareholders' equity
+        'total_equity': r'equity',
+        # Fallback inputs for property_and_equipment
+        'property_items': r'(land|buildings?|improvements?|roof|hvac|parking)',
+        'depreciation': r'accum.*depr',
+    }
+    
     def extract(self) -> Dict:
         """Extract balance sheet data"""
         logger.info(f"Extracting Balance Sheet from {self.pdf_path}")
         
-        data = {
-            'total_assets': self._search_for_value(r'total\s+assets'),
-            'property_and_equipment': self._search_for_value(r'total\s+property\s+(&|and)\s+equipment'),
-            'current_assets': self._search_for_value(r'current\s+assets'),
-            'fixed_assets': self._search_for_value(r'(fixed|property|plant|equipment)\s+assets'),
-            'total_liabilities': self._search_for_value(r'total\s+liabilities'),
-            'current_liabilities': self._search_for_value(r'current\s+liabilities'),
-            'long_term_debt': self._search_for_value(r'long[- ]term\s+(debt|liabilities)'),
-            'total_equity': self._search_for_value(r'(total\s+)?(stockholders?|shareholders?)?\'?\s*equity'),
-        }
+        data = self._scan_labels()
+        property_items = data.pop('property_items')
+        depreciation = data.pop('depreciation')
         
         # If property_and_equipment not found directly, try to calculate it
         if not data.get('property_and_equipment'):
-            # Look for property-related assets and depreciation
-            property_items = self._search_for_value(r'(land|buildings?|improvements?|roof|hvac|parking)')
-            depreciation = self._search_for_value(r'accum.*depr')
+            # Use property-related assets and depreciation
             if property_items and depreciation:
                 data['property_and_equipment'] = property_items + depreciation  # depreciation is negative
         
@@ -101,19 +221,21 @@ class BalanceSheetExtractor(FinancialExtractor):
 class IncomeStatementExtractor(FinancialExtractor):
     """Extract data from Income Statement"""
     
+    LABEL_PATTERNS = {
+        'total_revenue': r'total\s+(revenue|income)',
+        'rental_revenue': r'rental\s+(revenue|income)',
+        'gross_profit': r'gross\s+profit',
+        'operating_expenses': r'operating\s+expenses',
+        'net_operating_income': r'net\s+operating\s+income|NOI',
+        'net_income': r'net\s+income',
+        'ebitda': r'EBITDA',
+    }
+    
     def extract(self) -> Dict:
         """Extract income statement data"""
         logger.info(f"Extracting Income Statement from {self.pdf_path}")
         
-        data = {
-            'total_revenue': self._search_for_value(r'total\s+(revenue|income)'),
-            'rental_revenue': self._search_for_value(r'rental\s+(revenue|income)'),
-            'gross_profit': self._search_for_value(r'gross\s+profit'),
-            'operating_expenses': self._search_for_value(r'(total\s+)?operating\s+expenses'),
-            'net_operating_income': self._search_for_value(r'net\s+operating\s+income|NOI'),
-            'net_income': self._search_for_value(r'net\s+income'),
-            'ebitda': self._search_for_value(r'EBITDA'),
-        }
+        data = self._scan_labels()
         
         # Calculate NOI if not directly found
         if not data['net_operating_income'] and data['total_revenue'] and data['operating_expenses']:
@@ -132,18 +254,20 @@ class IncomeStatementExtractor(FinancialExtractor):
 class CashFlowExtractor(FinancialExtractor):
     """Extract data from Cash Flow Statement"""
     
+    LABEL_PATTERNS = {
+        'operating_cash_flow': r'cash\s+(from|provided\s+by)\s+operating',
+        'investing_cash_flow': r'cash\s+(from|used\s+in)\s+investing',
+        'financing_cash_flow': r'cash\s+(from|used\s+in)\s+financing',
+        'net_cash_flow': r'net\s+(increase|decrease|change)\s+in\s+cash',
+        'beginning_cash': r'(cash|beginning)\s+(at\s+)?beginning',
+        'ending_cash': r'(cash|ending)\s+(at\s+)?end',
+    }
+    
     def extract(self) -> Dict:
         """Extract cash flow data"""
         logger.info(f"Extracting Cash Flow from {self.pdf_path}")
         
-        data = {
-            'operating_cash_flow': self._search_for_value(r'(net\s+)?cash\s+(from|provided\s+by)\s+operating'),
-            'investing_cash_flow': self._search_for_value(r'cash\s+(from|used\s+in)\s+investing'),
-            'financing_cash_flow': self._search_for_value(r'cash\s+(from|used\s+in)\s+financing'),
-            'net_cash_flow': self._search_for_value(r'net\s+(increase|decrease|change)\s+in\s+cash'),
-            'beginning_cash': self._search_for_value(r'(cash|beginning)\s+(at\s+)?beginning'),
-            'ending_cash': self._search_for_value(r'(cash|ending)\s+(at\s+)?end'),
-        }
+        data = self._scan_labels()
         
         # Convert Decimals to float
         return {k: float(v) if isinstance(v, Decimal) else v for k, v in data.items() if v is not None}
@@ -156,7 +280,7 @@ class RentRollExtractor(FinancialExtractor):
         logger.info(f"Extracting Rent Roll from {self.pdf_path}")
         
         tenants = []
-        lines = self.text.split('\n')
+        lines = self.lines
         
         # Try to extract tenant data (simplified approach)
         # Real implementation would need more sophisticated parsing
@@ -578,14 +578,25 @@ export function ExportAnalytics() {
         }
       });
       
-      const data = await response.json();
-      
+      let blob;
+      let filename;
+      if (format === 'json') {
+        const data = await response.json();
+        blob = new Blob([JSON.stringify(data.data, null, 2)], { type: 'application/json' });
+        filename = data.filename;
+      } else {
+        // csv/ndjson/parquet are streamed as file downloads
+        blob = await response.blob();
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename="([^"]+)"/);
+        filename = match ? match[1] : `reims_analytics.${format}`;
+      }
+
       // Create download link
-      const blob = new Blob([JSON.stringify(data.data, null, 2)], { type: 'application/json' });
       const url = window.URL.createObjectURL(blob);
       const a = document.createElement('a');
       a.href = url;
-      a.download = data.filename;
+      a.download = filename;
       document.body.appendChild(a);
       a.click();
       window.URL.revokeObjectURL(url);
@@ -176,6 +176,10 @@ def populate_historical_data():
         
         conn.commit()
         
+        # Running APIs refresh KPI snapshots built from financial history
+        from backend.utils.tagged_cache import publish_invalidation
+        publish_invalidation(["financial_history", "properties", "documents"])
+        
         print(f"\n✅ Successfully created {records_created} historical records")
         print(f"✅ Updated {documents_updated} documents with year information")
         
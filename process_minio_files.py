@@ -2,6 +2,14 @@
 """
 Process MinIO Files and Extract Data to Database
 Retroactive processing for files uploaded to MinIO without database records
+
+A manifest of (bucket, key, ETag, size, last-modified) for every processed
+object is kept in the database. With --incremental only new or changed
+objects are downloaded; with --events the bucket listing is replaced by
+MinIO bucket notifications read from a Redis list.
+
+Usage:
+    python process_minio_files.py [--incremental] [--events]
 """
 
 import os
@@ -9,8 +17,10 @@ import sys
 import uuid
 import json
 import sqlite3
+import argparse
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import unquote_plus
 from minio import Minio
 import io
 
@@ -38,6 +48,9 @@ MINIO_SECRET_KEY = "minioadmin"
 # Database configuration
 DB_PATH = "reims.db"
 
+# MinIO bucket notifications (Redis target, "access" format) are pushed here
+MINIO_EVENTS_KEY = os.getenv("MINIO_EVENTS_KEY", "minio_events")
+
 # Temporary download directory
 TEMP_DIR = "temp_processing"
 os.makedirs(TEMP_DIR, exist_ok=True)
@@ -52,14 +65,103 @@ class MinIOFileProcessor:
         )
         self.db_conn = sqlite3.connect(DB_PATH)
         self.db_cursor = self.db_conn.cursor()
+        self._ensure_manifest_table()
+    
+    def _ensure_manifest_table(self):
+        """Create the scan manifest table if needed"""
+        self.db_cursor.execute("""
+            CREATE TABLE IF NOT EXISTS minio_scan_manifest (
+                bucket TEXT NOT NULL,
+                object_name TEXT NOT NULL,
+                etag TEXT,
+                size INTEGER,
+                last_modified TEXT,
+                document_id TEXT,
+                processed_at TEXT,
+                PRIMARY KEY (bucket, object_name)
+            )
+        """)
+        self.db_conn.commit()
+    
+    def load_manifest(self):
+        """(bucket, object_name) -> manifest row for every processed object"""
+        self.db_cursor.execute("""
+            SELECT bucket, object_name, etag, size, last_modified, document_id
+            FROM minio_scan_manifest
+        """)
+        return {
+            (row[0], row[1]): {
+                'etag': row[2],
+                'size': row[3],
+                'last_modified': row[4],
+                'document_id': row[5]
+            }
+            for row in self.db_cursor.fetchall()
+        }
+    
+    def record_manifest(self, file_info, document_id):
+        """Remember an object as processed at its current ETag/size/mtime"""
+        last_modified = file_info.get('last_modified')
+        if isinstance(last_modified, datetime):
+            last_modified = last_modified.isoformat()
+        self.db_cursor.execute("""
+            INSERT INTO minio_scan_manifest (
+                bucket, object_name, etag, size, last_modified, document_id, processed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(bucket, object_name) DO UPDATE SET
+                etag = excluded.etag,
+                size = excluded.size,
+                last_modified = excluded.last_modified,
+                document_id = excluded.document_id,
+                processed_at = excluded.processed_at
+        """, (
+            file_info['bucket'],
+            file_info['object_name'],
+            file_info.get('etag'),
+            file_info.get('size'),
+            last_modified,
+            document_id,
+            datetime.utcnow().isoformat()
+        ))
+        self.db_conn.commit()
+    
+    def forget_manifest(self, bucket, object_name):
+        """Drop a deleted object from the manifest"""
+        self.db_cursor.execute(
+            "DELETE FROM minio_scan_manifest WHERE bucket = ? AND object_name = ?",
+            (bucket, object_name)
+        )
+        self.db_conn.commit()
+    
+    @staticmethod
+    def _is_ignored(object_name):
+        """Skip test/temporary files"""
+        return 'persistence_test' in object_name or 'test' in object_name.lower()
+    
+    @staticmethod
+    def _has_changed(file_info, entry):
+        """True if an object differs from its manifest entry"""
+        if entry is None:
+            return True
+        if file_info.get('etag') != entry['etag']:
+            return True
+        return file_info.get('size') is not None and file_info['size'] != entry['size']
+    
+    def scan_minio_files(self, incremental=False):
+        """
+        Scan all MinIO buckets for uploaded files.
         
-    def scan_minio_files(self):
-        """Scan all MinIO buckets for uploaded files"""
+        In incremental mode only objects that are new or changed since they were
+        last processed are returned, and deleted objects leave the manifest.
+        """
         print("\n" + "="*70)
-        print("📦 SCANNING MINIO BUCKETS")
+        print("📦 SCANNING MINIO BUCKETS" + (" (incremental)" if incremental else ""))
         print("="*70 + "\n")
         
+        manifest = self.load_manifest() if incremental else {}
+        seen = set()
         all_files = []
+        unchanged = 0
         buckets = self.minio_client.list_buckets()
         
         for bucket in buckets:
@@ -68,8 +170,7 @@ class MinIOFileProcessor:
             if objects:
                 print(f"📂 Bucket: {bucket.name}")
                 for obj in objects:
-                    # Skip test/temporary files
-                    if 'persistence_test' in obj.object_name or 'test' in obj.object_name.lower():
+                    if self._is_ignored(obj.object_name):
                         continue
                         
                     file_info = {
@@ -79,13 +180,91 @@ class MinIOFileProcessor:
                         'last_modified': obj.last_modified,
                         'etag': obj.etag
                     }
+                    key = (bucket.name, obj.object_name)
+                    seen.add(key)
+                    if incremental:
+                        entry = manifest.get(key)
+                        if not self._has_changed(file_info, entry):
+                            unchanged += 1
+                            continue
+                        file_info['document_id'] = entry['document_id'] if entry else None
                     all_files.append(file_info)
                     print(f"  ✓ {obj.object_name} ({obj.size} bytes)")
                 print()
         
-        print(f"📊 Total files found: {len(all_files)}\n")
+        if incremental:
+            removed = [key for key in manifest if key not in seen]
+            for bucket_name, object_name in removed:
+                self.forget_manifest(bucket_name, object_name)
+            print(f"📊 New or changed: {len(all_files)}, unchanged: {unchanged}, removed: {len(removed)}\n")
+        else:
+            print(f"📊 Total files found: {len(all_files)}\n")
         return all_files
     
+    def consume_bucket_events(self, redis_conn, max_events=None):
+        """
+        Collect changed objects from MinIO bucket notifications instead of
+        listing the buckets. Events are popped from the MINIO_EVENTS_KEY list
+        (MinIO Redis notification target, access format).
+        """
+        print("\n" + "="*70)
+        print("📨 READING BUCKET NOTIFICATIONS")
+        print("="*70 + "\n")
+        
+        manifest = self.load_manifest()
+        changes = {}
+        consumed = 0
+        
+        while max_events is None or consumed < max_events:
+            raw = redis_conn.lpop(MINIO_EVENTS_KEY)
+            if raw is None:
+                break
+            consumed += 1
+            try:
+                event = json.loads(raw)
+            except (TypeError, ValueError):
+                print(f"  ⚠️  Skipping malformed event {consumed} of this run: {raw[:200]!r}")
+                continue
+            
+            # Access format wraps the notification as [{"Event": [...], "EventTime": ...}]
+            entries = event if isinstance(event, list) else [event]
+            for entry in entries:
+                records = entry.get('Event') or entry.get('Records') or []
+                for record in records:
+                    s3 = record.get('s3', {})
+                    bucket = s3.get('bucket', {}).get('name')
+                    obj = s3.get('object', {})
+                    object_name = unquote_plus(obj.get('key', ''))
+                    if not bucket or not object_name or self._is_ignored(object_name):
+                        continue
+                    # Later events for the same key supersede earlier ones
+                    changes[(bucket, object_name)] = (
+                        record.get('eventName', ''), obj, record.get('eventTime')
+                    )
+        
+        files = []
+        for (bucket, object_name), (event_name, obj, event_time) in changes.items():
+            if event_name.startswith('s3:ObjectRemoved'):
+                self.forget_manifest(bucket, object_name)
+                print(f"  🗑️  {object_name} removed")
+                continue
+            file_info = {
+                'bucket': bucket,
+                'object_name': object_name,
+                'size': obj.get('size'),
+                'last_modified': event_time,
+                'etag': obj.get('eTag')
+            }
+            entry = manifest.get((bucket, object_name))
+            if not self._has_changed(file_info, entry):
+                continue
+            file_info['document_id'] = entry['document_id'] if entry else None
+            files.append(file_info)
+            print(f"  ✓ {object_name} ({file_info['size']} bytes)")
+        
+        print(f"\n📊 Events consumed: {consumed}, objects to process: {len(files)}\n")
+        return files
+    
     def create_database_records(self, file_info):
         """Create database records for a file"""
         document_id = str(uuid.uuid4())
@@ -155,6 +334,44 @@ class MinIOFileProcessor:
             print(f"  ❌ Database error: {e}")
             return None, None
     
+    def refresh_database_records(self, file_info, document_id):
+        """Reset an existing document for a changed object and queue a new job"""
+        try:
+            self.db_cursor.execute("""
+                UPDATE documents
+                SET file_size = ?, minio_upload_timestamp = ?, status = 'uploaded'
+                WHERE document_id = ?
+            """, (file_info['size'], file_info['last_modified'], document_id))
+            
+            if self.db_cursor.rowcount == 0:
+                # Document record is gone; start over as a new file
+                self.db_conn.rollback()
+                return self.create_database_records(file_info)
+            
+            # Replace the previous extraction
+            self.db_cursor.execute("DELETE FROM extracted_data WHERE document_id = ?", (document_id,))
+            
+            job_id = str(uuid.uuid4())
+            self.db_cursor.execute("""
+                INSERT INTO processing_jobs (
+                    id, job_id, document_id, status, created_at
+                ) VALUES (?, ?, ?, ?, ?)
+            """, (
+                str(uuid.uuid4()),
+                job_id,
+                document_id,
+                'queued',
+                datetime.utcnow()
+            ))
+            
+            self.db_conn.commit()
+            return document_id, job_id
+            
+        except Exception as e:
+            self.db_conn.rollback()
+            print(f"  ❌ Database error: {e}")
+            return None, None
+    
     def download_and_extract(self, file_info, document_id):
         """Download file from MinIO and extract data"""
         try:
@@ -320,14 +537,22 @@ class MinIOFileProcessor:
             print(f"  ❌ Error storing data: {e}")
             return False
     
-    def process_all_files(self):
-        """Main processing workflow"""
+    def process_all_files(self, incremental=False, redis_conn=None):
+        """
+        Main processing workflow.
+        
+        incremental: only process objects that are new or changed per the manifest
+        redis_conn: read changes from bucket notifications instead of listing
+        """
         print("\n╔══════════════════════════════════════════════════════════════════════╗")
         print("║          📄 PROCESSING MINIO FILES TO DATABASE 📄                   ║")
         print("╚══════════════════════════════════════════════════════════════════════╝\n")
         
-        # Step 1: Scan MinIO
-        files = self.scan_minio_files()
+        # Step 1: Scan MinIO (or read its change notifications)
+        if redis_conn is not None:
+            files = self.consume_bucket_events(redis_conn)
+        else:
+            files = self.scan_minio_files(incremental=incremental)
         
         if not files:
             print("⚠️  No files found to process")
@@ -344,8 +569,11 @@ class MinIOFileProcessor:
         for i, file_info in enumerate(files, 1):
             print(f"\n📄 Processing file {i}/{len(files)}: {file_info['object_name']}")
             
-            # Create database records
-            document_id, job_id = self.create_database_records(file_info)
+            # Create database records (or reuse them for a changed object)
+            if file_info.get('document_id'):
+                document_id, job_id = self.refresh_database_records(file_info, file_info['document_id'])
+            else:
+                document_id, job_id = self.create_database_records(file_info)
             if not document_id:
                 print("  ❌ Failed to create database records")
                 failed_count += 1
@@ -363,6 +591,7 @@ class MinIOFileProcessor:
                 # Store extracted data
                 if self.store_extracted_data(document_id, extraction_result):
                     print("  ✓ Data stored in database")
+                    self.record_manifest(file_info, document_id)
                     processed_count += 1
                 else:
                     print("  ❌ Failed to store data")
@@ -404,10 +633,32 @@ class MinIOFileProcessor:
             shutil.rmtree(TEMP_DIR)
 
 
+def _connect_redis():
+    """Redis connection used to read MinIO bucket notifications"""
+    from redis import Redis
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        password=os.getenv("REDIS_PASSWORD", "") or None,
+        socket_connect_timeout=5,
+        socket_timeout=5
+    )
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Process MinIO files into the database')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process objects that are new or changed since the last run')
+    parser.add_argument('--events', action='store_true',
+                        help=f'Read changes from MinIO bucket notifications in the Redis list {MINIO_EVENTS_KEY}')
+    args = parser.parse_args()
+    
     processor = MinIOFileProcessor()
     try:
-        processor.process_all_files()
+        processor.process_all_files(
+            incremental=args.incremental,
+            redis_conn=_connect_redis() if args.events else None
+        )
     finally:
         processor.close()
 
@@ -22,8 +22,12 @@ except ImportError as e:
     print(f"✗ Failed to import database module: {e}")
     sys.exit(1)
 
+from job_dedup import JobDeduplicator, COMPLETED, FAILED
+from backend.utils.tagged_cache import tagged_cache
+
 # Connect to Redis
 redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+dedup = JobDeduplicator(redis_client)
 
 print("=" * 80)
 print("REIMS Direct Worker Started")
@@ -52,6 +56,7 @@ def update_document_status(document_id, status, error_message=None):
         })
         db.commit()
         db.close()
+        tagged_cache.invalidate(redis_client, ["documents", "processing"])
         print(f"   ✓ Updated document {document_id} status to: {status}")
         return True
     except Exception as e:
@@ -79,8 +84,10 @@ def process_document(job_data):
         # Simulate processing
         time.sleep(0.5)
         
-        # Mark as completed
+        # Mark as completed, along with duplicate uploads attached to this job
         success = update_document_status(document_id, 'completed')
+        for attached_id in dedup.finish(document_id, COMPLETED):
+            update_document_status(attached_id, 'completed')
         
         if success:
             print(f"   ✓ Processing completed successfully")
@@ -91,7 +98,8 @@ def process_document(job_data):
         
     except Exception as e:
         print(f"   ✗ Processing failed: {e}")
-        update_document_status(document_id, 'failed', str(e))
+        for failed_id in [document_id] + dedup.finish(document_id, FAILED):
+            update_document_status(failed_id, 'failed', str(e))
         return False
 
 def main():
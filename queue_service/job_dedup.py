@@ -0,0 +1,204 @@
+"""
+Processing Job Deduplication for REIMS
+Idempotency layer so identical submissions share one processing job
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever document processing output changes, so results produced by an
+# older processor are not reused for new submissions
+PROCESSOR_VERSION = "1"
+
+# How long a submission key is remembered (and a completed result reused)
+DEDUP_TTL_SECONDS = 7 * 24 * 3600
+
+# Documents attached to a job are remembered a little longer than the job key
+ATTACHED_TTL_SECONDS = DEDUP_TTL_SECONDS + 24 * 3600
+
+# A key claimed this recently whose job cannot be found yet is still being
+# enqueued by the first submitter, so it counts as in flight
+ENQUEUE_GRACE_SECONDS = 30
+
+DEDUP_STATS_KEY = "dedup:stats"
+
+# Job states reported by the job_state callback (None = job not found)
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Delete KEYS[1] only if it still holds ARGV[1] (a stale job reference)
+RELEASE_KEY_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Attach ARGV[1] to a job (KEYS[1] = its attached set) unless the job has
+# already finished (KEYS[2] = its done marker); returns the marker's outcome
+# when refused, '' when attached
+ATTACH_SCRIPT = """
+local done = redis.call('GET', KEYS[2])
+if done then
+    return done
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return ''
+"""
+
+# Mark a job finished with outcome ARGV[1] and take its attached documents,
+# in one step so no document can attach after the worker has read the set
+FINISH_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+local attached = redis.call('SMEMBERS', KEYS[1])
+redis.call('DEL', KEYS[1])
+return attached
+"""
+
+
+def content_key(file_hash: str, version: str = PROCESSOR_VERSION) -> str:
+    """Submission key for a file, by SHA-256 of its content"""
+    return f"dedup:{version}:content:{file_hash}"
+
+
+def document_key(document_id: str, version: str = PROCESSOR_VERSION) -> str:
+    """Submission key for an already-stored document, by id"""
+    return f"dedup:{version}:document:{document_id}"
+
+
+def payload_key(kind: str, payload: Dict, version: str = PROCESSOR_VERSION) -> str:
+    """Submission key for an arbitrary JSON payload (e.g. a batch request)"""
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return f"dedup:{version}:{kind}:{digest}"
+
+
+def _attached_key(job_id: str) -> str:
+    return f"dedup:attached:{job_id}"
+
+
+def _done_key(job_id: str) -> str:
+    return f"dedup:done:{job_id}"
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class JobDeduplicator:
+    """
+    Redis-backed submission registry.
+
+    submit() claims a key with SET NX before enqueuing, so concurrent
+    duplicates cannot both enqueue. A later duplicate gets the existing job
+    back: attached to it while it is in flight, or reusing its result once
+    it has completed. If the existing job failed or has expired the key is
+    taken over and the work is enqueued again.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int = DEDUP_TTL_SECONDS):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self._release_key = redis_client.register_script(RELEASE_KEY_SCRIPT)
+        self._attach = redis_client.register_script(ATTACH_SCRIPT)
+        self._finish = redis_client.register_script(FINISH_SCRIPT)
+
+    def submit(self, key: str, enqueue: Callable[[str], None],
+               job_state: Callable[[str], Optional[str]],
+               job_id: Optional[str] = None,
+               attach_id: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Enqueue work once per key.
+
+        Args:
+            key: Submission key (content_key / document_key / payload_key)
+            enqueue: Called with a new job id when the work must be enqueued;
+                it must enqueue the job under exactly that id
+            job_state: Maps an existing job id to IN_FLIGHT, COMPLETED,
+                FAILED or None (not found); on FAILED or None the work is
+                enqueued again
+            job_id: Id to enqueue under if the work is new (default: a new UUID)
+            attach_id: Document to attach to the existing job when it is in
+                flight; if the job finishes first the document reuses its
+                result (or re-enqueues the work) instead
+
+        Returns:
+            (job_id, outcome) with outcome "enqueued", IN_FLIGHT or COMPLETED
+        """
+        job_id = job_id or str(uuid.uuid4())
+        for _ in range(3):
+            if self.redis_client.set(key, job_id, nx=True, ex=self.ttl_seconds):
+                try:
+                    enqueue(job_id)
+                except Exception:
+                    self._release_key(keys=[key], args=[job_id])
+                    raise
+                self._count("enqueued")
+                return job_id, "enqueued"
+
+            existing = _text(self.redis_client.get(key))
+            if existing is None:
+                continue
+
+            state = job_state(existing)
+            if state is None and self.redis_client.ttl(key) > self.ttl_seconds - ENQUEUE_GRACE_SECONDS:
+                state = IN_FLIGHT
+            if state == IN_FLIGHT and attach_id is not None:
+                state = self.attach(existing, attach_id) or IN_FLIGHT
+            if state == IN_FLIGHT:
+                self._count("coalesced_in_flight")
+                return existing, IN_FLIGHT
+            if state == COMPLETED:
+                self._count("reused_completed")
+                return existing, COMPLETED
+
+            # Failed or gone: drop the stale reference and try to claim again
+            self._release_key(keys=[key], args=[existing])
+
+        # Lost the race repeatedly; fall back to plain enqueueing
+        enqueue(job_id)
+        self._count("enqueued")
+        return job_id, "enqueued"
+
+    def attach(self, job_id: str, document_id: str) -> Optional[str]:
+        """
+        Record a duplicate document that should receive job_id's result.
+        Returns None once attached, or the outcome (COMPLETED / FAILED) the
+        job already finished with, in which case nothing was attached.
+        """
+        done = self._attach(keys=[_attached_key(job_id), _done_key(job_id)],
+                            args=[document_id, ATTACHED_TTL_SECONDS])
+        return _text(done) or None
+
+    def finish(self, job_id: str, outcome: str) -> List[str]:
+        """
+        Mark job_id finished (COMPLETED or FAILED) and return the documents
+        attached to it, which the caller must now give the outcome. Later
+        attach() calls for the job are refused.
+        """
+        attached = self._finish(keys=[_attached_key(job_id), _done_key(job_id)],
+                                args=[outcome, ATTACHED_TTL_SECONDS])
+        return [_text(member) for member in attached]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Counters: jobs enqueued, and submissions coalesced or reused"""
+        raw = self.redis_client.hgetall(DEDUP_STATS_KEY)
+        stats = {"enqueued": 0, "coalesced_in_flight": 0, "reused_completed": 0}
+        for field, value in raw.items():
+            if isinstance(field, bytes):
+                field = field.decode()
+            stats[field] = int(value)
+        stats["jobs_saved"] = stats["coalesced_in_flight"] + stats["reused_completed"]
+        return stats
+
+    def _count(self, field: str):
+        try:
+            self.redis_client.hincrby(DEDUP_STATS_KEY, field, 1)
+        except Exception as e:
+            logger.warning(f"Could not update dedup stats: {e}")
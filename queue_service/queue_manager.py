@@ -6,11 +6,14 @@ Handles asynchronous document processing tasks
 import redis
 import json
 import uuid
+import time
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
 
+from job_dedup import JobDeduplicator, IN_FLIGHT, COMPLETED, FAILED, document_key, payload_key
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +31,100 @@ class JobPriority(Enum):
     HIGH = 2
     URGENT = 3
 
+# Maximum number of due scheduled jobs promoted per round trip
+SCHEDULED_PROMOTION_BATCH = 100
+
+# Redis index keys. Pending and scheduled jobs live in the queue:/scheduled:
+# sorted sets; processing/completed/failed jobs are tracked in per-queue status
+# sets, and finished jobs in a sorted set scored by completion time so cleanup
+# only touches expired jobs.
+KNOWN_QUEUES_KEY = "queues"
+
+def _status_key(queue_name: str, status: str) -> str:
+    return f"jobs:{queue_name}:{status}"
+
+def _finished_key(queue_name: str) -> str:
+    return f"finished:{queue_name}"
+
+# Per-queue wake-up list: enqueue pushes a token so idle workers can block on
+# BLPOP instead of polling. Capped so it cannot grow without bound.
+NOTIFY_LIST_MAX = 1000
+
+def _notify_key(queue_name: str) -> str:
+    return f"notify:{queue_name}"
+
+# Atomically promote due scheduled jobs and claim up to N jobs from a queue.
+# KEYS[1] = queue:<name>, KEYS[2] = scheduled:<name>, KEYS[3] = jobs:<name>:processing
+# ARGV[1] = now (epoch seconds), ARGV[2] = worker_id, ARGV[3] = now (ISO),
+# ARGV[4] = number of jobs to claim, ARGV[5] = promotion batch size
+# Job hashes (job:<id>) are addressed by name, so this assumes a single Redis node.
+CLAIM_JOBS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local due = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, tonumber(ARGV[5]))
+for _, job_id in ipairs(due) do
+    local priority = tonumber(redis.call('HGET', 'job:' .. job_id, 'priority') or '1')
+    redis.call('ZADD', KEYS[1], priority * 1000000 + now, job_id)
+    redis.call('ZREM', KEYS[2], job_id)
+end
+
+local claimed = {}
+local count = tonumber(ARGV[4])
+if count > 0 then
+    local popped = redis.call('ZPOPMAX', KEYS[1], count)
+    for i = 1, #popped, 2 do
+        local job_key = 'job:' .. popped[i]
+        redis.call('HSET', job_key,
+            'status', 'processing',
+            'worker_id', ARGV[2],
+            'started_at', ARGV[3],
+            'updated_at', ARGV[3])
+        redis.call('SADD', KEYS[3], popped[i])
+        table.insert(claimed, redis.call('HGETALL', job_key))
+    end
+end
+return claimed
+"""
+
+# Batches: a parent hash (batch:<id>) with total/completed/failed counters,
+# a per-document results hash, and for each child job the set of batches
+# waiting on it (a child can be shared with other batches via dedup).
+BATCH_TTL_SECONDS = 7 * 24 * 3600
+
+def _batch_key(batch_id: str) -> str:
+    return f"batch:{batch_id}"
+
+def _batch_results_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:results"
+
+def _job_batches_key(job_id: str) -> str:
+    return f"job_batches:{job_id}"
+
+# Record one child's outcome on a batch, at most once per document.
+# KEYS[1] = batch:<id>, KEYS[2] = batch:<id>:results
+# ARGV[1] = document_id, ARGV[2] = 'completed' or 'failed', ARGV[3] = child
+# result (JSON), ARGV[4] = now (ISO)
+# Returns 1 if this child finished the batch, 0 if not, -1 if ignored.
+RECORD_BATCH_CHILD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+if redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[3]) == 0 then
+    return -1
+end
+redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+redis.call('HSET', KEYS[1], 'updated_at', ARGV[4])
+local finished = redis.call('HINCRBY', KEYS[1], 'finished', 1)
+if finished == tonumber(redis.call('HGET', KEYS[1], 'total')) then
+    local status = 'completed'
+    if tonumber(redis.call('HGET', KEYS[1], 'failed')) > 0 then
+        status = 'completed_with_errors'
+    end
+    redis.call('HSET', KEYS[1], 'status', status, 'completed_at', ARGV[4])
+    return 1
+end
+return 0
+"""
+
 class QueueManager:
     """
     Redis-based queue manager for background job processing
@@ -43,11 +140,17 @@ class QueueManager:
             )
             # Test connection
             self.redis_client.ping()
+            self._claim_jobs = self.redis_client.register_script(CLAIM_JOBS_SCRIPT)
+            self._record_batch_child = self.redis_client.register_script(RECORD_BATCH_CHILD_SCRIPT)
+            self.dedup = JobDeduplicator(self.redis_client)
             logger.info("Connected to Redis successfully")
         except redis.ConnectionError:
             logger.warning("Redis not available - using in-memory fallback")
             self.redis_client = None
+            self.dedup = None
             self._memory_store = {}
+            self._memory_batches = {}
+            self._memory_batch_links = {}
             self._memory_queues = {
                 'document_processing': [],
                 'ai_analysis': [],
@@ -56,11 +159,11 @@ class QueueManager:
     
     def enqueue_job(self, queue_name: str, job_type: str, job_data: Dict[str, Any], 
                     priority: JobPriority = JobPriority.NORMAL, 
-                    delay_seconds: int = 0) -> str:
+                    delay_seconds: int = 0, job_id: str = None) -> str:
         """
         Add a job to the specified queue
         """
-        job_id = str(uuid.uuid4())
+        job_id = job_id or str(uuid.uuid4())
         
         job = {
             'job_id': job_id,
@@ -79,17 +182,24 @@ class QueueManager:
         }
         
         if self.redis_client:
-            # Store job details
-            self.redis_client.hset(f"job:{job_id}", mapping=job)
+            pipe = self.redis_client.pipeline(transaction=True)
+            
+            # Store job details (hash values must be flat strings/numbers)
+            pipe.hset(f"job:{job_id}", mapping=self._serialize_job(job))
+            pipe.sadd(KNOWN_QUEUES_KEY, queue_name)
             
             # Add to priority queue
-            score = priority.value * 1000000 + int(datetime.utcnow().timestamp())
+            now = int(datetime.utcnow().timestamp())
+            score = priority.value * 1000000 + now
             if delay_seconds > 0:
-                # Schedule for later
-                self.redis_client.zadd(f"scheduled:{queue_name}", {job_id: score + delay_seconds})
+                # Schedule for later (scheduled set is scored by due time)
+                pipe.zadd(f"scheduled:{queue_name}", {job_id: now + delay_seconds})
             else:
-                # Add to immediate processing queue
-                self.redis_client.zadd(f"queue:{queue_name}", {job_id: score})
+                # Add to immediate processing queue and wake one idle worker
+                pipe.zadd(f"queue:{queue_name}", {job_id: score})
+                pipe.lpush(_notify_key(queue_name), job_id)
+                pipe.ltrim(_notify_key(queue_name), 0, NOTIFY_LIST_MAX - 1)
+            pipe.execute()
             
             logger.info(f"Job {job_id} enqueued to {queue_name}")
         else:
@@ -102,47 +212,316 @@ class QueueManager:
         
         return job_id
     
+    def enqueue_unique_job(self, queue_name: str, job_type: str, job_data: Dict[str, Any],
+                           dedup_key: str, priority: JobPriority = JobPriority.NORMAL,
+                           delay_seconds: int = 0, job_id: str = None) -> Tuple[str, str]:
+        """
+        Enqueue a job at most once per dedup_key (see job_dedup).
+        Returns (job_id, outcome): "enqueued" for a new job, "in_flight" when
+        an identical job is pending or processing, "completed" when an
+        identical job already finished and its result can be reused.
+        """
+        def enqueue(job_id: str):
+            self.enqueue_job(queue_name, job_type, job_data, priority, delay_seconds, job_id=job_id)
+        
+        if not self.dedup:
+            # Memory fallback: no shared registry to deduplicate against
+            job_id = job_id or str(uuid.uuid4())
+            enqueue(job_id)
+            return job_id, "enqueued"
+        
+        return self.dedup.submit(dedup_key, enqueue, self._job_state, job_id=job_id)
+    
+    def _job_state(self, job_id: str) -> Optional[str]:
+        """Classify an existing job for deduplication"""
+        status = self.redis_client.hget(f"job:{job_id}", 'status')
+        if status in (JobStatus.PENDING.value, JobStatus.PROCESSING.value):
+            return IN_FLIGHT
+        if status == JobStatus.COMPLETED.value:
+            return COMPLETED
+        return FAILED if status else None
+    
+    def enqueue_batch(self, document_ids: List[str], options: Dict[str, Any] = None,
+                      priority: JobPriority = JobPriority.NORMAL) -> Tuple[str, str]:
+        """
+        Fan a batch out into one document_processing job per document, so
+        the batch is spread across workers, under a parent batch record that
+        counts completed/failed children and keeps their results. When the
+        last child finishes the batch is marked done and a
+        batch_processing_complete notification is queued.
+        
+        Returns (batch_id, outcome); submitting the same batch again returns
+        the existing batch (see job_dedup).
+        """
+        options = options or {}
+        document_ids = list(dict.fromkeys(document_ids))
+        
+        def create(batch_id: str):
+            self._create_batch(batch_id, document_ids, options, priority)
+        
+        if not self.dedup:
+            batch_id = str(uuid.uuid4())
+            create(batch_id)
+            return batch_id, "enqueued"
+        
+        dedup_key = payload_key('batch', {'document_ids': sorted(document_ids), 'options': options})
+        return self.dedup.submit(dedup_key, create, self._batch_state)
+    
+    def _create_batch(self, batch_id: str, document_ids: List[str], options: Dict[str, Any],
+                      priority: JobPriority):
+        now = datetime.utcnow().isoformat()
+        batch = {
+            'batch_id': batch_id,
+            'status': 'running',
+            'total': len(document_ids),
+            'completed': 0,
+            'failed': 0,
+            'finished': 0,
+            'options': options,
+            'created_at': now,
+            'updated_at': now,
+            'completed_at': None
+        }
+        
+        if self.redis_client:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hset(_batch_key(batch_id), mapping=self._serialize_job(batch))
+            pipe.expire(_batch_key(batch_id), BATCH_TTL_SECONDS)
+            pipe.execute()
+        else:
+            batch['results'] = {}
+            self._memory_batches[batch_id] = batch
+        
+        for document_id in document_ids:
+            # Link the child before it is enqueued so a fast worker cannot
+            # finish it unnoticed
+            child_id = str(uuid.uuid4())
+            self._link_batch(child_id, batch_id)
+            job_id, outcome = self.enqueue_unique_job(
+                queue_name='document_processing',
+                job_type='document_processing',
+                job_data={
+                    'document_id': document_id,
+                    'file_path': f"storage/{document_id}_*",  # Placeholder
+                    'options': options
+                },
+                dedup_key=document_key(document_id),
+                priority=priority,
+                job_id=child_id
+            )
+            if job_id == child_id:
+                continue
+            
+            # Shared with an existing job: wait on that one instead
+            self._unlink_batch(child_id)
+            self._link_batch(job_id, batch_id)
+            state = self._job_state(job_id)
+            if state in (COMPLETED, FAILED):
+                # It may have finished before we linked; recording is idempotent
+                job = self.get_job_status(job_id) or {}
+                self._record_child(batch_id, document_id, job_id, state == COMPLETED,
+                                   job.get('result'), job.get('error_message'))
+        
+        if not document_ids:
+            self._finish_batch(batch_id)
+        
+        logger.info(f"Batch {batch_id} fanned out into {len(document_ids)} jobs")
+    
+    def _link_batch(self, job_id: str, batch_id: str):
+        if self.redis_client:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.sadd(_job_batches_key(job_id), batch_id)
+            pipe.expire(_job_batches_key(job_id), BATCH_TTL_SECONDS)
+            pipe.execute()
+        else:
+            self._memory_batch_links.setdefault(job_id, set()).add(batch_id)
+    
+    def _unlink_batch(self, job_id: str):
+        if self.redis_client:
+            self.redis_client.delete(_job_batches_key(job_id))
+        else:
+            self._memory_batch_links.pop(job_id, None)
+    
+    def _batch_state(self, batch_id: str) -> Optional[str]:
+        """Classify an existing batch for deduplication"""
+        batch = self.get_batch_status(batch_id, include_results=False)
+        if not batch:
+            return None
+        if batch['status'] == 'running':
+            return IN_FLIGHT
+        # A batch with failures is re-run; its successful documents are reused
+        return COMPLETED if batch['status'] == 'completed' else FAILED
+    
+    def _notify_batches(self, job_id: str, succeeded: bool, result: Optional[Dict[str, Any]] = None,
+                        error_message: str = None):
+        """Record a finished child job on every batch waiting for it"""
+        if self.redis_client:
+            batch_ids = self.redis_client.smembers(_job_batches_key(job_id))
+            if not batch_ids:
+                return
+            job_data = json.loads(self.redis_client.hget(f"job:{job_id}", 'job_data') or '{}')
+        else:
+            batch_ids = self._memory_batch_links.get(job_id)
+            if not batch_ids:
+                return
+            job_data = self._memory_store.get(job_id, {}).get('job_data', {})
+        
+        document_id = job_data.get('document_id', job_id)
+        for batch_id in batch_ids:
+            self._record_child(batch_id, document_id, job_id, succeeded, result, error_message)
+        self._unlink_batch(job_id)
+    
+    def _record_child(self, batch_id: str, document_id: str, job_id: str, succeeded: bool,
+                      result: Optional[Dict[str, Any]], error_message: Optional[str]):
+        child = {'job_id': job_id, 'status': 'completed' if succeeded else 'failed'}
+        if succeeded and isinstance(result, dict):
+            # Keep a summary; the full extraction stays on the child job
+            child['result'] = {k: v for k, v in result.items() if k != 'extraction'}
+        if not succeeded:
+            child['error'] = error_message
+        outcome = 'completed' if succeeded else 'failed'
+        now = datetime.utcnow().isoformat()
+        
+        if self.redis_client:
+            finished_batch = self._record_batch_child(
+                keys=[_batch_key(batch_id), _batch_results_key(batch_id)],
+                args=[document_id, outcome, json.dumps(child, default=str), now]
+            ) == 1
+            if finished_batch:
+                self.redis_client.expire(_batch_results_key(batch_id), BATCH_TTL_SECONDS)
+        else:
+            batch = self._memory_batches.get(batch_id)
+            if batch is None or document_id in batch['results']:
+                return
+            batch['results'][document_id] = child
+            batch[outcome] += 1
+            batch['finished'] += 1
+            batch['updated_at'] = now
+            finished_batch = batch['finished'] == batch['total']
+        
+        if finished_batch:
+            self._finish_batch(batch_id)
+    
+    def _finish_batch(self, batch_id: str):
+        """Completion callback: runs once, for the child that finished the batch"""
+        batch = self.get_batch_status(batch_id, include_results=False)
+        if not batch:
+            return
+        if not self.redis_client and batch['status'] == 'running':
+            batch_record = self._memory_batches[batch_id]
+            batch_record['status'] = 'completed_with_errors' if batch['failed'] else 'completed'
+            batch_record['completed_at'] = datetime.utcnow().isoformat()
+        
+        self.enqueue_job(
+            queue_name='notifications',
+            job_type='notification',
+            job_data={
+                'type': 'batch_processing_complete',
+                'batch_id': batch_id,
+                'processed_count': batch['completed'],
+                'failed_count': batch['failed'],
+                'total_count': batch['total']
+            }
+        )
+        logger.info(
+            f"Batch {batch_id} finished: {batch['completed']} completed, "
+            f"{batch['failed']} failed of {batch['total']}"
+        )
+    
+    def get_batch_status(self, batch_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Get a batch's progress counters and, optionally, its per-document
+        results so far
+        """
+        if self.redis_client:
+            batch = self.redis_client.hgetall(_batch_key(batch_id))
+            if not batch:
+                return None
+            for field in ('total', 'completed', 'failed', 'finished'):
+                batch[field] = int(batch.get(field) or 0)
+            batch['options'] = json.loads(batch.get('options') or '{}')
+            if include_results:
+                batch['results'] = {
+                    document_id: json.loads(child)
+                    for document_id, child in self.redis_client.hgetall(_batch_results_key(batch_id)).items()
+                }
+            return batch
+        
+        batch = self._memory_batches.get(batch_id)
+        if batch is None:
+            return None
+        batch = dict(batch)
+        if not include_results:
+            batch.pop('results', None)
+        return batch
+    
+    @staticmethod
+    def _serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten a job dict for storage in a Redis hash"""
+        serialized = {}
+        for key, value in job.items():
+            if value is None:
+                serialized[key] = ""
+            elif isinstance(value, (dict, list)):
+                serialized[key] = json.dumps(value)
+            else:
+                serialized[key] = value
+        return serialized
+    
     def dequeue_job(self, queue_name: str, worker_id: str) -> Optional[Dict[str, Any]]:
         """
         Get the next job from the queue for processing
         """
+        jobs = self.dequeue_jobs(queue_name, worker_id, count=1)
+        return jobs[0] if jobs else None
+    
+    def dequeue_jobs(self, queue_name: str, worker_id: str, count: int = 1) -> List[Dict[str, Any]]:
+        """
+        Claim up to `count` jobs for a worker in a single atomic round trip.
+        Due scheduled jobs are promoted in the same call.
+        """
         if self.redis_client:
-            # Move scheduled jobs to active queue if their time has come
-            self._process_scheduled_jobs(queue_name)
-            
-            # Get highest priority job
-            jobs = self.redis_client.zrevrange(f"queue:{queue_name}", 0, 0, withscores=True)
+            now = datetime.utcnow()
+            claimed = self._claim_jobs(
+                keys=[f"queue:{queue_name}", f"scheduled:{queue_name}",
+                      _status_key(queue_name, JobStatus.PROCESSING.value)],
+                args=[int(now.timestamp()), worker_id, now.isoformat(), count, SCHEDULED_PROMOTION_BATCH]
+            )
             
-            if jobs:
-                job_id, score = jobs[0]
-                
-                # Remove from queue and mark as processing
-                self.redis_client.zrem(f"queue:{queue_name}", job_id)
-                self.redis_client.hset(f"job:{job_id}", mapping={
-                    'status': JobStatus.PROCESSING.value,
-                    'worker_id': worker_id,
-                    'started_at': datetime.utcnow().isoformat(),
-                    'updated_at': datetime.utcnow().isoformat()
-                })
-                
-                # Get full job details
-                job_data = self.redis_client.hgetall(f"job:{job_id}")
-                if job_data:
-                    job_data['job_data'] = json.loads(job_data.get('job_data', '{}'))
-                    return job_data
-        else:
-            # Memory fallback
-            if queue_name in self._memory_queues and self._memory_queues[queue_name]:
-                job_id = self._memory_queues[queue_name].pop(0)
-                job = self._memory_store.get(job_id)
-                if job:
-                    job['status'] = JobStatus.PROCESSING.value
-                    job['worker_id'] = worker_id
-                    job['started_at'] = datetime.utcnow().isoformat()
-                    job['updated_at'] = datetime.utcnow().isoformat()
-                    return job
+            jobs = []
+            for fields in claimed:
+                job_data = dict(zip(fields[::2], fields[1::2]))
+                job_data['job_data'] = json.loads(job_data.get('job_data', '{}'))
+                jobs.append(job_data)
+            return jobs
         
-        return None
+        # Memory fallback
+        jobs = []
+        queue = self._memory_queues.get(queue_name, [])
+        while queue and len(jobs) < count:
+            job_id = queue.pop(0)
+            job = self._memory_store.get(job_id)
+            if job:
+                job['status'] = JobStatus.PROCESSING.value
+                job['worker_id'] = worker_id
+                job['started_at'] = datetime.utcnow().isoformat()
+                job['updated_at'] = datetime.utcnow().isoformat()
+                jobs.append(job)
+        return jobs
+    
+    def wait_for_jobs(self, queue_names: List[str], timeout: int = 5) -> bool:
+        """
+        Block until a job is enqueued on any of the queues or the timeout expires.
+        Returns True when woken by an enqueue. Callers should then claim with
+        dequeue_jobs; a timeout is the cue to claim anyway so due scheduled
+        jobs get promoted.
+        """
+        if self.redis_client:
+            return self.redis_client.blpop([_notify_key(q) for q in queue_names], timeout=timeout) is not None
+        
+        # Memory fallback has no blocking primitive
+        time.sleep(min(timeout, 1))
+        return any(self._memory_queues.get(q) for q in queue_names)
     
     def complete_job(self, job_id: str, result: Dict[str, Any] = None):
         """
@@ -158,7 +537,14 @@ class QueueManager:
             update_data['result'] = json.dumps(result)
         
         if self.redis_client:
-            self.redis_client.hset(f"job:{job_id}", mapping=update_data)
+            queue_name = self.redis_client.hget(f"job:{job_id}", 'queue_name')
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hset(f"job:{job_id}", mapping=update_data)
+            if queue_name:
+                pipe.srem(_status_key(queue_name, JobStatus.PROCESSING.value), job_id)
+                pipe.sadd(_status_key(queue_name, JobStatus.COMPLETED.value), job_id)
+                pipe.zadd(_finished_key(queue_name), {job_id: datetime.utcnow().timestamp()})
+            pipe.execute()
         else:
             job = self._memory_store.get(job_id)
             if job:
@@ -166,6 +552,7 @@ class QueueManager:
                 if result:
                     job['result'] = result
         
+        self._notify_batches(job_id, True, result=result)
         logger.info(f"Job {job_id} completed")
     
     def fail_job(self, job_id: str, error_message: str, retry: bool = True):
@@ -183,25 +570,34 @@ class QueueManager:
                 'updated_at': datetime.utcnow().isoformat()
             }
             
+            queue_name = job_data['queue_name']
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.srem(_status_key(queue_name, JobStatus.PROCESSING.value), job_id)
+            
             if retry and attempts < max_attempts:
                 # Retry with exponential backoff
                 delay_seconds = 60 * (2 ** (attempts - 1))  # 1min, 2min, 4min...
                 
                 update_data['status'] = JobStatus.PENDING.value
-                self.redis_client.hset(f"job:{job_id}", mapping=update_data)
+                pipe.hset(f"job:{job_id}", mapping=update_data)
                 
                 # Schedule retry
                 score = int((datetime.utcnow() + timedelta(seconds=delay_seconds)).timestamp())
-                self.redis_client.zadd(f"scheduled:{job_data['queue_name']}", {job_id: score})
+                pipe.zadd(f"scheduled:{queue_name}", {job_id: score})
+                pipe.execute()
                 
                 logger.info(f"Job {job_id} scheduled for retry in {delay_seconds} seconds")
             else:
                 # Mark as permanently failed
                 update_data['status'] = JobStatus.FAILED.value
                 update_data['failed_at'] = datetime.utcnow().isoformat()
-                self.redis_client.hset(f"job:{job_id}", mapping=update_data)
+                pipe.hset(f"job:{job_id}", mapping=update_data)
+                pipe.sadd(_status_key(queue_name, JobStatus.FAILED.value), job_id)
+                pipe.zadd(_finished_key(queue_name), {job_id: datetime.utcnow().timestamp()})
+                pipe.execute()
                 
                 logger.error(f"Job {job_id} permanently failed: {error_message}")
+                self._notify_batches(job_id, False, error_message=error_message)
         else:
             # Memory fallback
             job = self._memory_store.get(job_id)
@@ -213,6 +609,7 @@ class QueueManager:
                 if not retry or job['attempts'] >= job.get('max_attempts', 3):
                     job['status'] = JobStatus.FAILED.value
                     job['failed_at'] = datetime.utcnow().isoformat()
+                    self._notify_batches(job_id, False, error_message=error_message)
                 else:
                     job['status'] = JobStatus.PENDING.value
                     # For memory fallback, just re-add to queue
@@ -252,17 +649,15 @@ class QueueManager:
         }
         
         if self.redis_client:
-            stats['pending'] = self.redis_client.zcard(f"queue:{queue_name}")
-            stats['scheduled'] = self.redis_client.zcard(f"scheduled:{queue_name}")
-            
-            # Count jobs by status (this is expensive, consider caching)
-            job_keys = self.redis_client.keys("job:*")
-            for job_key in job_keys:
-                job_data = self.redis_client.hgetall(job_key)
-                if job_data.get('queue_name') == queue_name:
-                    status = job_data.get('status', 'unknown')
-                    if status in stats:
-                        stats[status] += 1
+            # O(1) cardinality reads from the status index, one round trip
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcard(f"queue:{queue_name}")
+            pipe.zcard(f"scheduled:{queue_name}")
+            pipe.scard(_status_key(queue_name, JobStatus.PROCESSING.value))
+            pipe.scard(_status_key(queue_name, JobStatus.COMPLETED.value))
+            pipe.scard(_status_key(queue_name, JobStatus.FAILED.value))
+            (stats['pending'], stats['scheduled'], stats['processing'],
+             stats['completed'], stats['failed']) = pipe.execute()
         else:
             # Memory fallback
             if queue_name in self._memory_queues:
@@ -279,28 +674,17 @@ class QueueManager:
     def _process_scheduled_jobs(self, queue_name: str):
         """
         Move scheduled jobs to active queue if their time has come
+        (batched, one round trip; dequeue_jobs also does this)
         """
         if not self.redis_client:
             return
         
-        current_time = int(datetime.utcnow().timestamp())
-        
-        # Get jobs that are ready to be processed
-        ready_jobs = self.redis_client.zrangebyscore(
-            f"scheduled:{queue_name}", 
-            0, 
-            current_time
+        now = datetime.utcnow()
+        self._claim_jobs(
+            keys=[f"queue:{queue_name}", f"scheduled:{queue_name}",
+                  _status_key(queue_name, JobStatus.PROCESSING.value)],
+            args=[int(now.timestamp()), "", now.isoformat(), 0, SCHEDULED_PROMOTION_BATCH]
         )
-        
-        for job_id in ready_jobs:
-            # Move to active queue
-            job_data = self.redis_client.hgetall(f"job:{job_id}")
-            if job_data:
-                priority = int(job_data.get('priority', JobPriority.NORMAL.value))
-                score = priority * 1000000 + current_time
-                
-                self.redis_client.zadd(f"queue:{queue_name}", {job_id: score})
-                self.redis_client.zrem(f"scheduled:{queue_name}", job_id)
     
     def cleanup_completed_jobs(self, older_than_hours: int = 24):
         """
@@ -309,23 +693,56 @@ class QueueManager:
         if not self.redis_client:
             return
         
-        cutoff_time = datetime.utcnow() - timedelta(hours=older_than_hours)
-        cutoff_iso = cutoff_time.isoformat()
-        
-        job_keys = self.redis_client.keys("job:*")
+        cutoff = (datetime.utcnow() - timedelta(hours=older_than_hours)).timestamp()
         cleaned_count = 0
         
-        for job_key in job_keys:
-            job_data = self.redis_client.hgetall(job_key)
+        for queue_name in self.redis_client.smembers(KNOWN_QUEUES_KEY):
+            # Only expired jobs are read, via the completion-time index
+            expired = self.redis_client.zrangebyscore(_finished_key(queue_name), '-inf', cutoff)
+            if not expired:
+                continue
             
-            if (job_data.get('status') in [JobStatus.COMPLETED.value, JobStatus.FAILED.value] and
-                job_data.get('completed_at', job_data.get('failed_at', '')) < cutoff_iso):
-                
-                self.redis_client.delete(job_key)
-                cleaned_count += 1
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(*[f"job:{job_id}" for job_id in expired])
+            pipe.srem(_status_key(queue_name, JobStatus.COMPLETED.value), *expired)
+            pipe.srem(_status_key(queue_name, JobStatus.FAILED.value), *expired)
+            pipe.zrem(_finished_key(queue_name), *expired)
+            pipe.execute()
+            cleaned_count += len(expired)
         
         logger.info(f"Cleaned up {cleaned_count} old jobs")
         return cleaned_count
+    
+    def rebuild_status_index(self) -> int:
+        """
+        One-off backfill of the status index for jobs created before it existed.
+        Walks job hashes with SCAN (non-blocking), not KEYS.
+        """
+        if not self.redis_client:
+            return 0
+        
+        indexed = 0
+        for job_key in self.redis_client.scan_iter(match="job:*", count=500):
+            job_data = self.redis_client.hgetall(job_key)
+            queue_name = job_data.get('queue_name')
+            status = job_data.get('status')
+            if not queue_name:
+                continue
+            
+            job_id = job_key.split(":", 1)[1]
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.sadd(KNOWN_QUEUES_KEY, queue_name)
+            if status in (JobStatus.PROCESSING.value, JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                pipe.sadd(_status_key(queue_name, status), job_id)
+            if status in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                finished_at = job_data.get('completed_at') or job_data.get('failed_at')
+                finished_ts = datetime.fromisoformat(finished_at).timestamp() if finished_at else 0
+                pipe.zadd(_finished_key(queue_name), {job_id: finished_ts})
+            pipe.execute()
+            indexed += 1
+        
+        logger.info(f"Rebuilt status index for {indexed} jobs")
+        return indexed
 
 # Global queue manager instance
 queue_manager = QueueManager()
\ No newline at end of file
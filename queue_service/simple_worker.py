@@ -2,12 +2,13 @@ import time
 import sys
 import json
 import os
-from rq import Worker, Queue
+from rq import Worker, Queue, get_current_job
 from redis import Redis
 from redis.exceptions import ConnectionError, TimeoutError
 from dotenv import load_dotenv
 import logging
 from document_processor import document_processor
+from job_dedup import JobDeduplicator, COMPLETED, FAILED
 
 # Add database imports
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "backend"))
@@ -18,6 +19,8 @@ except ImportError as e:
     print(f"Warning: Database imports failed: {e}")
     DATABASE_AVAILABLE = False
 
+from utils.tagged_cache import tagged_cache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +31,35 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+def copy_processing_result(db, source_document_id: str, document_id: str):
+    """
+    Give a duplicate upload the result of the document it shares a
+    processing job with (same content, see job_dedup)
+    """
+    from sqlalchemy import text
+    for record in db.query(ExtractedData).filter(ExtractedData.document_id == source_document_id).all():
+        db.add(ExtractedData(
+            document_id=document_id,
+            data_type=record.data_type,
+            extracted_content=record.extracted_content,
+            analysis_results=record.analysis_results,
+            property_indicators=record.property_indicators
+        ))
+    db.execute(
+        text("UPDATE documents SET status = 'completed' WHERE document_id = :doc_id"),
+        {"doc_id": document_id}
+    )
+
+def _job_dedup():
+    """Deduplicator on the current RQ job's connection (None outside a worker)"""
+    job = get_current_job()
+    return (job.id, JobDeduplicator(job.connection)) if job else (None, None)
+
+def _invalidate_caches():
+    """Dashboard aggregates depend on document and job status"""
+    job = get_current_job()
+    tagged_cache.invalidate(job.connection if job else None, ["documents", "processing"])
+
 def process_document(document_id: str, metadata: dict) -> dict:
     """
     Process a document from the queue using the document processor
@@ -92,6 +124,17 @@ def process_document(document_id: str, metadata: dict) -> dict:
                             db.add(db_record)
                     
                     db.commit()
+                    
+                    # Duplicate uploads attached to this job get the same result.
+                    # The job is marked done only after the commit above, so a
+                    # duplicate refused by attach() can copy the stored result
+                    job_id, dedup = _job_dedup()
+                    attached = dedup.finish(job_id, COMPLETED) if dedup else []
+                    if attached:
+                        for attached_id in attached:
+                            copy_processing_result(db, document_id, attached_id)
+                        db.commit()
+                    _invalidate_caches()
                     logger.info(f"Saved processed data to database for document {document_id}")
                     
                 except Exception as db_error:
@@ -122,10 +165,12 @@ def process_document(document_id: str, metadata: dict) -> dict:
                 try:
                     # Update document status to failed
                     from sqlalchemy import text
-                    db.execute(
-                        text("UPDATE documents SET status = 'failed' WHERE document_id = :doc_id"),
-                        {"doc_id": document_id}
-                    )
+                    job_id, dedup = _job_dedup()
+                    for failed_id in [document_id] + (dedup.finish(job_id, FAILED) if dedup else []):
+                        db.execute(
+                            text("UPDATE documents SET status = 'failed' WHERE document_id = :doc_id"),
+                            {"doc_id": failed_id}
+                        )
                     
                     # Update processing job status
                     job = db.query(ProcessingJob).filter(ProcessingJob.document_id == document_id).first()
@@ -134,6 +179,7 @@ def process_document(document_id: str, metadata: dict) -> dict:
                         job.error_message = str(e)
                         job.completed_at = time.time()
                     db.commit()
+                    _invalidate_caches()
                 except Exception as db_error:
                     db.rollback()
                     logger.error(f"Failed to update failed status: {db_error}")
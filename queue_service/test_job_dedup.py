@@ -0,0 +1,162 @@
+"""
+Tests for processing job deduplication (run with pytest; needs fakeredis)
+"""
+import fakeredis
+import pytest
+
+import queue_manager
+from job_dedup import (
+    COMPLETED, DEDUP_TTL_SECONDS, ENQUEUE_GRACE_SECONDS, FAILED, IN_FLIGHT,
+    JobDeduplicator, content_key
+)
+from queue_manager import QueueManager, JobStatus
+
+
+KEY = content_key("0" * 64)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def dedup(redis_client):
+    return JobDeduplicator(redis_client)
+
+
+class Jobs:
+    """Fake job store: enqueue records jobs, state reports them"""
+
+    def __init__(self):
+        self.states = {}
+        self.enqueued = []
+
+    def enqueue(self, job_id):
+        self.enqueued.append(job_id)
+        self.states[job_id] = IN_FLIGHT
+
+    def state(self, job_id):
+        return self.states.get(job_id)
+
+
+def test_duplicate_coalesces_to_in_flight_job(dedup):
+    jobs = Jobs()
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="a") == ("a", "enqueued")
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b", attach_id="b") == ("a", IN_FLIGHT)
+    assert jobs.enqueued == ["a"]
+    assert dedup.finish("a", COMPLETED) == ["b"]
+
+
+def test_completed_job_is_reused(dedup):
+    jobs = Jobs()
+    dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="a")
+    jobs.states["a"] = COMPLETED
+
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b") == ("a", COMPLETED)
+    assert jobs.enqueued == ["a"]
+    assert dedup.get_stats()["reused_completed"] == 1
+
+
+def test_failed_job_is_enqueued_again(dedup):
+    jobs = Jobs()
+    dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="a")
+    jobs.states["a"] = FAILED
+
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b") == ("b", "enqueued")
+    assert jobs.enqueued == ["a", "b"]
+
+
+def test_key_is_released_when_enqueue_raises(dedup, redis_client):
+    jobs = Jobs()
+
+    def broken_enqueue(job_id):
+        raise RuntimeError("queue down")
+
+    with pytest.raises(RuntimeError):
+        dedup.submit(KEY, broken_enqueue, jobs.state, job_id="a")
+    assert redis_client.get(KEY) is None
+
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b") == ("b", "enqueued")
+
+
+def test_unknown_job_counts_as_in_flight_only_while_being_enqueued(dedup, redis_client):
+    jobs = Jobs()
+    redis_client.set(KEY, "a", ex=DEDUP_TTL_SECONDS)
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b") == ("a", IN_FLIGHT)
+
+    redis_client.expire(KEY, DEDUP_TTL_SECONDS - ENQUEUE_GRACE_SECONDS - 1)
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b") == ("b", "enqueued")
+
+
+def test_attach_after_completion_reuses_result(dedup):
+    # The job still looks in flight (its worker has not returned yet) but
+    # has already taken its attached documents
+    jobs = Jobs()
+    dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="a")
+    assert dedup.finish("a", COMPLETED) == []
+
+    assert dedup.attach("a", "b") == COMPLETED
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b", attach_id="b") == ("a", COMPLETED)
+    assert dedup.finish("a", COMPLETED) == []
+
+
+def test_attach_after_failure_enqueues_again(dedup):
+    jobs = Jobs()
+    dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="a")
+    dedup.finish("a", FAILED)
+
+    assert dedup.submit(KEY, jobs.enqueue, jobs.state, job_id="b", attach_id="b") == ("b", "enqueued")
+    assert jobs.enqueued == ["a", "b"]
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(queue_manager.redis, "Redis",
+                        lambda **kwargs: fakeredis.FakeRedis(server=server, decode_responses=True))
+    return QueueManager()
+
+
+def _pending(manager, queue_name="document_processing"):
+    return manager.redis_client.zcard(f"queue:{queue_name}")
+
+
+def test_enqueue_unique_job_coalesces_in_flight(manager):
+    first = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+    second = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+
+    assert first[1] == "enqueued"
+    assert second == (first[0], IN_FLIGHT)
+    assert _pending(manager) == 1
+
+
+def test_enqueue_unique_job_reuses_completed(manager):
+    job_id, _ = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+    manager.complete_job(job_id, {"ok": True})
+
+    assert manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY) == (job_id, COMPLETED)
+
+
+def test_enqueue_unique_job_retries_failed(manager):
+    job_id, _ = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+    manager.redis_client.hset(f"job:{job_id}", "status", JobStatus.PROCESSING.value)
+    manager.fail_job(job_id, "boom", retry=False)
+
+    new_id, outcome = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+    assert outcome == "enqueued"
+    assert new_id != job_id
+
+
+def test_enqueue_unique_job_releases_key_when_enqueue_raises(manager, monkeypatch):
+    def broken_enqueue_job(*args, **kwargs):
+        raise RuntimeError("queue down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(manager, "enqueue_job", broken_enqueue_job)
+        with pytest.raises(RuntimeError):
+            manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+
+    job_id, outcome = manager.enqueue_unique_job("document_processing", "process", {"n": 1}, KEY)
+    assert outcome == "enqueued"
+    assert manager.redis_client.get(KEY) == job_id
@@ -0,0 +1,77 @@
+"""
+Tests for EnhancedDocumentWorker scheduling (run with pytest)
+"""
+import asyncio
+import os
+import signal
+
+import pytest
+
+import worker as worker_module
+from worker import EnhancedDocumentWorker
+
+
+class FakeQueue:
+    """Hands out one job, then reports the queue empty"""
+
+    def __init__(self):
+        self.dequeue_calls = 0
+
+    def dequeue_jobs(self, queue_name, worker_id, count):
+        self.dequeue_calls += 1
+        if self.dequeue_calls == 1:
+            return [{'job_id': 'a', 'job_type': 'document_processing', 'job_data': {}}]
+        return []
+
+    def wait_for_jobs(self, queue_names, timeout):
+        pass
+
+
+class FakePool:
+    def __init__(self, max_workers):
+        pass
+
+    def shutdown(self, wait=True):
+        pass
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fake = FakeQueue()
+    monkeypatch.setattr(worker_module, "queue_manager", fake)
+    monkeypatch.setattr(worker_module, "ProcessPoolExecutor", FakePool)
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+    yield fake
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
+
+
+def test_sigterm_drains_without_claiming_more_jobs(queue):
+    worker = EnhancedDocumentWorker(worker_id="w", concurrency=1, process_pool_size=1)
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+        finished = []
+
+        async def process_job(job):
+            started.set()
+            await release.wait()
+            finished.append(job['job_id'])
+
+        worker._process_job = process_job
+        task = asyncio.create_task(worker.start(['q']))
+
+        # Every slot is busy, so the loop is waiting for one to free up
+        await started.wait()
+        await asyncio.sleep(0)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0)
+        assert not worker.running
+
+        release.set()
+        await asyncio.wait_for(task, timeout=5)
+        return finished
+
+    assert asyncio.run(run()) == ['a']
+    assert queue.dequeue_calls == 1
+    assert worker.in_flight == 0
@@ -5,16 +5,19 @@ Integrates with Redis queue system and AI processing
 
 import asyncio
 import logging
+import os
 import time
 import signal
 import sys
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
 from pathlib import Path
 
 # Add backend path to import modules
 sys.path.append(str(Path(__file__).parent.parent / "backend"))
 
 from queue_manager import queue_manager, JobStatus
+from job_dedup import document_key
 from document_processor import DocumentProcessor
 
 # Set up logging
@@ -24,14 +27,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Concurrency defaults (overridable per worker / via CLI)
+DEFAULT_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(os.cpu_count() or 4)))
+DEFAULT_PROCESS_POOL_SIZE = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 2)))
+
+# How long an idle worker blocks waiting for new jobs before re-checking
+IDLE_WAIT_SECONDS = int(os.getenv("WORKER_IDLE_WAIT_SECONDS", "5"))
+
+_pool_processor = None
+
+def parse_document(file_path: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    CPU-bound PDF/Excel/CSV parsing, executed inside the process pool.
+    One DocumentProcessor is created per pool process.
+    """
+    global _pool_processor
+    if _pool_processor is None:
+        _pool_processor = DocumentProcessor()
+    return _pool_processor.process(file_path, metadata)
+
 class EnhancedDocumentWorker:
     """
     Enhanced worker that processes documents using queue system
     """
     
-    def __init__(self, worker_id: str = None):
+    def __init__(self, worker_id: str = None, concurrency: int = None,
+                 process_pool_size: int = None):
         self.worker_id = worker_id or f"worker_{int(time.time())}"
-        self.processor = DocumentProcessor()
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.process_pool_size = process_pool_size or DEFAULT_PROCESS_POOL_SIZE
+        self.cpu_pool: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
         self.running = False
         self.stats = {
             'jobs_processed': 0,
@@ -51,34 +77,73 @@ class EnhancedDocumentWorker:
     
     async def start(self, queue_names: list = None):
         """
-        Start the worker to process jobs from specified queues
+        Start the worker to process jobs from specified queues.
+        
+        Up to `concurrency` jobs run at once; idle workers block on the queue's
+        wake-up list instead of polling. On SIGINT/SIGTERM no new jobs are
+        claimed and in-flight jobs are drained before returning.
         """
         if queue_names is None:
             queue_names = ['document_processing_queue', 'ai_analysis', 'notifications']
         
         self.running = True
         self.stats['start_time'] = time.time()
+        self.cpu_pool = ProcessPoolExecutor(max_workers=self.process_pool_size)
+        slots = asyncio.Semaphore(self.concurrency)
+        active = set()
         
-        logger.info(f"Worker {self.worker_id} starting to process queues: {queue_names}")
+        logger.info(
+            f"Worker {self.worker_id} starting to process queues: {queue_names} "
+            f"(concurrency={self.concurrency}, processes={self.process_pool_size})"
+        )
         
-        while self.running:
-            job_processed = False
-            
-            # Check each queue for jobs
-            for queue_name in queue_names:
-                job = queue_manager.dequeue_job(queue_name, self.worker_id)
-                
-                if job:
-                    job_processed = True
-                    await self._process_job(job)
+        try:
+            while self.running:
+                # Wait for a free slot before claiming more work
+                await slots.acquire()
+                slots.release()
+                if not self.running:
+                    # Shut down while waiting: only drain jobs already in flight
                     break
-            
-            if not job_processed:
-                # No jobs available, sleep briefly
-                await asyncio.sleep(1)
+                
+                jobs = self._claim_jobs(queue_names, self.concurrency - self.in_flight)
+                
+                if not jobs:
+                    # Nothing queued: block until an enqueue wakes us (or timeout)
+                    await asyncio.to_thread(queue_manager.wait_for_jobs, queue_names, IDLE_WAIT_SECONDS)
+                    continue
+                
+                for job in jobs:
+                    await slots.acquire()
+                    self.in_flight += 1
+                    task = asyncio.create_task(self._run_job(job, slots))
+                    active.add(task)
+                    task.add_done_callback(active.discard)
+        finally:
+            if active:
+                logger.info(f"Worker {self.worker_id} draining {len(active)} in-flight jobs...")
+                await asyncio.gather(*active, return_exceptions=True)
+            self.cpu_pool.shutdown(wait=True)
         
         logger.info(f"Worker {self.worker_id} stopped. Stats: {self.stats}")
     
+    def _claim_jobs(self, queue_names: list, free_slots: int) -> list:
+        """Claim up to free_slots jobs, taking from queues in the given order"""
+        jobs = []
+        for queue_name in queue_names:
+            if len(jobs) >= free_slots:
+                break
+            jobs.extend(queue_manager.dequeue_jobs(queue_name, self.worker_id, free_slots - len(jobs)))
+        return jobs
+    
+    async def _run_job(self, job: Dict[str, Any], slots: asyncio.Semaphore):
+        """Run one claimed job and release its concurrency slot"""
+        try:
+            await self._process_job(job)
+        finally:
+            self.in_flight -= 1
+            slots.release()
+    
     async def _process_job(self, job: Dict[str, Any]):
         """
         Process a single job
@@ -129,16 +194,29 @@ class EnhancedDocumentWorker:
         if not document_id or not file_path:
             raise ValueError("Missing required fields: document_id and file_path")
         
-        # Simulate document processing for now
-        await asyncio.sleep(2)  # Simulate processing time
+        extraction = None
+        if Path(file_path).exists():
+            # CPU-bound parsing runs in the process pool, off the event loop
+            started = time.time()
+            loop = asyncio.get_running_loop()
+            extraction = await loop.run_in_executor(
+                self.cpu_pool, parse_document, file_path, processing_options
+            )
+            processing_time = round(time.time() - started, 3)
+        else:
+            # Simulate document processing when the file is not available locally
+            await asyncio.sleep(2)
+            processing_time = 2.0
         
         result = {
             'status': 'processed',
             'document_id': document_id,
             'file_path': file_path,
-            'processing_time': 2.0,
+            'processing_time': processing_time,
             'timestamp': time.time()
         }
+        if extraction is not None:
+            result['extraction'] = extraction
         
         # If AI processing is enabled, queue AI analysis
         if processing_options.get('enable_ai', True):
@@ -217,7 +295,11 @@ class EnhancedDocumentWorker:
         
         elif notification_type == 'batch_processing_complete':
             processed_count = job_data.get('processed_count', 0)
-            logger.info(f"Batch processing completed: {processed_count} documents processed")
+            failed_count = job_data.get('failed_count', 0)
+            logger.info(
+                f"Batch processing completed{' for batch ' + job_data['batch_id'] if job_data.get('batch_id') else ''}: "
+                f"{processed_count} documents processed, {failed_count} failed"
+            )
         
         return {
             'status': 'sent',
@@ -227,7 +309,8 @@ class EnhancedDocumentWorker:
     
     async def _process_batch_job(self, job_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Process a batch processing job
+        Process a legacy batch processing job (batches are now fanned out by
+        queue_manager.enqueue_batch; this drains jobs queued before that)
         """
         document_ids = job_data.get('document_ids', [])
         options = job_data.get('options', {})
@@ -240,21 +323,22 @@ class EnhancedDocumentWorker:
         
         for document_id in document_ids:
             try:
-                # Queue individual document processing job
-                job_id = queue_manager.enqueue_job(
+                # Queue individual document processing job, once per document
+                job_id, outcome = queue_manager.enqueue_unique_job(
                     queue_name='document_processing',
                     job_type='document_processing',
                     job_data={
                         'document_id': document_id,
                         'file_path': f"storage/{document_id}_*",  # Placeholder
                         'options': options
-                    }
+                    },
+                    dedup_key=document_key(document_id)
                 )
                 
                 results.append({
                     'document_id': document_id,
                     'job_id': job_id,
-                    'status': 'queued'
+                    'status': 'queued' if outcome == 'enqueued' else outcome
                 })
                 processed_count += 1
                 
@@ -292,12 +376,20 @@ async def main():
     parser.add_argument('--worker-id', help='Worker ID', default=None)
     parser.add_argument('--queues', help='Comma-separated list of queues to process', 
                        default='document_processing,ai_analysis,notifications')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                       help='Maximum number of jobs processed at once')
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESS_POOL_SIZE,
+                       help='Process pool size for CPU-bound document parsing')
     
     args = parser.parse_args()
     
     queue_names = [q.strip() for q in args.queues.split(',')]
     
-    worker = EnhancedDocumentWorker(worker_id=args.worker_id)
+    worker = EnhancedDocumentWorker(
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        process_pool_size=args.processes
+    )
     
     try:
         await worker.start(queue_names)
@@ -7,7 +7,8 @@ import time
 import logging
 import redis
 from rq import Queue
-from rq.job import Retry
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, Retry
 from datetime import datetime
 from pathlib import Path
 
@@ -55,6 +56,10 @@ except Exception as e:
     minio_client = None
     bucket_name = None
 
+# Processing job deduplication (shared with the queue workers)
+sys.path.append(str(Path(__file__).parent / "queue_service"))
+from job_dedup import JobDeduplicator, content_key, IN_FLIGHT, COMPLETED, FAILED
+
 # RQ Queue integration
 try:
     redis_client = redis.Redis(host='localhost', port=6379, db=0)
@@ -84,6 +89,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sampled request performance recording (performance_logs)
+if DATABASE_AVAILABLE:
+    from database import engine
+    from utils.performance_recorder import install_performance_recorder
+    install_performance_recorder(app, engine)
+
+# Handlers doing blocking database/storage work are plain `def` so they run
+# in the (sized) threadpool; the monitor reports anything still blocking
+from utils.loop_monitor import install_loop_monitor
+loop_monitor = install_loop_monitor(app)
+
+# Dashboard/analytics aggregates cached by the main API; uploads here invalidate them
+from utils.tagged_cache import tagged_cache
+
 # Mock data for testing
 mock_documents = []
 mock_properties = []
@@ -144,16 +163,56 @@ def get_minio_path(document_type: str, filename: str) -> str:
     base_path = BUCKET_PATHS.get(document_type, BUCKET_PATHS["other"])
     return base_path.format(year=year) + filename
 
+def _rq_job_state(job_id: str) -> Optional[str]:
+    """
+    Classify an existing RQ processing job for deduplication. Jobs are
+    enqueued under their document_id, so once RQ has expired the job the
+    document's stored status is used instead.
+    """
+    try:
+        job = Job.fetch(job_id, connection=redis_client)
+    except NoSuchJobError:
+        job = None
+    
+    if job is not None:
+        status = job.get_status()
+        if status in ("queued", "started", "deferred", "scheduled"):
+            return IN_FLIGHT
+        # process_document reports errors in its result rather than raising
+        if status == "finished" and (job.result or {}).get("status") != "error":
+            return COMPLETED
+        return FAILED
+    
+    if DATABASE_AVAILABLE:
+        db = SessionLocal()
+        try:
+            status = db.execute(
+                text("SELECT status FROM documents WHERE document_id = :doc_id"),
+                {"doc_id": job_id}
+            ).scalar()
+        finally:
+            db.close()
+        if status == "completed":
+            return COMPLETED
+        if status == "failed":
+            return FAILED
+    return None
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/monitoring/event-loop")
+async def get_event_loop_stats():
+    """Event loop lag and the calls caught blocking it"""
+    return loop_monitor.get_stats()
+
 @app.get("/test-status/{document_id}")
 async def test_status(document_id: str):
     return {"document_id": document_id, "message": "test endpoint working"}
 
 @app.get("/api/documents/{document_id}/status")
-async def get_document_status(document_id: str):
+def get_document_status(document_id: str):
     """
     Get real-time document processing status
     
@@ -231,7 +290,7 @@ async def root():
     return {"message": "REIMS Backend API is running"}
 
 @app.get("/api/documents")
-async def get_documents(db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
+def get_documents(db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
     """Get all documents from database or mock data"""
     if DATABASE_AVAILABLE and db:
         try:
@@ -267,7 +326,7 @@ async def get_documents(db: Session = Depends(get_db) if DATABASE_AVAILABLE else
     return {"documents": mock_documents, "total": len(mock_documents), "source": "mock_data"}
 
 @app.get("/api/properties")
-async def get_properties():
+def get_properties():
     if DATABASE_AVAILABLE:
         try:
             import sqlite3
@@ -335,7 +394,7 @@ async def get_properties():
     return mock_properties
 
 @app.get("/api/properties/{property_id}")
-async def get_property_by_id(property_id: int):
+def get_property_by_id(property_id: int):
     """Get a single property by ID"""
     if DATABASE_AVAILABLE:
         try:
@@ -413,7 +472,7 @@ async def get_maintenance():
     return []
 
 @app.get("/api/analytics")
-async def get_analytics(db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
+def get_analytics(db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
     """Get analytics from database or mock data"""
     if DATABASE_AVAILABLE and db:
         try:
@@ -450,48 +509,65 @@ async def get_analytics(db: Session = Depends(get_db) if DATABASE_AVAILABLE else
         "source": "mock_data"
     }
 
+def _compute_financial_kpis(conn) -> Dict[str, Any]:
+    """Financial KPIs in one grouped pass over properties (by property type)"""
+    groups = conn.execute(text("""
+        SELECT property_type,
+               COUNT(*) AS properties,
+               SUM(current_market_value) AS market_value,
+               SUM(monthly_rent) AS monthly_rent,
+               COUNT(monthly_rent) AS rented,
+               SUM(CASE WHEN status = 'occupied' THEN 1 ELSE 0 END) AS occupied,
+               SUM(CASE WHEN status = 'available' THEN 1 ELSE 0 END) AS available
+        FROM properties
+        GROUP BY property_type
+    """)).fetchall()
+    
+    total_properties = sum(group.properties for group in groups)
+    occupied_properties = sum(group.occupied or 0 for group in groups)
+    monthly_rental_income = sum(group.monthly_rent or 0 for group in groups)
+    rented_properties = sum(group.rented for group in groups)
+    return {
+        "total_portfolio_value": sum(group.market_value or 0 for group in groups),
+        "total_properties": total_properties,
+        "occupied_properties": occupied_properties,
+        "available_properties": sum(group.available or 0 for group in groups),
+        "monthly_rental_income": monthly_rental_income,
+        "average_monthly_rent": monthly_rental_income / rented_properties if rented_properties else 0,
+        "occupancy_rate": (occupied_properties / total_properties * 100) if total_properties > 0 else 0,
+        "property_type_distribution": {group.property_type: group.properties for group in groups}
+    }
+
+# Financial KPIs are materialized in kpi_snapshot and refreshed when
+# properties or their financial history change (see utils.kpi_snapshot)
+kpi_store = None
+if DATABASE_AVAILABLE:
+    from utils.kpi_snapshot import KpiSnapshotStore, install_kpi_snapshots, sparkline
+    kpi_store = KpiSnapshotStore(engine)
+    kpi_store.register("financial", _compute_financial_kpis, ["properties", "financial_history"])
+    install_kpi_snapshots(app, kpi_store, get_redis=lambda: redis_client)
+
 @app.get("/api/kpis/financial")
-async def get_financial_kpis():
+def get_financial_kpis():
     """Get Core Financial KPIs - Phase 1 Implementation"""
     try:
-        # Connect directly to SQLite to get proper financial data
-        import sqlite3
-        conn = sqlite3.connect('reims.db')
-        cursor = conn.cursor()
-        
-        # Total Portfolio Value
-        cursor.execute('SELECT SUM(current_market_value) FROM properties WHERE current_market_value IS NOT NULL;')
-        total_portfolio_value = cursor.fetchone()[0] or 0
-        
-        # Total Properties Count
-        cursor.execute('SELECT COUNT(*) FROM properties;')
-        total_properties = cursor.fetchone()[0] or 0
-        
-        # Monthly Rental Income
-        cursor.execute('SELECT SUM(monthly_rent) FROM properties WHERE monthly_rent IS NOT NULL;')
-        monthly_rental_income = cursor.fetchone()[0] or 0
-        
-        # Occupancy Rate (based on status)
-        cursor.execute('SELECT COUNT(*) FROM properties WHERE status = "occupied";')
-        occupied_properties = cursor.fetchone()[0] or 0
-        occupancy_rate = (occupied_properties / total_properties * 100) if total_properties > 0 else 0
-        
-        # Additional metrics for context
-        cursor.execute('SELECT COUNT(*) FROM properties WHERE status = "available";')
-        available_properties = cursor.fetchone()[0] or 0
-        
-        cursor.execute('SELECT AVG(monthly_rent) FROM properties WHERE monthly_rent IS NOT NULL;')
-        avg_monthly_rent = cursor.fetchone()[0] or 0
-        
-        cursor.execute('SELECT property_type, COUNT(*) FROM properties GROUP BY property_type;')
-        property_types = cursor.fetchall()
-        
-        conn.close()
+        if kpi_store is None:
+            raise RuntimeError("database not available")
+        snapshots = kpi_store.get("financial")
+        kpis = snapshots[0]["metrics"]
+        
+        total_portfolio_value = kpis["total_portfolio_value"]
+        total_properties = kpis["total_properties"]
+        occupied_properties = kpis["occupied_properties"]
+        monthly_rental_income = kpis["monthly_rental_income"]
+        occupancy_rate = kpis["occupancy_rate"]
+        avg_monthly_rent = kpis["average_monthly_rent"]
         
         return {
             "status": "success",
             "source": "database",
             "timestamp": datetime.now().isoformat(),
+            "snapshot_at": snapshots[0]["computed_at"].isoformat(),
             "core_kpis": {
                 "total_portfolio_value": {
                     "value": total_portfolio_value,
@@ -501,7 +577,7 @@ async def get_financial_kpis():
                 "total_properties": {
                     "value": total_properties,
                     "occupied": occupied_properties,
-                    "available": available_properties
+                    "available": kpis["available_properties"]
                 },
                 "monthly_rental_income": {
                     "value": monthly_rental_income,
@@ -520,9 +596,12 @@ async def get_financial_kpis():
                     "value": avg_monthly_rent,
                     "formatted": f"${avg_monthly_rent:,.0f}"
                 },
-                "property_type_distribution": {
-                    prop_type: count for prop_type, count in property_types
-                }
+                "property_type_distribution": kpis["property_type_distribution"]
+            },
+            "sparklines": {
+                "total_portfolio_value": sparkline(snapshots, "total_portfolio_value"),
+                "monthly_rental_income": sparkline(snapshots, "monthly_rental_income"),
+                "occupancy_rate": sparkline(snapshots, "occupancy_rate")
             }
         }
         
@@ -571,7 +650,7 @@ async def get_financial_kpis():
         }
 
 @app.get("/api/documents/property/{property_id}")
-async def get_documents_by_property(property_id: str, db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
+def get_documents_by_property(property_id: str, db: Session = Depends(get_db) if DATABASE_AVAILABLE else None):
     """Get all documents for a specific property"""
     if DATABASE_AVAILABLE and db:
         try:
@@ -613,7 +692,7 @@ async def get_documents_by_property(property_id: str, db: Session = Depends(get_
     }
 
 @app.post("/api/documents/upload")
-async def upload_document(
+def upload_document(
     file: UploadFile = File(...), 
     property_id: Optional[str] = Form(None),
     document_type: str = Form("financial_statement"),
@@ -670,24 +749,16 @@ async def upload_document(
             property_id = f"PROP-{uuid.uuid4().hex[:12].upper()}"
             logger.info(f"Auto-generated property_id: {property_id}")
         
-        # 3. READ FILE CONTENT
-        file_content = await file.read()
-        file_size = len(file_content)
+        # 3. VALIDATE FILE SIZE (50MB max)
+        from utils.upload_stream import UploadTooLargeError, copy_upload
         
-        # Validate file size (50MB max)
         MAX_FILE_SIZE = 50 * 1024 * 1024
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
-            )
+        size_error = f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+        if (getattr(file, "size", None) or 0) > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail=size_error)
         
-        logger.info(
-            f"Upload started - property_id: {property_id}, "
-            f"filename: {file.filename}, size: {file_size} bytes"
-        )
-        
-        # 4. STORE LOCALLY
+        # 4. STREAM TO LOCAL STORAGE
+        # Read the spooled upload in blocks, hashing and enforcing the size limit as we go
         storage_dir = Path("storage")
         storage_dir.mkdir(exist_ok=True)
         
@@ -695,9 +766,24 @@ async def upload_document(
         stored_filename = file.filename
         file_path = storage_dir / stored_filename
         
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        # Write to a temporary file and only replace file_path once the whole
+        # upload is within the limit (never clobber an existing file on failure)
+        partial_path = storage_dir / f".{document_id}.part"
+        try:
+            with open(partial_path, "wb") as buffer:
+                file_size, file_hash = copy_upload(file.file, buffer, MAX_FILE_SIZE)
+            partial_path.replace(file_path)
+        except UploadTooLargeError:
+            partial_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail=size_error)
+        except Exception:
+            partial_path.unlink(missing_ok=True)
+            raise
         
+        logger.info(
+            f"Upload started - property_id: {property_id}, "
+            f"filename: {file.filename}, size: {file_size} bytes"
+        )
         logger.info(f"File stored locally: {file_path}")
         
         # 5. SAVE METADATA
@@ -706,6 +792,7 @@ async def upload_document(
             "original_filename": file.filename,
             "property_id": property_id,
             "file_size": file_size,
+            "file_hash": file_hash,
             "content_type": file.content_type or "application/octet-stream",
             "document_type": document_type,
             "upload_timestamp": datetime.now().isoformat(),
@@ -804,15 +891,16 @@ async def upload_document(
                 if db:
                     db.rollback()
         
-        # 8. QUEUE FOR PROCESSING WITH RQ
+        # 8. QUEUE FOR PROCESSING WITH RQ (once per file content and processor version)
         queue_status = "no_queue"
         job_id = None
+        dedup_outcome = None
         if REDIS_AVAILABLE and rq_queue:
             try:
                 # Import the worker's process function
                 import sys
                 sys.path.append('queue_service')
-                from simple_worker import process_document
+                from simple_worker import process_document, copy_processing_result
                 
                 # Prepare metadata in expected format
                 # Convert Windows path to Unix path for container
@@ -827,50 +915,81 @@ async def upload_document(
                     'minio_object_name': object_name if MINIO_AVAILABLE else None
                 }
                 
-                # Enqueue job using RQ with timeout and retry
-                job = rq_queue.enqueue(
-                    process_document,
-                    document_id,
-                    job_metadata,
-                    job_timeout='10m',  # ✅ 10-minute timeout
-                    result_ttl=86400,    # Keep results for 24 hours
-                    failure_ttl=604800,  # Keep failed jobs for 7 days
-                    retry=Retry(max=3, interval=[60, 300, 900])  # ✅ Retry 3 times with backoff
-                )
-                
-                job_id = job.id
+                def enqueue(new_job_id):
+                    # Enqueue job using RQ with timeout and retry
+                    rq_queue.enqueue(
+                        process_document,
+                        document_id,
+                        job_metadata,
+                        job_id=new_job_id,
+                        job_timeout='10m',  # ✅ 10-minute timeout
+                        result_ttl=86400,    # Keep results for 24 hours
+                        failure_ttl=604800,  # Keep failed jobs for 7 days
+                        retry=Retry(max=3, interval=[60, 300, 900])  # ✅ Retry 3 times with backoff
+                    )
                 
-                # Update document status to queued
-                if DATABASE_AVAILABLE and db:
-                    try:
-                        db_document.status = "queued"
-                        
-                        # Create processing job record
-                        from backend.database import ProcessingJob
-                        db_job = ProcessingJob(
-                            job_id=job_id,
-                            document_id=document_id,
-                            status="queued"
-                        )
-                        db.add(db_job)
-                        db.commit()
-                    except Exception as e:
-                        logger.warning(f"Failed to update document status: {e}")
+                # An identical file already queued or processed is not parsed again
+                dedup = JobDeduplicator(redis_client)
+                job_id, dedup_outcome = dedup.submit(
+                    content_key(file_hash), enqueue, _rq_job_state,
+                    job_id=document_id, attach_id=document_id
+                )
                 
-                queue_status = "queued"
-                logger.info(f"Document queued for processing with RQ job ID: {job_id}")
+                if dedup_outcome == IN_FLIGHT:
+                    # Attached: the worker copies the result to this document when the job finishes
+                    if DATABASE_AVAILABLE and db:
+                        try:
+                            db_document.status = "queued"
+                            db.commit()
+                        except Exception as e:
+                            logger.warning(f"Failed to update document status: {e}")
+                    queue_status = "queued"
+                    logger.info(f"Document {document_id} attached to in-flight job {job_id} (same content)")
+                elif dedup_outcome == COMPLETED:
+                    queue_status = "reused_result"
+                    if DATABASE_AVAILABLE and db:
+                        try:
+                            copy_processing_result(db, job_id, document_id)
+                            db.commit()
+                        except Exception as e:
+                            db.rollback()
+                            logger.warning(f"Failed to reuse processing result: {e}")
+                    logger.info(f"Document {document_id} reused the result of job {job_id} (same content)")
+                else:
+                    # Update document status to queued
+                    if DATABASE_AVAILABLE and db:
+                        try:
+                            db_document.status = "queued"
+                            
+                            # Create processing job record
+                            from backend.database import ProcessingJob
+                            db_job = ProcessingJob(
+                                job_id=job_id,
+                                document_id=document_id,
+                                status="queued"
+                            )
+                            db.add(db_job)
+                            db.commit()
+                        except Exception as e:
+                            logger.warning(f"Failed to update document status: {e}")
+                    
+                    queue_status = "queued"
+                    logger.info(f"Document queued for processing with RQ job ID: {job_id}")
                 
             except Exception as e:
                 logger.error(f"Failed to queue document: {e}", exc_info=True)
                 queue_status = f"queue_error: {str(e)}"
         
+        if db_status == "stored_in_database":
+            tagged_cache.invalidate(redis_client, ["documents", "processing"])
+        
         mock_document = {
             "document_id": document_id,
             "original_filename": file.filename,
             "property_id": property_id,
             "file_size": file_size,
             "upload_timestamp": datetime.now().isoformat(),
-            "status": "queued" if queue_status == "queued" else "uploaded",
+            "status": {"queued": "queued", "reused_result": "completed"}.get(queue_status, "uploaded"),
             "storage_path": str(file_path),
             "minio_status": minio_status,
             "minio_url": minio_url if MINIO_AVAILABLE else None,
@@ -886,13 +1005,14 @@ async def upload_document(
                 "document_id": document_id,
                 "filename": file.filename,
                 "file_size": file_size,
-                "status": "queued" if queue_status == "queued" else "uploaded",
+                "status": {"queued": "queued", "reused_result": "completed"}.get(queue_status, "uploaded"),
                 "property_id": property_id,  # Include generated/validated property_id
                 "storage_location": str(file_path),
                 "minio_location": minio_url if MINIO_AVAILABLE else None,
                 "database_status": db_status,
                 "queue_status": queue_status,
                 "job_id": job_id,
+                "dedup_outcome": dedup_outcome,
                 "message": (
                     f"File uploaded successfully and stored in storage/"
                     f"{' and MinIO bucket ' + bucket_name if MINIO_AVAILABLE and minio_status == 'uploaded_to_minio' else ''}"
@@ -904,7 +1024,7 @@ async def upload_document(
                     "step_3": "OK Metadata saved as JSON",
                     "step_4": f"OK MinIO integration: {minio_status}" if minio_status == 'uploaded_to_minio' else f"FAIL MinIO integration: {minio_status}",
                     "step_5": f"OK Database storage: {db_status}" if db_status == 'stored_in_database' else f"FAIL Database storage: {db_status}",
-                    "step_6": f"OK Queued for processing: {queue_status}" if queue_status == 'queued' else f"FAIL Queue: {queue_status}",
+                    "step_6": f"OK Queued for processing: {queue_status}" if queue_status in ('queued', 'reused_result') else f"FAIL Queue: {queue_status}",
                     "step_7": "OK Ready for worker processing"
                 }
             }
@@ -1016,7 +1136,7 @@ def determine_year_completeness(property_id: int, year: int, db: Session) -> dic
 
 # Year-based financial endpoints
 @app.get("/api/properties/{property_id}/financials")
-async def get_property_financials(
+def get_property_financials(
     property_id: int,
     year: Optional[int] = None,
     db: Session = Depends(get_db)
@@ -1091,7 +1211,7 @@ async def get_property_financials(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/properties/{property_id}/financials/compare")
-async def compare_financials(
+def compare_financials(
     property_id: int,
     years: str,  # Comma-separated: "2023,2024,2025"
     db: Session = Depends(get_db)
@@ -1184,7 +1304,7 @@ async def compare_financials(
 
 # Property Name Validation Endpoints
 @app.get("/api/validation/statistics")
-async def get_validation_statistics():
+def get_validation_statistics():
     """Get property name validation statistics"""
     try:
         from utils.validation_integration import get_validation_statistics
@@ -1199,7 +1319,7 @@ async def get_validation_statistics():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/validation/queue")
-async def get_validation_queue():
+def get_validation_queue():
     """Get documents that need manual review"""
     try:
         from utils.validation_integration import get_validation_queue
@@ -1215,7 +1335,7 @@ async def get_validation_queue():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/validation/approve/{document_id}")
-async def approve_validation(
+def approve_validation(
     document_id: str,
     property_id: int,
     reviewer: str = "admin"
@@ -1241,7 +1361,7 @@ async def approve_validation(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/validation/correct/{document_id}")
-async def correct_validation(
+def correct_validation(
     document_id: str,
     property_id: int,
     corrected_name: str,
@@ -1269,7 +1389,7 @@ async def correct_validation(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/validation/add-alias/{document_id}")
-async def add_alias_for_validation(
+def add_alias_for_validation(
     document_id: str,
     property_id: int,
     alias_name: str,
@@ -1298,7 +1418,7 @@ async def add_alias_for_validation(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/validation/aliases/{property_id}")
-async def get_property_aliases(property_id: int):
+def get_property_aliases(property_id: int):
     """Get all aliases for a property"""
     try:
         from utils.alias_resolver import get_property_aliases
@@ -1316,7 +1436,7 @@ async def get_property_aliases(property_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/validation/aliases/{property_id}")
-async def add_property_alias(
+def add_property_alias(
     property_id: int,
     alias_name: str,
     alias_type: str = "common_name"
@@ -82,6 +82,10 @@ def main():
                     print(f"  ❌ Error: {e}")
         
         conn.commit()
+        
+        # Running APIs refresh KPI snapshots built from financial history
+        from backend.utils.tagged_cache import publish_invalidation
+        publish_invalidation(["financial_history", "properties"])
         print(f"\n✅ Successfully populated historical data!")
         
         # Show summary
@@ -8,10 +8,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from typing import Optional, Dict, Any, List
 import uvicorn
+import asyncio
 import json
 import logging
+import os
 
-from operations import enhanced_storage_ops
+from operations import enhanced_storage_ops, UploadTooLargeError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +34,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Interval for the background catalog reconcile job (0 disables it)
+CATALOG_RECONCILE_INTERVAL = int(os.getenv("CATALOG_RECONCILE_INTERVAL", "3600"))
+
+async def _reconcile_catalog_periodically():
+    """Repair drift between the document catalog and the buckets on a fixed interval"""
+    while True:
+        await asyncio.sleep(CATALOG_RECONCILE_INTERVAL)
+        try:
+            await asyncio.to_thread(enhanced_storage_ops.reconcile_catalog)
+        except Exception as e:
+            logger.error(f"Scheduled catalog reconcile failed: {e}")
+
+@app.on_event("startup")
+async def start_catalog_reconcile():
+    if CATALOG_RECONCILE_INTERVAL > 0:
+        app.state.reconcile_task = asyncio.create_task(_reconcile_catalog_periodically())
+
+@app.on_event("shutdown")
+async def stop_catalog_reconcile():
+    task = getattr(app.state, "reconcile_task", None)
+    if task:
+        task.cancel()
+
 @app.post("/documents/upload")
 async def upload_document(
     file: UploadFile,
@@ -65,6 +90,8 @@ async def upload_document(
         
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid metadata JSON")
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -156,12 +183,18 @@ async def delete_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/storage/statistics")
-async def get_storage_statistics():
+async def get_storage_statistics(
+    full_recount: bool = Query(False)
+):
     """
-    Get comprehensive storage statistics and analytics
+    Get comprehensive storage statistics and analytics.
+    Served from running counters; full_recount rescans the buckets first (audit mode).
     """
     try:
-        stats = enhanced_storage_ops.get_storage_statistics()
+        if full_recount:
+            stats = await asyncio.to_thread(enhanced_storage_ops.get_storage_statistics, True)
+        else:
+            stats = enhanced_storage_ops.get_storage_statistics()
         
         return {
             "status": "success",
@@ -201,6 +234,42 @@ async def create_backup(document_id: str):
         logger.error(f"Backup creation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/storage/index/rebuild")
+async def rebuild_storage_index():
+    """
+    Rebuild the content-hash/version index from a single scan of the primary bucket
+    """
+    try:
+        indexed = await asyncio.to_thread(enhanced_storage_ops.rebuild_index)
+        
+        return {
+            "status": "success",
+            "data": {
+                "indexed_objects": indexed
+            }
+        }
+        
+    except Exception as e:
+        logger.error(f"Index rebuild error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/storage/catalog/reconcile")
+async def reconcile_document_catalog():
+    """
+    Reconcile the document catalog with the primary and backup buckets
+    """
+    try:
+        summary = await asyncio.to_thread(enhanced_storage_ops.reconcile_catalog)
+        
+        return {
+            "status": "success",
+            "data": summary
+        }
+        
+    except Exception as e:
+        logger.error(f"Catalog reconcile error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/storage/archive")
 async def archive_old_documents(
     days_old: int = Query(90, ge=1),
@@ -7,19 +7,30 @@ from typing import List, Optional, Dict, Any, BinaryIO
 from datetime import datetime, timedelta
 import uuid
 import json
-import hashlib
 import io
+import os
+import sys
 import logging
 from pathlib import Path
 
+from minio.commonconfig import CopySource, REPLACE
 from minio.error import S3Error
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from client import minio_client
+from storage_index import StorageIndex
+
+# Shared upload hashing/streaming helpers (backend/utils/upload_stream.py)
+sys.path.append(str(Path(__file__).parent.parent))
+from backend.utils.upload_stream import UploadTooLargeError, measure_upload, stream_to_minio
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upload size limit
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))
+
 class EnhancedStorageOperations:
     """
     Advanced storage operations with versioning, backup, and intelligent management
@@ -32,6 +43,39 @@ class EnhancedStorageOperations:
         
         # Initialize backup and archive buckets
         self._ensure_buckets_exist()
+        
+        # Content-hash / version / document index
+        self.index = StorageIndex()
+        if self.index.count() == 0 or not self.index.has_counters():
+            self.recount_statistics()
+    
+    def rebuild_index(self) -> int:
+        """Rebuild the storage index from one scan of the primary bucket"""
+        try:
+            return self.index.rebuild(minio_client.client, self.bucket_name, self.backup_bucket)
+        except Exception as e:
+            logger.error(f"Error rebuilding storage index: {e}")
+            raise
+    
+    def recount_statistics(self) -> bool:
+        """Full recount of catalog and bucket counters from the buckets (audit mode)"""
+        try:
+            self.index.rebuild(minio_client.client, self.bucket_name, self.backup_bucket)
+            self.index.recount_buckets(
+                minio_client.client, [self.bucket_name, self.backup_bucket, self.archive_bucket]
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Could not recount storage statistics: {e}")
+            return False
+    
+    def reconcile_catalog(self) -> Dict[str, int]:
+        """Repair drift between the document catalog and the primary/backup buckets"""
+        try:
+            return self.index.reconcile(minio_client.client, self.bucket_name, self.backup_bucket)
+        except Exception as e:
+            logger.error(f"Error reconciling document catalog: {e}")
+            raise
     
     def _ensure_buckets_exist(self):
         """Ensure all required buckets exist"""
@@ -59,10 +103,6 @@ class EnhancedStorageOperations:
         except Exception as e:
             logger.warning(f"Could not set lifecycle policy for {bucket}: {e}")
     
-    def _calculate_file_hash(self, file_data: bytes) -> str:
-        """Calculate SHA256 hash of file data"""
-        return hashlib.sha256(file_data).hexdigest()
-    
     def _generate_object_path(self, document_id: str, filename: str, version: int = 1) -> str:
         """Generate structured object path"""
         date_path = datetime.utcnow().strftime("%Y/%m/%d")
@@ -81,10 +121,8 @@ class EnhancedStorageOperations:
         Store a document with advanced features
         """
         try:
-            # Read file data
-            file_data = await file.read()
-            file_size = len(file_data)
-            file_hash = self._calculate_file_hash(file_data)
+            # Hash and size the spooled upload block by block (never fully in memory)
+            file_size, file_hash = await run_in_threadpool(measure_upload, file.file, MAX_FILE_SIZE)
             
             # Generate document ID
             doc_id = str(uuid.uuid4())
@@ -122,21 +160,25 @@ class EnhancedStorageOperations:
                 **metadata
             }
             
-            # Store file in primary bucket
-            data_stream = io.BytesIO(file_data)
-            result = minio_client.client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=object_path,
-                data=data_stream,
-                length=file_size,
-                content_type=file.content_type,
-                metadata=storage_metadata
+            # Stream file into primary bucket (multipart above MINIO_PART_SIZE)
+            result = await run_in_threadpool(
+                stream_to_minio,
+                minio_client.client,
+                self.bucket_name,
+                object_path,
+                file.file,
+                file_size,
+                file.content_type,
+                storage_metadata
             )
+            self.index.record_bucket_change(self.bucket_name, file_size)
             
             # Create backup if enabled
             backup_path = None
             if enable_backup:
-                backup_path = await self._create_backup(object_path, file_data, storage_metadata)
+                backup_path = await self._create_backup(object_path, storage_metadata)
+            
+            self.index.record_object(object_path, storage_metadata, backup_path)
             
             # Store metadata document
             await self._store_metadata_document(doc_id, storage_metadata)
@@ -162,6 +204,8 @@ class EnhancedStorageOperations:
             logger.info(f"Document stored successfully: {doc_id}")
             return response
             
+        except UploadTooLargeError:
+            raise
         except Exception as e:
             logger.error(f"Error storing document: {e}")
             raise Exception(f"Failed to store document: {str(e)}")
@@ -171,28 +215,7 @@ class EnhancedStorageOperations:
     async def _find_duplicate_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
         """Find existing document with the same hash"""
         try:
-            # Search for objects with matching hash in metadata
-            objects = minio_client.client.list_objects(self.bucket_name, recursive=True)
-            
-            for obj in objects:
-                try:
-                    obj_stat = minio_client.client.stat_object(self.bucket_name, obj.object_name)
-                    obj_metadata = obj_stat.metadata
-                    
-                    if obj_metadata.get("file_hash") == file_hash:
-                        return {
-                            "document_id": obj_metadata.get("document_id"),
-                            "filename": obj_metadata.get("original_filename"),
-                            "object_path": obj.object_name,
-                            "content_type": obj_metadata.get("content_type"),
-                            "file_size": int(obj_metadata.get("file_size", 0)),
-                            "upload_timestamp": obj_metadata.get("upload_timestamp")
-                        }
-                except Exception:
-                    continue
-            
-            return None
-            
+            return self.index.find_by_hash(file_hash)
         except Exception as e:
             logger.warning(f"Error checking for duplicates: {e}")
             return None
@@ -200,42 +223,25 @@ class EnhancedStorageOperations:
     async def _get_next_version(self, filename: str, property_id: str) -> int:
         """Determine the next version number for a file"""
         try:
-            # Search for existing versions of the same file for the same property
-            objects = minio_client.client.list_objects(self.bucket_name, recursive=True)
-            max_version = 0
-            
-            for obj in objects:
-                try:
-                    obj_stat = minio_client.client.stat_object(self.bucket_name, obj.object_name)
-                    obj_metadata = obj_stat.metadata
-                    
-                    if (obj_metadata.get("original_filename") == filename and 
-                        obj_metadata.get("property_id") == property_id):
-                        version = int(obj_metadata.get("version", 1))
-                        max_version = max(max_version, version)
-                except Exception:
-                    continue
-            
-            return max_version + 1
-            
+            return self.index.get_max_version(filename, property_id) + 1
         except Exception as e:
             logger.warning(f"Error determining version: {e}")
             return 1
     
-    async def _create_backup(self, object_path: str, file_data: bytes, metadata: Dict) -> str:
-        """Create backup copy in backup bucket"""
+    async def _create_backup(self, object_path: str, metadata: Dict) -> str:
+        """Create backup copy in backup bucket via server-side copy"""
         try:
             backup_path = f"backup/{object_path}"
-            data_stream = io.BytesIO(file_data)
             
-            minio_client.client.put_object(
-                bucket_name=self.backup_bucket,
-                object_name=backup_path,
-                data=data_stream,
-                length=len(file_data),
-                content_type=metadata.get("content_type", "application/octet-stream"),
-                metadata={**metadata, "backup_timestamp": datetime.utcnow().isoformat()}
+            await run_in_threadpool(
+                minio_client.client.copy_object,
+                self.backup_bucket,
+                backup_path,
+                CopySource(self.bucket_name, object_path),
+                metadata={**metadata, "backup_timestamp": datetime.utcnow().isoformat()},
+                metadata_directive=REPLACE
             )
+            self.index.record_bucket_change(self.backup_bucket, int(metadata.get("file_size", 0)))
             
             logger.info(f"Backup created: {backup_path}")
             return backup_path
@@ -258,6 +264,7 @@ class EnhancedStorageOperations:
                 length=len(metadata_json),
                 content_type="application/json"
             )
+            self.index.record_bucket_change(self.bucket_name, len(metadata_json))
             
         except Exception as e:
             logger.warning(f"Error storing metadata document: {e}")
@@ -265,49 +272,23 @@ class EnhancedStorageOperations:
     def get_document_info(self, document_id: str, include_versions: bool = False) -> Optional[Dict[str, Any]]:
         """Get comprehensive document information"""
         try:
-            # Find the document
-            objects = minio_client.client.list_objects(self.bucket_name, recursive=True)
-            document_info = None
-            all_versions = []
+            versions = self.index.get_document(document_id)
+            if not versions:
+                return None
             
-            for obj in objects:
-                try:
-                    obj_stat = minio_client.client.stat_object(self.bucket_name, obj.object_name)
-                    obj_metadata = obj_stat.metadata
-                    
-                    if obj_metadata.get("document_id") == document_id:
-                        doc_data = {
-                            "document_id": document_id,
-                            "filename": obj_metadata.get("original_filename"),
-                            "object_path": obj.object_name,
-                            "content_type": obj_metadata.get("content_type"),
-                            "file_size": int(obj_metadata.get("file_size", 0)),
-                            "file_hash": obj_metadata.get("file_hash"),
-                            "version": int(obj_metadata.get("version", 1)),
-                            "upload_timestamp": obj_metadata.get("upload_timestamp"),
-                            "last_modified": obj_stat.last_modified.isoformat(),
-                            "metadata": obj_metadata
-                        }
-                        
-                        if include_versions:
-                            all_versions.append(doc_data)
-                        
-                        # Keep the latest version as main document info
-                        if not document_info or doc_data["version"] > document_info.get("version", 0):
-                            document_info = doc_data
-                            
-                except Exception:
-                    continue
+            # Catalog rows are ordered newest version first
+            document_info = {
+                key: value for key, value in versions[0].items() if key != "backup_path"
+            }
             
-            if document_info:
-                if include_versions:
-                    document_info["all_versions"] = sorted(all_versions, key=lambda x: x["version"], reverse=True)
-                
-                # Add download URL
-                document_info["download_url"] = minio_client.get_presigned_url(document_info["object_path"])
-                
-                # Check backup status
-                document_info["backup_available"] = self._check_backup_exists(document_info["object_path"])
+            if include_versions:
+                document_info["all_versions"] = versions
+            
+            # Add download URL
+            document_info["download_url"] = minio_client.get_presigned_url(document_info["object_path"])
+            
+            # Backup status is tracked by the catalog
+            document_info["backup_available"] = versions[0]["backup_path"] is not None
             
             return document_info
             
@@ -315,15 +296,6 @@ class EnhancedStorageOperations:
             logger.error(f"Error getting document info: {e}")
             return None
     
-    def _check_backup_exists(self, object_path: str) -> bool:
-        """Check if backup exists for the document"""
-        try:
-            backup_path = f"backup/{object_path}"
-            minio_client.client.stat_object(self.backup_bucket, backup_path)
-            return True
-        except Exception:
-            return False
-    
     def list_documents(self, prefix: str = "", limit: int = 100, 
                       property_id: str = None) -> List[Dict[str, Any]]:
         """List documents with optional filtering"""
@@ -386,40 +358,37 @@ class EnhancedStorageOperations:
         """Delete document with options for version management"""
         try:
             deleted_objects = []
+            versions = self.index.get_document(document_id)
             
-            # Find all objects for this document
-            objects = minio_client.client.list_objects(self.bucket_name, recursive=True)
-            
-            for obj in objects:
-                try:
-                    obj_stat = minio_client.client.stat_object(self.bucket_name, obj.object_name)
-                    obj_metadata = obj_stat.metadata
+            if delete_all_versions:
+                for version in versions:
+                    try:
+                        minio_client.client.remove_object(self.bucket_name, version["object_path"])
+                        self.index.record_bucket_change(self.bucket_name, -version["file_size"], -1)
+                        deleted_objects.append(version["object_path"])
+                    except Exception:
+                        continue
                     
-                    if obj_metadata.get("document_id") == document_id:
-                        if delete_all_versions:
-                            # Delete this version
-                            minio_client.client.remove_object(self.bucket_name, obj.object_name)
-                            deleted_objects.append(obj.object_name)
-                        else:
-                            # Only delete the latest version
-                            # This is a simplified approach - in production you'd be more careful
-                            pass
-                            
-                except Exception:
-                    continue
+                    # Delete backup copy recorded in the catalog
+                    if version["backup_path"]:
+                        try:
+                            minio_client.client.remove_object(self.backup_bucket, version["backup_path"])
+                            self.index.record_bucket_change(self.backup_bucket, -version["file_size"], -1)
+                        except Exception as e:
+                            logger.warning(f"Error deleting backup {version['backup_path']}: {e}")
+                    
+                    self.index.remove_object(version["object_path"])
             
             # Delete metadata document
             try:
                 metadata_path = f"metadata/{document_id}.json"
+                metadata_size = minio_client.client.stat_object(self.bucket_name, metadata_path).size
                 minio_client.client.remove_object(self.bucket_name, metadata_path)
+                self.index.record_bucket_change(self.bucket_name, -metadata_size, -1)
                 deleted_objects.append(metadata_path)
             except Exception:
                 pass
             
-            # Delete from backup if requested
-            if delete_all_versions:
-                self._delete_backups(document_id)
-            
             return {
                 "document_id": document_id,
                 "deleted_objects": deleted_objects,
@@ -435,86 +404,47 @@ class EnhancedStorageOperations:
                 "error": str(e)
             }
     
-    def _delete_backups(self, document_id: str):
-        """Delete backup copies of a document"""
-        try:
-            objects = minio_client.client.list_objects(self.backup_bucket, recursive=True)
-            
-            for obj in objects:
-                try:
-                    if document_id in obj.object_name:
-                        minio_client.client.remove_object(self.backup_bucket, obj.object_name)
-                except Exception:
-                    continue
-                    
-        except Exception as e:
-            logger.warning(f"Error deleting backups: {e}")
-    
-    def get_storage_statistics(self) -> Dict[str, Any]:
-        """Get comprehensive storage statistics"""
+    def get_storage_statistics(self, full_recount: bool = False) -> Dict[str, Any]:
+        """
+        Get comprehensive storage statistics from the persisted running counters.
+        With full_recount the counters are first rebuilt from the buckets.
+        """
         try:
-            stats = {
-                "primary_bucket": self._get_bucket_stats(self.bucket_name),
-                "backup_bucket": self._get_bucket_stats(self.backup_bucket),
-                "archive_bucket": self._get_bucket_stats(self.archive_bucket),
-                "total_documents": 0,
-                "total_storage_used": 0,
-                "document_types": {},
-                "property_distribution": {},
-                "version_distribution": {}
-            }
+            if full_recount:
+                self.recount_statistics()
             
-            # Analyze documents in primary bucket
-            objects = minio_client.client.list_objects(self.bucket_name, recursive=True)
-            processed_docs = set()
+            counters = self.index.get_counters()
+            totals = counters.get("totals", {})
             
-            for obj in objects:
-                try:
-                    if obj.object_name.startswith("metadata/"):
-                        continue
-                    
-                    obj_stat = minio_client.client.stat_object(self.bucket_name, obj.object_name)
-                    obj_metadata = obj_stat.metadata
-                    
-                    doc_id = obj_metadata.get("document_id")
-                    if doc_id not in processed_docs:
-                        stats["total_documents"] += 1
-                        processed_docs.add(doc_id)
-                    
-                    stats["total_storage_used"] += obj_stat.size
-                    
-                    # Content type distribution
-                    content_type = obj_metadata.get("content_type", "unknown")
-                    stats["document_types"][content_type] = stats["document_types"].get(content_type, 0) + 1
-                    
-                    # Property distribution
-                    property_id = obj_metadata.get("property_id", "unspecified")
-                    stats["property_distribution"][property_id] = stats["property_distribution"].get(property_id, 0) + 1
-                    
-                    # Version distribution
-                    version = obj_metadata.get("version", "1")
-                    stats["version_distribution"][f"v{version}"] = stats["version_distribution"].get(f"v{version}", 0) + 1
-                    
-                except Exception:
-                    continue
-            
-            return stats
+            return {
+                "primary_bucket": self._get_bucket_stats(self.bucket_name, counters),
+                "backup_bucket": self._get_bucket_stats(self.backup_bucket, counters),
+                "archive_bucket": self._get_bucket_stats(self.archive_bucket, counters),
+                "total_documents": totals.get("total_documents", 0),
+                "total_storage_used": totals.get("total_storage_used", 0),
+                "document_types": counters.get("document_types", {}),
+                "property_distribution": counters.get("property_distribution", {}),
+                "version_distribution": counters.get("version_distribution", {})
+            }
             
         except Exception as e:
             logger.error(f"Error getting storage statistics: {e}")
             return {}
     
-    def _get_bucket_stats(self, bucket_name: str) -> Dict[str, Any]:
+    def _get_bucket_stats(self, bucket_name: str, counters: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
         """Get statistics for a specific bucket"""
         try:
-            objects = minio_client.client.list_objects(bucket_name, recursive=True)
-            
-            total_size = 0
-            object_count = 0
-            
-            for obj in objects:
-                total_size += obj.size
-                object_count += 1
+            if bucket_name in (self.bucket_name, self.backup_bucket, self.archive_bucket):
+                counters = counters if counters is not None else self.index.get_counters()
+                object_count = counters.get("bucket_objects", {}).get(bucket_name, 0)
+                total_size = counters.get("bucket_bytes", {}).get(bucket_name, 0)
+            else:
+                # Buckets not managed by this service are not tracked; count them directly
+                total_size = 0
+                object_count = 0
+                for obj in minio_client.client.list_objects(bucket_name, recursive=True):
+                    total_size += obj.size
+                    object_count += 1
             
             return {
                 "bucket_name": bucket_name,
@@ -0,0 +1,397 @@
+"""
+Storage Index for REIMS
+Persistent SQLite index and document catalog over stored objects, providing
+O(1) dedup, version and document lookups without scanning the bucket, plus
+running storage counters kept in the same transactions
+"""
+
+from typing import List, Optional, Dict, Any
+import sqlite3
+import threading
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_METADATA_PREFIX = "x-amz-meta-"
+
+# Counter scopes derived from catalog rows (primary bucket documents)
+DOCUMENT_COUNTER_SCOPES = ("totals", "document_types", "property_distribution", "version_distribution")
+
+
+def normalize_metadata(raw_metadata) -> Dict[str, Any]:
+    """Strip the S3 user-metadata prefix and lower-case keys returned by MinIO"""
+    normalized = {}
+    for key, value in (raw_metadata or {}).items():
+        key = key.lower()
+        if key.startswith(USER_METADATA_PREFIX):
+            key = key[len(USER_METADATA_PREFIX):]
+        normalized[key] = value
+    return normalized
+
+
+class StorageIndex:
+    """
+    Local index of primary-bucket objects keyed by content hash,
+    (property_id, original_filename) and document_id
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("STORAGE_INDEX_PATH", "storage_index.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _init_schema(self):
+        """Create index tables if they do not exist"""
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS storage_objects (
+                    object_path TEXT PRIMARY KEY,
+                    document_id TEXT,
+                    file_hash TEXT,
+                    property_id TEXT,
+                    original_filename TEXT,
+                    version INTEGER DEFAULT 1,
+                    content_type TEXT,
+                    file_size INTEGER DEFAULT 0,
+                    upload_timestamp TEXT,
+                    last_modified TEXT,
+                    backup_path TEXT,
+                    metadata_json TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_storage_objects_hash
+                    ON storage_objects(file_hash);
+                CREATE INDEX IF NOT EXISTS idx_storage_objects_document
+                    ON storage_objects(document_id);
+                CREATE INDEX IF NOT EXISTS idx_storage_objects_name
+                    ON storage_objects(property_id, original_filename, version);
+                CREATE TABLE IF NOT EXISTS storage_counters (
+                    scope TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (scope, name)
+                );
+            """)
+
+    def _bump(self, scope: str, name: str, delta: int):
+        """Adjust one counter; caller must hold the lock and transaction"""
+        self._conn.execute(
+            """
+            INSERT INTO storage_counters (scope, name, value) VALUES (?, ?, ?)
+            ON CONFLICT(scope, name) DO UPDATE SET value = value + excluded.value
+            """,
+            (scope, name, delta),
+        )
+
+    def _count_row(self, content_type: Optional[str], property_id: Optional[str],
+                   version: int, file_size: int, sign: int):
+        """Apply a catalog row to the document distribution counters"""
+        self._bump("totals", "total_storage_used", sign * file_size)
+        self._bump("document_types", content_type or "unknown", sign)
+        self._bump("property_distribution", property_id or "unspecified", sign)
+        self._bump("version_distribution", f"v{version}", sign)
+
+    def _document_exists(self, document_id: Optional[str]) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM storage_objects WHERE document_id IS ? LIMIT 1", (document_id,)
+        ).fetchone() is not None
+
+    def _delete_row(self, object_path: str):
+        """Delete one index row and its counter contributions; caller holds the lock"""
+        row = self._conn.execute(
+            """
+            SELECT document_id, content_type, property_id, version, file_size
+            FROM storage_objects WHERE object_path = ?
+            """,
+            (object_path,),
+        ).fetchone()
+        if not row:
+            return
+
+        self._conn.execute("DELETE FROM storage_objects WHERE object_path = ?", (object_path,))
+        self._count_row(row["content_type"], row["property_id"], row["version"], row["file_size"], -1)
+        if not self._document_exists(row["document_id"]):
+            self._bump("totals", "total_documents", -1)
+
+    def _upsert(self, object_path: str, metadata: Dict[str, Any],
+                backup_path: Optional[str] = None, last_modified: Optional[str] = None):
+        """Write one index row and update counters; caller must hold the lock and transaction"""
+        self._delete_row(object_path)
+
+        version = int(metadata.get("version", 1) or 1)
+        file_size = int(metadata.get("file_size", 0) or 0)
+        if not self._document_exists(metadata.get("document_id")):
+            self._bump("totals", "total_documents", 1)
+
+        self._conn.execute(
+            """
+            INSERT INTO storage_objects (
+                object_path, document_id, file_hash, property_id, original_filename,
+                version, content_type, file_size, upload_timestamp, last_modified,
+                backup_path, metadata_json
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                object_path,
+                metadata.get("document_id"),
+                metadata.get("file_hash"),
+                metadata.get("property_id"),
+                metadata.get("original_filename"),
+                version,
+                metadata.get("content_type"),
+                file_size,
+                metadata.get("upload_timestamp"),
+                last_modified or metadata.get("upload_timestamp"),
+                backup_path,
+                json.dumps(metadata, default=str),
+            ),
+        )
+        self._count_row(metadata.get("content_type"), metadata.get("property_id"), version, file_size, 1)
+
+    def record_object(self, object_path: str, metadata: Dict[str, Any],
+                      backup_path: Optional[str] = None):
+        """Insert or replace the index entry for a stored object"""
+        with self._lock, self._conn:
+            self._upsert(object_path, metadata, backup_path)
+
+    def remove_object(self, object_path: str):
+        """Drop the index entry for a deleted object"""
+        with self._lock, self._conn:
+            self._delete_row(object_path)
+
+    def record_bucket_change(self, bucket_name: str, size_delta: int, count_delta: int = 1):
+        """Adjust per-bucket object and byte counters after a write or delete"""
+        with self._lock, self._conn:
+            self._bump("bucket_objects", bucket_name, count_delta)
+            self._bump("bucket_bytes", bucket_name, size_delta)
+
+    def find_by_hash(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the first indexed object with the given SHA-256 hash"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT object_path, document_id, original_filename, content_type,
+                       file_size, upload_timestamp
+                FROM storage_objects WHERE file_hash = ? LIMIT 1
+                """,
+                (file_hash,),
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            "document_id": row["document_id"],
+            "filename": row["original_filename"],
+            "object_path": row["object_path"],
+            "content_type": row["content_type"],
+            "file_size": row["file_size"],
+            "upload_timestamp": row["upload_timestamp"]
+        }
+
+    def get_max_version(self, filename: str, property_id: Optional[str]) -> int:
+        """Return the highest stored version for a filename within a property (0 if none)"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT MAX(version) FROM storage_objects
+                WHERE property_id IS ? AND original_filename = ?
+                """,
+                (property_id, filename),
+            ).fetchone()
+        return row[0] or 0
+
+    def get_object_paths(self, document_id: str) -> List[str]:
+        """Return all indexed object paths for a document"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT object_path FROM storage_objects WHERE document_id = ? ORDER BY version",
+                (document_id,),
+            ).fetchall()
+        return [row["object_path"] for row in rows]
+
+    def get_document(self, document_id: str) -> List[Dict[str, Any]]:
+        """Return every indexed version of a document, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT * FROM storage_objects
+                WHERE document_id = ? ORDER BY version DESC
+                """,
+                (document_id,),
+            ).fetchall()
+
+        return [
+            {
+                "document_id": row["document_id"],
+                "filename": row["original_filename"],
+                "object_path": row["object_path"],
+                "content_type": row["content_type"],
+                "file_size": row["file_size"],
+                "file_hash": row["file_hash"],
+                "version": row["version"],
+                "upload_timestamp": row["upload_timestamp"],
+                "last_modified": row["last_modified"],
+                "backup_path": row["backup_path"],
+                "metadata": json.loads(row["metadata_json"] or "{}")
+            }
+            for row in rows
+        ]
+
+    def remove_document(self, document_id: str):
+        """Drop all index entries for a document"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT object_path FROM storage_objects WHERE document_id = ?", (document_id,)
+            ).fetchall()
+            for row in rows:
+                self._delete_row(row["object_path"])
+
+    def count(self) -> int:
+        """Number of indexed objects"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM storage_objects").fetchone()[0]
+
+    def _scan_bucket(self, client, bucket_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        List the bucket once with user metadata inline; objects whose listing
+        carries no metadata fall back to a stat call.
+        """
+        entries = {}
+        for obj in client.list_objects(bucket_name, recursive=True, include_user_meta=True):
+            if obj.object_name.startswith("metadata/"):
+                continue
+            try:
+                metadata = normalize_metadata(obj.metadata)
+                if "document_id" not in metadata:
+                    metadata = normalize_metadata(client.stat_object(bucket_name, obj.object_name).metadata)
+                if "document_id" not in metadata:
+                    continue
+                metadata.setdefault("file_size", obj.size)
+                entries[obj.object_name] = {
+                    "metadata": metadata,
+                    "last_modified": obj.last_modified.isoformat() if obj.last_modified else None
+                }
+            except Exception as e:
+                logger.warning(f"Skipping {obj.object_name} during index scan: {e}")
+        return entries
+
+    def _scan_backups(self, client, backup_bucket: Optional[str]) -> set:
+        """Return the set of backup object paths present in the backup bucket"""
+        if not backup_bucket:
+            return set()
+        return {
+            obj.object_name
+            for obj in client.list_objects(backup_bucket, prefix="backup/", recursive=True)
+        }
+
+    def rebuild(self, client, bucket_name: str, backup_bucket: Optional[str] = None) -> int:
+        """Discard the index and rebuild it from one scan of the bucket"""
+        entries = self._scan_bucket(client, bucket_name)
+        backups = self._scan_backups(client, backup_bucket)
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM storage_objects")
+            self._conn.execute(
+                f"DELETE FROM storage_counters WHERE scope IN ({','.join('?' * len(DOCUMENT_COUNTER_SCOPES))})",
+                DOCUMENT_COUNTER_SCOPES,
+            )
+            for object_path, entry in entries.items():
+                backup_path = f"backup/{object_path}"
+                self._upsert(
+                    object_path,
+                    entry["metadata"],
+                    backup_path if backup_path in backups else None,
+                    entry["last_modified"]
+                )
+
+        logger.info(f"Storage index rebuilt from {bucket_name}: {len(entries)} objects")
+        return len(entries)
+
+    def reconcile(self, client, bucket_name: str, backup_bucket: Optional[str] = None) -> Dict[str, int]:
+        """
+        Repair drift between the catalog and the buckets: add unindexed objects,
+        drop entries whose objects are gone and refresh changed hashes, sizes
+        and backup paths. Unchanged rows are left untouched.
+        """
+        entries = self._scan_bucket(client, bucket_name)
+        backups = self._scan_backups(client, backup_bucket)
+        summary = {"scanned": len(entries), "added": 0, "updated": 0, "removed": 0}
+
+        with self._lock, self._conn:
+            existing = {
+                row["object_path"]: (row["file_hash"], row["file_size"], row["backup_path"])
+                for row in self._conn.execute(
+                    "SELECT object_path, file_hash, file_size, backup_path FROM storage_objects"
+                )
+            }
+
+            for object_path in existing.keys() - entries.keys():
+                self._delete_row(object_path)
+                summary["removed"] += 1
+
+            for object_path, entry in entries.items():
+                metadata = entry["metadata"]
+                backup_path = f"backup/{object_path}"
+                backup_path = backup_path if backup_path in backups else None
+                current = existing.get(object_path)
+                observed = (metadata.get("file_hash"), int(metadata.get("file_size", 0) or 0), backup_path)
+
+                if current is None:
+                    summary["added"] += 1
+                elif current != observed:
+                    summary["updated"] += 1
+                else:
+                    continue
+
+                self._upsert(object_path, metadata, backup_path, entry["last_modified"])
+
+        logger.info(f"Storage catalog reconciled with {bucket_name}: {summary}")
+        return summary
+
+    def recount_buckets(self, client, bucket_names: List[str]):
+        """Reset per-bucket object and byte counters from one listing of each bucket"""
+        totals = {}
+        for bucket_name in bucket_names:
+            object_count = 0
+            total_size = 0
+            for obj in client.list_objects(bucket_name, recursive=True):
+                object_count += 1
+                total_size += obj.size or 0
+            totals[bucket_name] = (object_count, total_size)
+
+        with self._lock, self._conn:
+            for bucket_name, (object_count, total_size) in totals.items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO storage_counters (scope, name, value) VALUES ('bucket_objects', ?, ?)",
+                    (bucket_name, object_count),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO storage_counters (scope, name, value) VALUES ('bucket_bytes', ?, ?)",
+                    (bucket_name, total_size),
+                )
+
+    def has_counters(self) -> bool:
+        """Whether any counters have been persisted yet"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM storage_counters LIMIT 1").fetchone() is not None
+
+    def get_counters(self) -> Dict[str, Dict[str, int]]:
+        """Return all counters grouped by scope, omitting zeroed entries"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT scope, name, value FROM storage_counters WHERE value != 0"
+            ).fetchall()
+
+        counters = {}
+        for row in rows:
+            counters.setdefault(row["scope"], {})[row["name"]] = row["value"]
+        return counters
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
@@ -38,6 +38,10 @@ cursor.execute("""
 
 conn.commit()
 
+# Running APIs recompute cached analytics built from stores and properties
+from backend.utils.tagged_cache import publish_invalidation
+publish_invalidation(["stores", "properties"])
+
 print(f"\n✓ Updated properties table to match stores data")
 
 # Verify